@@ -0,0 +1,112 @@
+import threading
+from collections import defaultdict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from skill_model import adaptive_difficulty, with_outcome
+from scheduler import PRIORITY_PREFETCH
+
+class AdaptivePrefetcher:
+    """
+    Speculatively generates the next adaptive question for both possible answer outcomes
+    """
+
+    def __init__(self, quiz_generator, max_workers=4, pool_size=20):
+        self.quiz_generator = quiz_generator
+        self.pool_size = pool_size
+        self.prefetch_hits = 0
+        self.prefetch_misses = 0
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="adaptive-prefetch")
+        # Finished but unused questions, shared by every session, keyed by (subject, difficulty)
+        self._pool = defaultdict(deque)
+        self._lock = threading.Lock()
+
+    def prefetch(self, subject, current_difficulty, performance_history):
+        """
+        Start generating the questions that would follow a correct and an incorrect answer
+
+        Arguments match QuizGenerator.generate_adaptive_question: performance_history is a
+        skill_model.SkillEstimate or a list of scores answered at current_difficulty.
+        Returns a ticket to pass to next_question once the answer is known.
+        """
+        ticket = {}
+        for outcome in (1.0, 0.0):
+            difficulty = adaptive_difficulty(with_outcome(performance_history, outcome), current_difficulty)
+            if difficulty not in ticket:
+                ticket[difficulty] = self._schedule(subject, difficulty)
+        return ticket
+
+    def next_question(self, subject, current_difficulty, performance_history, ticket=None, timeout=None):
+        """
+        Return the question for the updated history, preferring the prefetched one
+
+        The level is the one generate_adaptive_question would pick for the same arguments.
+        Prefetched questions for the outcome that did not happen go back to the pool.
+        """
+        difficulty = adaptive_difficulty(performance_history, current_difficulty)
+        ticket = dict(ticket or {})
+        future = ticket.pop(difficulty, None)
+        for unused in ticket.values():
+            unused.add_done_callback(self._return_to_pool)
+
+        if future is None:
+            future = self._from_pool(subject, difficulty)
+
+        if future is not None:
+            try:
+                question = future.result(timeout=timeout)
+                self.prefetch_hits += 1
+                return question
+            except Exception:
+                # A failed or slow prefetch falls back to generating the question now
+                pass
+
+        self.prefetch_misses += 1
+        try:
+            return self.quiz_generator._request_adaptive_question(subject, difficulty)
+        except Exception as e:
+            return self.quiz_generator._adaptive_question_error(e)
+
+    def stats(self):
+        """
+        Report prefetch hit/miss counters and pooled question count
+        """
+        with self._lock:
+            pooled = sum(len(questions) for questions in self._pool.values())
+        return {"hits": self.prefetch_hits, "misses": self.prefetch_misses, "pooled": pooled}
+
+    def _schedule(self, subject, difficulty):
+        """
+        Reuse a pooled question for this difficulty or start generating a new one
+        """
+        pooled = self._from_pool(subject, difficulty)
+        if pooled is not None:
+            return pooled
+        future = self._executor.submit(
+            self.quiz_generator._request_adaptive_question, subject, difficulty, PRIORITY_PREFETCH
+        )
+        future.pool_key = (subject, difficulty)
+        return future
+
+    def _from_pool(self, subject, difficulty):
+        """
+        Pop a pooled question as an already-completed future
+        """
+        with self._lock:
+            questions = self._pool.get((subject, difficulty))
+            if not questions:
+                return None
+            question = questions.popleft()
+        future = Future()
+        future.set_result(question)
+        future.pool_key = (subject, difficulty)
+        return future
+
+    def _return_to_pool(self, future):
+        """
+        Keep a successfully generated but unused question for a later request
+        """
+        if future.cancelled() or future.exception() is not None:
+            return
+        with self._lock:
+            questions = self._pool[future.pool_key]
+            if len(questions) < self.pool_size:
+                questions.append(future.result())
@@ -0,0 +1,280 @@
+import re
+import random
+
+try:
+    import sympy
+    from sympy.parsing.sympy_parser import (
+        parse_expr,
+        standard_transformations,
+        implicit_multiplication_application,
+        convert_xor
+    )
+except ImportError:  # the local checker is optional; grading falls back to the LLM
+    sympy = None
+
+MAX_ANSWER_LENGTH = 200
+# Larger powers (or exponent towers) are left to the LLM rather than built as exact integers
+MAX_EXPONENT = 1000
+MAX_DIGITS = 1000
+NUMERIC_SAMPLES = 8
+RELATIVE_TOLERANCE = 1e-6
+# Differences this small are likely rounding, which the LLM grader can judge
+ROUNDING_TOLERANCE = 1e-2
+
+# Single letters that usually denote units (metres, seconds, grams, newtons, ...) rather than variables
+UNIT_SYMBOLS = {"m", "s", "g", "h", "N", "J", "W", "V", "A", "K", "L"}
+
+FUNCTION_NAMES = {
+    "sin", "cos", "tan", "sec", "csc", "cot", "asin", "acos", "atan",
+    "arcsin", "arccos", "arctan", "sinh", "cosh", "tanh",
+    "exp", "log", "ln", "sqrt", "abs"
+}
+
+LATEX_REPLACEMENTS = [
+    (r"\\left|\\right|\\,|\\;|\\!|\\displaystyle", ""),
+    (r"\\cdot|\\times", "*"),
+    (r"\\div", "/"),
+    (r"\\pi", " pi "),
+    (r"\\infty", " oo "),
+    (r"\\(arcsin|arccos|arctan|sinh|cosh|tanh|sin|cos|tan|sec|csc|cot|exp|log|ln)", r" \1 "),
+    (r"\^\{([^{}]*)\}", r"^(\1)"),
+    (r"\{", "("),
+    (r"\}", ")"),
+]
+
+SAFE_CHARACTERS = re.compile(r"^[0-9A-Za-z_+\-*/^()., \[\]]*$")
+
+def _latex_to_plain(text):
+    """
+    Convert the LaTeX subset used in quiz answers into plain math syntax
+    """
+    text = text.replace("$", "").strip()
+    text = re.sub(r"\\[\[\]()]", "", text)
+
+    # Matrices become nested lists
+    matrix = re.search(r"\\begin\{[pbvB]?matrix\}(.*?)\\end\{[pbvB]?matrix\}", text, re.S)
+    if matrix:
+        rows = [row.strip() for row in matrix.group(1).split("\\\\") if row.strip()]
+        text = "[" + ",".join("[" + ",".join(cell.strip() for cell in row.split("&")) + "]" for row in rows) + "]"
+
+    # \frac and \sqrt take braced arguments; resolve innermost first
+    previous = None
+    while previous != text:
+        previous = text
+        text = re.sub(r"\\[dt]?frac\s*\{([^{}]*)\}\s*\{([^{}]*)\}", r"((\1)/(\2))", text)
+        text = re.sub(r"\\sqrt\s*\{([^{}]*)\}", r"sqrt(\1)", text)
+
+    for pattern, replacement in LATEX_REPLACEMENTS:
+        text = re.sub(pattern, replacement, text)
+    return text
+
+# Left-hand sides a single "lhs = rhs" answer may have: one symbol, or one function of symbols
+ANSWER_LHS = re.compile(r"^[A-Za-z]'*(\([A-Za-z](\s*,\s*[A-Za-z])*\))?$")
+
+def _has_top_level_comma(text):
+    """
+    Whether text has a comma outside brackets, i.e. is a list of answers rather than one matrix
+    """
+    depth = 0
+    for char in text:
+        if char in "([":
+            depth += 1
+        elif char in ")]":
+            depth -= 1
+        elif char == "," and depth == 0:
+            return True
+    return False
+
+def _extract_final_expression(answer):
+    """
+    Reduce an answer to a single expression, dropping a constant of integration
+
+    Accepts a bare expression or one "lhs = rhs" whose left side is a single symbol or
+    function. Systems, several roots, lists and worded answers return None so the LLM
+    decides; keeping only part of them could credit an incomplete or wrong answer.
+    """
+    if re.search(r"\\text|\\mathrm|\\quad", str(answer)):
+        return None
+    text = _latex_to_plain(str(answer))
+    if "\n" in text or re.search(r"\b(and|or)\b", text, re.IGNORECASE) or _has_top_level_comma(text):
+        return None
+    sides = text.split("=")
+    if len(sides) > 2:
+        return None
+    if len(sides) == 2 and not ANSWER_LHS.match(sides[0].strip()):
+        return None
+    text = sides[-1].strip().rstrip(".")
+    text = re.sub(r"\s*\+\s*C$", "", text)
+    return text or None
+
+def _left_side(answer):
+    """
+    The left side of a single "lhs = rhs" answer with spaces removed, or None
+    """
+    sides = _latex_to_plain(str(answer)).split("=")
+    return sides[0].replace(" ", "") if len(sides) == 2 else None
+
+def _parse(answer):
+    """
+    Parse an answer into a SymPy expression or Matrix, or return None if it is not plain math
+    """
+    text = _extract_final_expression(answer)
+    if not text or len(text) > MAX_ANSWER_LENGTH or not SAFE_CHARACTERS.match(text):
+        return None
+
+    # Only known function names and single-letter variables may reach the parser
+    for identifier in re.findall(r"[A-Za-z_]+", text):
+        if identifier not in FUNCTION_NAMES and identifier not in ("pi", "oo", "e") and len(identifier) > 1:
+            return None
+    if "__" in text:
+        return None
+
+    local_dict = {"e": sympy.E, "pi": sympy.pi, "ln": sympy.log, "abs": sympy.Abs,
+                  "arcsin": sympy.asin, "arccos": sympy.acos, "arctan": sympy.atan}
+    transformations = standard_transformations + (implicit_multiplication_application, convert_xor)
+    try:
+        # Parse unevaluated first: evaluating 9^9^9 would build the full integer before any check
+        if _too_large(parse_expr(text, local_dict=local_dict, transformations=transformations, evaluate=False)):
+            return None
+        parsed = parse_expr(text, local_dict=local_dict, transformations=transformations, evaluate=True)
+    except Exception:
+        return None
+
+    if isinstance(parsed, (list, tuple)):
+        try:
+            return sympy.Matrix(parsed)
+        except Exception:
+            return None
+    if isinstance(parsed, sympy.Basic):
+        return parsed
+    if isinstance(parsed, (int, float)):
+        return sympy.sympify(parsed)
+    return None
+
+def _too_large(parsed):
+    """
+    Whether evaluating an unevaluated parse would need an oversized power, e.g. an exponent tower
+    """
+    if isinstance(parsed, (list, tuple)):
+        return any(_too_large(item) for item in parsed)
+    if not isinstance(parsed, sympy.Basic):
+        return False
+    for node in sympy.preorder_traversal(parsed):
+        if not isinstance(node, sympy.Pow) or node.exp.free_symbols:
+            continue
+        try:
+            exponent = abs(float(node.exp.evalf(15)))
+            if exponent > MAX_EXPONENT:
+                return True
+            if not node.base.free_symbols:
+                base = abs(node.base.evalf(15))
+                if base != 0 and exponent * abs(float(sympy.log(base, 10).evalf(15))) > MAX_DIGITS:
+                    return True
+        except (TypeError, ValueError, OverflowError):
+            return True
+    return False
+
+def _numerically_equal(left, right, symbols):
+    """
+    Compare two expressions at random sample points; returns True, False or None if undecidable
+    """
+    rng = random.Random(0)
+    agreements = 0
+    disagreements = 0
+    near_misses = 0
+    for _ in range(NUMERIC_SAMPLES):
+        point = {symbol: rng.uniform(0.5, 2.5) for symbol in symbols}
+        try:
+            a = complex(left.evalf(subs=point))
+            b = complex(right.evalf(subs=point))
+        except (TypeError, ValueError):
+            continue
+        if any(value != value or abs(value) == float("inf") for value in (a, b)):
+            continue
+        scale = max(1.0, abs(a), abs(b))
+        if abs(a - b) <= RELATIVE_TOLERANCE * scale:
+            agreements += 1
+        elif abs(a - b) <= ROUNDING_TOLERANCE * scale:
+            near_misses += 1
+        else:
+            disagreements += 1
+
+    if near_misses:
+        return None
+    if disagreements >= 1 and agreements == 0 and not symbols:
+        return False
+    if disagreements >= 2 and agreements == 0:
+        return False
+    if agreements >= NUMERIC_SAMPLES // 2 and disagreements == 0:
+        return True
+    return None
+
+def _equivalent(student, expected):
+    """
+    Decide whether two parsed answers are equivalent; returns True, False or None if undecidable
+    """
+    if isinstance(student, sympy.MatrixBase) or isinstance(expected, sympy.MatrixBase):
+        if not (isinstance(student, sympy.MatrixBase) and isinstance(expected, sympy.MatrixBase)):
+            return None
+        if student.shape != expected.shape:
+            return False
+        verdicts = [_equivalent(a, b) for a, b in zip(student, expected)]
+        if any(verdict is False for verdict in verdicts):
+            return False
+        if all(verdict is True for verdict in verdicts):
+            return True
+        return None
+
+    symbols = sorted(student.free_symbols | expected.free_symbols, key=str)
+    verdict = _numerically_equal(student, expected, symbols)
+    if verdict is not None:
+        return verdict
+
+    # Numeric sampling was undecidable (e.g. outside the domain); try exact simplification
+    difference = student - expected
+    if sympy.count_ops(difference) <= 60:
+        try:
+            if sympy.simplify(difference) == 0:
+                return True
+        except Exception:
+            pass
+    return None
+
+def check_answer(user_answer, correct_answer):
+    """
+    Grade a closed-form answer locally with SymPy
+
+    Returns an evaluation dict in the same shape as the LLM grader when the
+    check is conclusive, or None when the answer needs the LLM.
+    """
+    if sympy is None or not str(user_answer).strip():
+        return None
+
+    student = _parse(user_answer)
+    expected = _parse(correct_answer)
+    if student is None or expected is None:
+        return None
+
+    # Different variables or units need judgement: "y = 2" for "x = 2", "5 m" for "5"
+    student_side, expected_side = _left_side(user_answer), _left_side(correct_answer)
+    if student_side and expected_side and student_side != expected_side:
+        return None
+    symbols = {str(symbol) for symbol in student.free_symbols | expected.free_symbols}
+    if student.free_symbols != expected.free_symbols or symbols & UNIT_SYMBOLS:
+        return None
+
+    verdict = _equivalent(student, expected)
+    if verdict is None:
+        return None
+
+    if verdict:
+        return {
+            "correct": True,
+            "partial_credit": 1.0,
+            "explanation": "Your answer is mathematically equivalent to the expected answer."
+        }
+    return {
+        "correct": False,
+        "partial_credit": 0.0,
+        "explanation": f"Your answer does not match the expected result, {correct_answer}. Check your work and try again."
+    }
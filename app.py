@@ -1,8 +1,18 @@
 import streamlit as st
 import os
-from stem_tutor import STEMTutor
+import uuid
+from stem_tutor import STEMTutor, HINT_LEVELS, ERROR_MESSAGES
 from quiz_generator import QuizGenerator
-from utils import initialize_session_state, render_math_expression
+from quiz_bank import QuizBank, question_fingerprint
+from response_cache import ResponseCache
+from semantic_cache import SemanticCache
+from chat_history import ChatStore, ChatHistory
+from solution_store import SolutionStore, format_step, format_solution
+from instrumentation import get_instrumentation
+from scheduler import get_scheduler
+from prompts import token_counts
+from utils import initialize_session_state, render_math_expression, record_attempt, get_progress_store
+from utils import get_skill_model, get_subject_topics, recommended_difficulty
 
 # Initialize session state
 initialize_session_state()
@@ -16,26 +26,189 @@ st.set_page_config(
 )
 
 # Initialize components
+@st.cache_resource
+def get_response_cache():
+    return ResponseCache(db_path=os.getenv("EDUPROMPT_CACHE_PATH", ".cache/responses.sqlite3"))
+
+@st.cache_resource
+def get_semantic_cache():
+    return SemanticCache(threshold=float(os.getenv("EDUPROMPT_SEMANTIC_THRESHOLD", "0.9")))
+
+@st.cache_resource
+def get_solution_store():
+    return SolutionStore(os.getenv("EDUPROMPT_SOLUTION_PATH", ".cache/solutions.sqlite3"))
+
 @st.cache_resource
 def get_tutor():
-    return STEMTutor()
+    return STEMTutor(
+        cache=get_response_cache(),
+        semantic_cache=get_semantic_cache(),
+        solution_store=get_solution_store()
+    )
+
+@st.cache_resource
+def get_quiz_bank():
+    return QuizBank(os.getenv("EDUPROMPT_QUIZ_BANK_PATH", ".cache/quiz_bank.sqlite3"))
 
 @st.cache_resource
 def get_quiz_generator():
-    return QuizGenerator()
+    return QuizGenerator(
+        batch_grading=os.getenv("EDUPROMPT_BATCH_GRADING", "0") == "1",
+        quiz_bank=get_quiz_bank(),
+        solution_store=get_solution_store()
+    )
+
+@st.cache_resource
+def get_chat_store():
+    return ChatStore(os.getenv("EDUPROMPT_CHAT_PATH", ".cache/chat_history.sqlite3"))
 
 tutor = get_tutor()
 quiz_gen = get_quiz_generator()
 
+# Chat messages beyond the in-memory window are spilled to the shared chat store
+CHAT_PAGE_SIZE = 20
+if "chat_history" not in st.session_state:
+    st.session_state.chat_history = ChatHistory(
+        get_chat_store(),
+        uuid.uuid4().hex,
+        window=int(os.getenv("EDUPROMPT_CHAT_WINDOW", "20"))
+    )
+    st.session_state.chat_pages = 0
+
+# Page components rendered as fragments, so widget interactions inside them
+# rerun only the component instead of the whole script
+def load_earlier_messages():
+    st.session_state.chat_pages += 1
+
+def show_next_hint():
+    st.session_state.hints_shown += 1
+
+def show_next_step():
+    st.session_state.steps_shown += 1
+
+def show_all_steps():
+    st.session_state.steps_shown = len(st.session_state.solution["steps"])
+
+@st.fragment
+def solution_view():
+    # Steps are revealed from the stored solution, so no step costs another API call
+    solution = st.session_state.solution
+    render_math_expression(format_solution(solution, st.session_state.steps_shown))
+    
+    if st.session_state.steps_shown < len(solution["steps"]):
+        col1, col2 = st.columns(2)
+        with col1:
+            st.button("Show Next Step", key="next_step", on_click=show_next_step)
+        with col2:
+            st.button("Show All Steps", key="all_steps", on_click=show_all_steps)
+
+@st.fragment
+def chat_view(subject, difficulty):
+    history = st.session_state.chat_history
+    
+    # Earlier messages are read back from disk only when asked for
+    shown_earlier = min(st.session_state.chat_pages * CHAT_PAGE_SIZE, history.spilled)
+    if history.spilled > shown_earlier:
+        st.button(
+            f"Load earlier messages ({history.spilled - shown_earlier} more)",
+            key="load_earlier",
+            on_click=load_earlier_messages
+        )
+    
+    # Display chat history
+    for message in list(history.earlier(shown_earlier)) + list(history):
+        with st.chat_message(message["role"]):
+            render_math_expression(message["content"])
+    
+    # Chat input
+    if prompt := st.chat_input("Ask your STEM question here..."):
+        # Add user message to chat
+        history.append("user", prompt)
+        with st.chat_message("user"):
+            render_math_expression(prompt)
+        
+        # Stream the response as it is generated
+        with st.chat_message("assistant"):
+            response = st.write_stream(tutor.answer_question_stream(
+                prompt, subject, difficulty, context=st.session_state.conversation
+            ))
+            history.append("assistant", response)
+            
+            # Update student progress
+            record_attempt("question", subject, difficulty)
+
+@st.fragment
+def quiz_question_view(i, question):
+    st.markdown(f"**Question {i+1}:**")
+    render_math_expression(question["question"])
+    
+    if question["type"] == "multiple_choice":
+        answer = st.radio(
+            "Select your answer:",
+            question["options"],
+            key=f"q_{i}",
+            disabled=st.session_state.get("quiz_submitted", False)
+        )
+        st.session_state.quiz_answers[i] = answer
+    
+    elif question["type"] == "problem_solving":
+        answer = st.text_area(
+            "Enter your solution:",
+            key=f"q_{i}",
+            disabled=st.session_state.get("quiz_submitted", False)
+        )
+        st.session_state.quiz_answers[i] = answer
+    
+    st.markdown("---")
+
+@st.fragment
+def quiz_results_view(results):
+    quiz = st.session_state.current_quiz
+    st.subheader("Quiz Results")
+    
+    # Score
+    score = results["score"]
+    total = results["total"]
+    percentage = (score / total) * 100
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Score", f"{score}/{total}")
+    with col2:
+        st.metric("Percentage", f"{percentage:.1f}%")
+    with col3:
+        if percentage >= 80:
+            st.success("Excellent! 🎉")
+        elif percentage >= 60:
+            st.info("Good job! 👍")
+        else:
+            st.warning("Keep practicing! 💪")
+    
+    # Detailed feedback
+    st.subheader("Detailed Feedback")
+    for i, feedback in enumerate(results["feedback"]):
+        with st.expander(f"Question {i+1} - {'✅ Correct' if feedback['correct'] else '❌ Incorrect'}"):
+            st.markdown(f"**Your answer:** {feedback['user_answer']}")
+            render_math_expression(f"**Correct answer:** {feedback['correct_answer']}")
+            render_math_expression(f"**Explanation:** {feedback['explanation']}")
+            
+            # Worked solutions are stored, so later students are graded against them too
+            question = quiz["questions"][i]
+            if question["type"] == "problem_solving":
+                if st.button("Show worked solution", key=f"worked_{i}"):
+                    st.session_state.worked_solutions.add(i)
+                if i in st.session_state.worked_solutions:
+                    render_math_expression(tutor.explain_step_by_step(question["question"], quiz["subject"], quiz["difficulty"]))
+
 # Sidebar navigation
 st.sidebar.title("🎓 EduPrompt")
 st.sidebar.markdown("Your AI-powered STEM tutor")
 
-# Learning mode selection
-mode = st.sidebar.selectbox(
-    "Select Learning Mode",
-    ["Interactive Q&A", "Step-by-Step Explanations", "Quiz Practice", "Progress Tracking"]
-)
+# Learning mode selection; the metrics page is only offered to operators
+modes = ["Interactive Q&A", "Step-by-Step Explanations", "Quiz Practice", "Progress Tracking"]
+if os.getenv("EDUPROMPT_ADMIN", "0") == "1":
+    modes.append("Admin Metrics")
+mode = st.sidebar.selectbox("Select Learning Mode", modes)
 
 # Subject selection
 subject = st.sidebar.selectbox(
@@ -56,34 +229,7 @@ if mode == "Interactive Q&A":
     st.header("Ask Your STEM Questions")
     st.markdown("Ask any question about calculus, linear algebra, or data science. I'll provide detailed explanations!")
     
-    # Chat interface
-    if "messages" not in st.session_state:
-        st.session_state.messages = []
-    
-    # Display chat history
-    for message in st.session_state.messages:
-        with st.chat_message(message["role"]):
-            if message["role"] == "assistant" and "math" in message.get("content", ""):
-                render_math_expression(message["content"])
-            else:
-                st.markdown(message["content"])
-    
-    # Chat input
-    if prompt := st.chat_input("Ask your STEM question here..."):
-        # Add user message to chat
-        st.session_state.messages.append({"role": "user", "content": prompt})
-        with st.chat_message("user"):
-            st.markdown(prompt)
-        
-        # Generate response
-        with st.chat_message("assistant"):
-            with st.spinner("Thinking..."):
-                response = tutor.answer_question(prompt, subject, difficulty)
-                render_math_expression(response)
-                st.session_state.messages.append({"role": "assistant", "content": response})
-                
-                # Update student progress
-                st.session_state.questions_asked += 1
+    chat_view(subject, difficulty)
 
 elif mode == "Step-by-Step Explanations":
     st.header("Step-by-Step Problem Solving")
@@ -95,16 +241,50 @@ elif mode == "Step-by-Step Explanations":
         height=100
     )
     
+    if st.session_state.get("solution_problem") != (problem, subject, difficulty):
+        st.session_state.solution_problem = (problem, subject, difficulty)
+        st.session_state.solution = None
+        st.session_state.steps_shown = 0
+    
     if st.button("Get Step-by-Step Solution", type="primary"):
         if problem:
-            with st.spinner("Generating step-by-step solution..."):
-                explanation = tutor.explain_step_by_step(problem, subject, difficulty)
-                render_math_expression(explanation)
+            # The first step appears as soon as it is generated; the whole solution is then stored
+            preview = st.empty()
+            try:
+                for number, step in enumerate(tutor.solve_step_by_step_stream(problem, subject, difficulty), 1):
+                    if number == 1:
+                        with preview.container():
+                            render_math_expression(format_step(1, step))
+                            st.caption("Working out the remaining steps...")
+                st.session_state.solution = tutor.solve_step_by_step(problem, subject, difficulty)
+                st.session_state.steps_shown = 1
                 
                 # Update progress
-                st.session_state.problems_solved += 1
+                record_attempt("problem", subject, difficulty)
+            except Exception as e:
+                st.error(ERROR_MESSAGES["explain_step_by_step"].format(error=str(e)))
+            preview.empty()
         else:
             st.warning("Please enter a problem to solve.")
+    
+    if st.session_state.solution:
+        solution_view()
+    
+    # Hints come from one cached ladder per problem, so each further hint is served locally
+    if st.session_state.get("hint_problem") != problem:
+        st.session_state.hint_problem = problem
+        st.session_state.hints_shown = 0
+    
+    st.button(
+        "Get a Hint",
+        key="next_hint",
+        on_click=show_next_hint,
+        disabled=not problem or st.session_state.hints_shown >= len(HINT_LEVELS)
+    )
+    
+    for level in range(st.session_state.hints_shown):
+        st.markdown(f"**Hint {level + 1} of {len(HINT_LEVELS)}:**")
+        render_math_expression(tutor.generate_hint(problem, subject, difficulty, level))
 
 elif mode == "Quiz Practice":
     st.header("Quiz Practice")
@@ -119,14 +299,38 @@ elif mode == "Quiz Practice":
         )
         
         num_questions = st.slider("Number of Questions", 1, 10, 5)
+        
+        suggested = recommended_difficulty(subject)
+        if suggested and suggested != difficulty:
+            st.caption(f"Based on your recent answers, {suggested} questions may suit you best in {subject}.")
     
     with col2:
-        if st.button("Generate New Quiz", type="primary"):
-            with st.spinner("Generating quiz..."):
-                quiz = quiz_gen.generate_quiz(subject, difficulty, quiz_type, num_questions)
-                st.session_state.current_quiz = quiz
-                st.session_state.quiz_answers = {}
-                st.session_state.quiz_submitted = False
+        generate = st.button("Generate New Quiz", type="primary")
+    
+    if generate:
+        # Show each question as soon as it has streamed in; answer widgets appear once the quiz is complete
+        st.session_state.current_quiz = None
+        preview = st.empty()
+        quiz = None
+        for quiz in quiz_gen.generate_quiz_stream(
+            subject, difficulty, quiz_type, num_questions,
+            exclude=st.session_state.seen_questions
+        ):
+            with preview.container():
+                st.subheader(f"Quiz: {quiz['title']}")
+                for i, question in enumerate(quiz["questions"]):
+                    st.markdown(f"**Question {i+1}:**")
+                    render_math_expression(question["question"])
+                if len(quiz["questions"]) < num_questions:
+                    st.caption(f"Generating question {len(quiz['questions']) + 1} of {num_questions}...")
+        preview.empty()
+        
+        if quiz is not None:
+            st.session_state.seen_questions.update(question_fingerprint(q) for q in quiz["questions"])
+            st.session_state.current_quiz = quiz
+            st.session_state.quiz_answers = {}
+            st.session_state.quiz_submitted = False
+            st.session_state.worked_solutions = set()
     
     # Display current quiz
     if "current_quiz" in st.session_state and st.session_state.current_quiz:
@@ -134,29 +338,9 @@ elif mode == "Quiz Practice":
         
         st.subheader(f"Quiz: {quiz['title']}")
         
-        # Quiz questions
+        # Quiz questions; answering one reruns only that question's fragment
         for i, question in enumerate(quiz["questions"]):
-            st.markdown(f"**Question {i+1}:**")
-            render_math_expression(question["question"])
-            
-            if question["type"] == "multiple_choice":
-                answer = st.radio(
-                    "Select your answer:",
-                    question["options"],
-                    key=f"q_{i}",
-                    disabled=st.session_state.get("quiz_submitted", False)
-                )
-                st.session_state.quiz_answers[i] = answer
-            
-            elif question["type"] == "problem_solving":
-                answer = st.text_area(
-                    "Enter your solution:",
-                    key=f"q_{i}",
-                    disabled=st.session_state.get("quiz_submitted", False)
-                )
-                st.session_state.quiz_answers[i] = answer
-            
-            st.markdown("---")
+            quiz_question_view(i, question)
         
         # Submit quiz
         if not st.session_state.get("quiz_submitted", False):
@@ -165,40 +349,17 @@ elif mode == "Quiz Practice":
                     results = quiz_gen.evaluate_quiz(quiz, st.session_state.quiz_answers)
                     st.session_state.quiz_results = results
                     st.session_state.quiz_submitted = True
-                    st.session_state.quizzes_completed += 1
+                    
+                    # Update progress per question and for the quiz as a whole
+                    for question, feedback in zip(quiz["questions"], results["feedback"]):
+                        if "score" in feedback:
+                            record_attempt("quiz_question", subject, difficulty, feedback["score"], question.get("topic"))
+                    record_attempt("quiz", subject, difficulty, results["score"] / results["total"] if results["total"] else None)
                     st.rerun()
         
         # Display results
         if st.session_state.get("quiz_submitted", False) and "quiz_results" in st.session_state:
-            results = st.session_state.quiz_results
-            
-            st.subheader("Quiz Results")
-            
-            # Score
-            score = results["score"]
-            total = results["total"]
-            percentage = (score / total) * 100
-            
-            col1, col2, col3 = st.columns(3)
-            with col1:
-                st.metric("Score", f"{score}/{total}")
-            with col2:
-                st.metric("Percentage", f"{percentage:.1f}%")
-            with col3:
-                if percentage >= 80:
-                    st.success("Excellent! 🎉")
-                elif percentage >= 60:
-                    st.info("Good job! 👍")
-                else:
-                    st.warning("Keep practicing! 💪")
-            
-            # Detailed feedback
-            st.subheader("Detailed Feedback")
-            for i, feedback in enumerate(results["feedback"]):
-                with st.expander(f"Question {i+1} - {'✅ Correct' if feedback['correct'] else '❌ Incorrect'}"):
-                    st.markdown(f"**Your answer:** {feedback['user_answer']}")
-                    st.markdown(f"**Correct answer:** {feedback['correct_answer']}")
-                    st.markdown(f"**Explanation:** {feedback['explanation']}")
+            quiz_results_view(st.session_state.quiz_results)
 
 elif mode == "Progress Tracking":
     st.header("Your Learning Progress")
@@ -226,6 +387,23 @@ elif mode == "Progress Tracking":
             delta=1 if st.session_state.quizzes_completed > 0 else 0
         )
     
+    # Recent results from the progress store
+    progress_store = get_progress_store()
+    recent_scores = progress_store.recent_scores(st.session_state.student_id)
+    if recent_scores:
+        st.subheader("Recent Quiz Scores")
+        st.line_chart([score * 100 for score in recent_scores])
+    
+    subject_rows = progress_store.subject_summary(st.session_state.student_id)
+    if subject_rows:
+        st.subheader("Activity by Subject")
+        st.dataframe(subject_rows)
+    
+    topic_rows = get_skill_model().topic_report(st.session_state.student_id, subject, get_subject_topics(subject))
+    if topic_rows:
+        st.subheader(f"{subject} Skill by Topic")
+        st.dataframe(topic_rows)
+    
     # Progress insights
     st.subheader("Learning Insights")
     
@@ -247,6 +425,64 @@ elif mode == "Progress Tracking":
     else:
         st.info("Start your learning journey by asking questions or taking quizzes!")
 
+elif mode == "Admin Metrics":
+    st.header("LLM Call Metrics")
+    st.markdown("Live latency, token and cache statistics for every tutor and quiz call in this process.")
+    
+    instrumentation = get_instrumentation()
+    
+    @st.fragment(run_every=5)
+    def show_metrics():
+        summary = instrumentation.summary()
+        if not summary:
+            st.info("No LLM calls recorded yet.")
+        else:
+            st.dataframe([
+                {
+                    "Method": method,
+                    "Calls": entry["calls"],
+                    "Error %": round(entry["error_rate"] * 100, 1),
+                    "Cache hit %": round(entry["cache_hit_rate"] * 100, 1),
+                    "Coalesced": entry["coalesced"],
+                    "p50 (s)": entry["latency"]["p50"],
+                    "p95 (s)": entry["latency"]["p95"],
+                    "p99 (s)": entry["latency"]["p99"],
+                    "TTFT p95 (s)": entry.get("ttft", {}).get("p95"),
+                    "Prompt tokens": entry["prompt_tokens"],
+                    "Completion tokens": entry["completion_tokens"],
+                    "Retries": entry["retries"]
+                }
+                for method, entry in sorted(summary.items())
+            ])
+        
+        queue = get_scheduler().metrics()
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.metric("Queue depth", queue["queue_depth"])
+        with col2:
+            st.metric("Admitted", queue["admitted"])
+        with col3:
+            st.metric("Queue timeouts", queue["timeouts"])
+        with col4:
+            st.metric("Queue wait p95", f"{queue['wait_p95']:.2f}s")
+        
+        with st.expander("Recent calls"):
+            st.dataframe(instrumentation.recent_calls())
+    
+    show_metrics()
+    
+    with st.expander("Prompt templates"):
+        st.dataframe([
+            {"Template": name, "Static prefix tokens": tokens}
+            for name, tokens in token_counts().items()
+        ])
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        st.download_button("Download JSON", instrumentation.to_json(), "eduprompt-metrics.json", "application/json")
+    with col2:
+        st.download_button("Download Prometheus", instrumentation.to_prometheus(), "eduprompt-metrics.prom", "text/plain")
+
 # Sidebar help
 st.sidebar.markdown("---")
 st.sidebar.markdown("### 💡 Tips")
@@ -0,0 +1,355 @@
+"""
+Offline load test for every learning mode
+
+Starts the mock OpenAI server, points the app's client at it and drives
+STEMTutor, QuizGenerator and optionally the Streamlit app with N concurrent
+simulated students, reporting latency percentiles, throughput and error rate.
+
+    python -m benchmarks.load_test --students 20 --iterations 5
+    python -m benchmarks.load_test --json results.json
+    python -m benchmarks.load_test --baseline results.json --tolerance 0.2
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.mock_openai_server import MockConfig, MockOpenAIServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODES = ("qa", "qa_stream", "step_by_step_stream", "hint", "assess", "quiz_generate", "quiz_generate_stream",
+         "quiz_evaluate", "quiz_bulk_evaluate", "adaptive", "app")
+
+# Submissions graded together by one quiz_bulk_evaluate action
+CLASS_SIZE = 30
+
+# Fallback texts the app returns instead of raising; any of them counts as an error
+ERROR_MARKERS = (
+    "I apologize",
+    "Error generating quiz",
+    "Error evaluating",
+    "Error generating adaptive question",
+    "Error in assessment"
+)
+
+SUBJECTS = ["Calculus", "Linear Algebra", "Data Science", "General Math"]
+DIFFICULTIES = ["Beginner", "Intermediate", "Advanced"]
+
+def percentile(values, q):
+    """
+    Nearest-rank percentile of a list of numbers, or 0.0 when empty
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+def is_error(result):
+    """
+    Whether a mode's return value is one of the app's fallback error results
+    """
+    text = json.dumps(result, default=str) if not isinstance(result, str) else result
+    return any(marker in text for marker in ERROR_MARKERS)
+
+class Workload:
+    """
+    Prompt source for simulated students; repeat_ratio of prompts come from a small shared pool
+    """
+
+    def __init__(self, repeat_ratio=0.0, pool_size=10, seed=None):
+        self.repeat_ratio = repeat_ratio
+        self.pool_size = pool_size
+        self.random = random.Random(seed)
+        self.counter = 0
+        self.lock = threading.Lock()
+
+    def prompt(self, template):
+        with self.lock:
+            if self.random.random() < self.repeat_ratio:
+                n = self.random.randrange(self.pool_size)
+            else:
+                self.counter += 1
+                n = self.pool_size + self.counter
+            return template.format(n=n), self.random.choice(SUBJECTS), self.random.choice(DIFFICULTIES)
+
+class ModeResult:
+    """
+    Latencies and outcomes collected for one mode
+    """
+
+    def __init__(self, mode):
+        self.mode = mode
+        self.latencies = []
+        self.ttfts = []
+        self.errors = 0
+        self.elapsed = 0.0
+        self.lock = threading.Lock()
+
+    def record(self, latency, error, ttft=None):
+        with self.lock:
+            self.latencies.append(latency)
+            if ttft is not None:
+                self.ttfts.append(ttft)
+            if error:
+                self.errors += 1
+
+    def summary(self):
+        count = len(self.latencies)
+        summary = {
+            "requests": count,
+            "errors": self.errors,
+            "error_rate": self.errors / count if count else 0.0,
+            "throughput": count / self.elapsed if self.elapsed else 0.0,
+            "p50": percentile(self.latencies, 0.50),
+            "p95": percentile(self.latencies, 0.95),
+            "p99": percentile(self.latencies, 0.99)
+        }
+        if self.ttfts:
+            summary["ttft_p50"] = percentile(self.ttfts, 0.50)
+            summary["ttft_p95"] = percentile(self.ttfts, 0.95)
+        return summary
+
+def consume_stream(stream):
+    """
+    Drain a text stream, returning the full text and seconds to the first chunk
+    """
+    start = time.perf_counter()
+    ttft = None
+    parts = []
+    for text in stream:
+        if ttft is None:
+            ttft = time.perf_counter() - start
+        parts.append(text)
+    return "".join(parts), ttft
+
+def build_operations(tutor, quiz_gen, workload, app_path):
+    """
+    One callable per mode; each performs a single student action and returns (result, ttft)
+    """
+    graded_quiz = {
+        "title": "Load test quiz",
+        "questions": [
+            {"type": "problem_solving", "question": f"Explain why the derivative of x^{i + 2} is {i + 2}x^{i + 1}.",
+             "correct_answer": f"{i + 2}*x^{i + 1}"}
+            for i in range(5)
+        ]
+    }
+
+    def qa():
+        return tutor.answer_question(*workload.prompt("What is the derivative of x^{n}?")), None
+
+    def qa_stream():
+        return consume_stream(tutor.answer_question_stream(*workload.prompt("Why does x^{n} grow faster than x?")))
+
+    def step_by_step_stream():
+        return consume_stream(tutor.explain_step_by_step_stream(*workload.prompt("Integrate x^{n} * sin(x)")))
+
+    def hint():
+        # A student asking for every rung of the ladder in turn; later rungs are served from the cache when enabled
+        problem = workload.prompt("Find the eigenvalues of [[{n}, 1], [1, {n}]]")
+        return [tutor.generate_hint(*problem, level=level) for level in range(3)], None
+
+    def assess():
+        question, _, _ = workload.prompt("Answer {n}")
+        return tutor.assess_difficulty(question, "42"), None
+
+    def quiz_generate():
+        _, subject, difficulty = workload.prompt("")
+        return quiz_gen.generate_quiz(subject, difficulty, "Mixed", 5), None
+
+    def quiz_generate_stream():
+        # ttft here is the time to the first complete question
+        _, subject, difficulty = workload.prompt("")
+        start = time.perf_counter()
+        ttft = None
+        quiz = None
+        for quiz in quiz_gen.generate_quiz_stream(subject, difficulty, "Mixed", 5):
+            if ttft is None and quiz["questions"]:
+                ttft = time.perf_counter() - start
+        return quiz, ttft
+
+    def quiz_evaluate():
+        # Free-form answers that the local checker cannot settle, so grading goes to the model
+        answers = {i: f"I think it is the power rule, attempt {workload.prompt('{n}')[0]}" for i in range(5)}
+        return quiz_gen.evaluate_quiz(graded_quiz, answers), None
+
+    def quiz_bulk_evaluate():
+        # A class handing in the same quiz: free-form answers repeat across students with different spacing and case
+        classroom_quiz = {
+            "title": "Load test classroom quiz",
+            "questions": [
+                {"type": "multiple_choice", "question": "What is the derivative of x^2?",
+                 "options": ["A) 2x", "B) x", "C) 2", "D) x^2"], "correct_answer": "A) 2x", "explanation": "Power rule."}
+            ] + graded_quiz["questions"]
+        }
+        run = workload.prompt("{n}")[0]
+        variants = [f"I think it is the power rule, run {run}", f"i think it is the POWER rule, run {run}.",
+                    f"It follows from the chain rule, run {run}", f"No idea, run {run}"]
+        submissions = {
+            f"student-{s}": {
+                0: workload.random.choice(classroom_quiz["questions"][0]["options"]),
+                **{i: workload.random.choice(variants) for i in range(1, len(classroom_quiz["questions"]))}
+            }
+            for s in range(CLASS_SIZE)
+        }
+        return quiz_gen.evaluate_submissions(classroom_quiz, submissions), None
+
+    def adaptive():
+        _, subject, difficulty = workload.prompt("")
+        history = [workload.random.random() for _ in range(5)]
+        return quiz_gen.generate_adaptive_question(subject, difficulty, history), None
+
+    def app():
+        from streamlit.testing.v1 import AppTest
+        question, _, _ = workload.prompt("What is the limit of (1 + 1/{n})^{n}?")
+        at = AppTest.from_file(app_path, default_timeout=120)
+        at.run()
+        at.chat_input[0].set_value(question).run()
+        if at.exception:
+            return f"Error evaluating app: {at.exception[0].message}", None
+        return at.session_state.chat_history[-1]["content"], None
+
+    return {
+        "qa": qa,
+        "qa_stream": qa_stream,
+        "step_by_step_stream": step_by_step_stream,
+        "hint": hint,
+        "assess": assess,
+        "quiz_generate": quiz_generate,
+        "quiz_generate_stream": quiz_generate_stream,
+        "quiz_evaluate": quiz_evaluate,
+        "quiz_bulk_evaluate": quiz_bulk_evaluate,
+        "adaptive": adaptive,
+        "app": app
+    }
+
+def run_mode(mode, operation, students, iterations):
+    """
+    Run iterations actions for each of students concurrent workers
+    """
+    result = ModeResult(mode)
+
+    def student():
+        for _ in range(iterations):
+            start = time.perf_counter()
+            try:
+                value, ttft = operation()
+                error = is_error(value)
+            except Exception:
+                ttft, error = None, True
+            result.record(time.perf_counter() - start, error, ttft)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=students) as executor:
+        for future in [executor.submit(student) for _ in range(students)]:
+            future.result()
+    result.elapsed = time.perf_counter() - start
+    return result
+
+def compare(results, baseline, tolerance):
+    """
+    Regressions against a baseline run: p95 latency or error rate worse than the tolerance allows
+    """
+    regressions = []
+    for mode, summary in results.items():
+        previous = baseline.get(mode)
+        if not previous:
+            continue
+        if previous["p95"] and summary["p95"] > previous["p95"] * (1 + tolerance):
+            regressions.append(f"{mode}: p95 {summary['p95']:.3f}s vs baseline {previous['p95']:.3f}s")
+        if summary["error_rate"] > previous["error_rate"] + tolerance / 10:
+            regressions.append(f"{mode}: error rate {summary['error_rate']:.1%} vs baseline {previous['error_rate']:.1%}")
+    return regressions
+
+def print_report(results):
+    print(f"{'mode':<22}{'reqs':>6}{'err%':>7}{'req/s':>8}{'p50':>8}{'p95':>8}{'p99':>8}{'ttft95':>8}")
+    for mode, s in results.items():
+        ttft = f"{s['ttft_p95']:.3f}" if "ttft_p95" in s else "-"
+        print(
+            f"{mode:<22}{s['requests']:>6}{s['error_rate'] * 100:>6.1f}%{s['throughput']:>8.2f}"
+            f"{s['p50']:>8.3f}{s['p95']:>8.3f}{s['p99']:>8.3f}{ttft:>8}"
+        )
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--modes", default=",".join(m for m in MODES if m != "app"),
+                        help=f"comma-separated subset of {', '.join(MODES)}")
+    parser.add_argument("--students", type=int, default=10, help="concurrent simulated students")
+    parser.add_argument("--iterations", type=int, default=3, help="actions per student per mode")
+    parser.add_argument("--repeat-ratio", type=float, default=0.0, help="share of prompts drawn from a small shared pool")
+    parser.add_argument("--cache", action="store_true", help="give the tutor in-memory exact and semantic caches")
+    parser.add_argument("--latency-ms", type=float, default=300.0)
+    parser.add_argument("--latency-sigma", type=float, default=0.4)
+    parser.add_argument("--tokens-per-second", type=float, default=200.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--json", dest="json_path", help="write the summary to this file")
+    parser.add_argument("--baseline", help="summary JSON from an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative p95 slowdown")
+    args = parser.parse_args(argv)
+
+    modes = [mode.strip() for mode in args.modes.split(",") if mode.strip()]
+    unknown = [mode for mode in modes if mode not in MODES]
+    if unknown:
+        parser.error(f"unknown modes: {', '.join(unknown)}")
+
+    server = MockOpenAIServer(MockConfig(
+        latency_ms=args.latency_ms,
+        latency_sigma=args.latency_sigma,
+        tokens_per_second=args.tokens_per_second,
+        error_rate=args.error_rate,
+        retry_after=0.2,
+        seed=args.seed
+    )).start()
+
+    # The client and scheduler read their settings at first use, so configure them before importing the app
+    os.environ["OPENAI_BASE_URL"] = server.base_url
+    os.environ["OPENAI_API_KEY"] = "mock-key"
+    os.environ.setdefault("EDUPROMPT_RPM", "100000")
+    os.environ.setdefault("EDUPROMPT_TPM", "100000000")
+    os.environ.setdefault("EDUPROMPT_CACHE_PATH", "")
+    os.environ.setdefault("EDUPROMPT_QUIZ_BANK_PATH", ":memory:")
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+
+    from stem_tutor import STEMTutor
+    from quiz_generator import QuizGenerator
+    from response_cache import ResponseCache
+    from semantic_cache import SemanticCache
+
+    if args.cache:
+        tutor = STEMTutor(cache=ResponseCache(), semantic_cache=SemanticCache())
+    else:
+        tutor = STEMTutor()
+    quiz_gen = QuizGenerator()
+    workload = Workload(args.repeat_ratio, seed=args.seed)
+    operations = build_operations(tutor, quiz_gen, workload, os.path.join(ROOT, "app.py"))
+
+    results = {}
+    try:
+        for mode in modes:
+            results[mode] = run_mode(mode, operations[mode], args.students, args.iterations).summary()
+    finally:
+        server.stop()
+
+    print_report(results)
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
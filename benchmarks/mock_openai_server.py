@@ -0,0 +1,297 @@
+"""
+Local OpenAI-compatible stand-in for offline load testing
+
+Serves POST /v1/chat/completions with configurable latency, token rate and
+error rate, returning canned JSON that matches the quiz, grading, assessment
+and adaptive-question schemas used by the app.
+
+    python -m benchmarks.mock_openai_server --port 8765 --latency-ms 800 --error-rate 0.02
+"""
+import re
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class MockConfig:
+    """
+    Latency, throughput and failure settings for the mock server
+    """
+
+    def __init__(self, latency_ms=500.0, latency_sigma=0.4, tokens_per_second=60.0,
+                 error_rate=0.0, rate_limit_share=0.5, retry_after=1.0, completion_tokens=200, seed=None):
+        # Time to first token is lognormal around latency_ms
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+        self.tokens_per_second = tokens_per_second
+        # Fraction of requests that fail; rate_limit_share of failures are 429s, the rest 500s
+        self.error_rate = error_rate
+        self.rate_limit_share = rate_limit_share
+        self.retry_after = retry_after
+        self.completion_tokens = completion_tokens
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def first_token_delay(self):
+        with self.lock:
+            return self.latency_ms / 1000 * self.random.lognormvariate(0, self.latency_sigma)
+
+    def failure(self):
+        """
+        Return an HTTP status to fail with, or None
+        """
+        with self.lock:
+            if self.random.random() >= self.error_rate:
+                return None
+            return 429 if self.random.random() < self.rate_limit_share else 500
+
+def canned_content(request):
+    """
+    Build a plausible response body for the request's prompt and response format
+    """
+    messages = request.get("messages", [])
+    system = next((m.get("content", "") for m in messages if m.get("role") == "system"), "")
+    user = next((m.get("content", "") for m in reversed(messages) if m.get("role") == "user"), "")
+
+    if (request.get("response_format") or {}).get("type") != "json_object":
+        return "Here is a worked explanation with $x^2$ notation. " * 20
+
+    topics = re.search(r"Topics?: (?:any of )?(.+)", system)
+    topics = [t.strip() for t in topics.group(1).split(",")] if topics else ["General"]
+
+    if '"results"' in system:
+        items = [int(i) for i in re.findall(r"^Item (\d+)", user, re.M)]
+        return json.dumps({"results": [
+            {"index": i, "correct": i % 2 == 0, "partial_credit": 1.0 if i % 2 == 0 else 0.5,
+             "explanation": "Mock batched evaluation."}
+            for i in items
+        ]})
+
+    if '"partial_credit"' in system:
+        return json.dumps({"correct": True, "partial_credit": 1.0, "explanation": "Mock evaluation."})
+
+    if '"assessment"' in system:
+        return json.dumps({"assessment": "appropriate", "confidence": 0.8, "reasoning": "Mock assessment."})
+
+    if '"questions"' in system:
+        match = re.search(r"with (\d+) questions", user)
+        count = int(match.group(1)) if match else 5
+        quiz_type = "Problem Solving" if "Problem Solving" in user else "Multiple Choice" if "Multiple Choice" in user else "Mixed"
+        questions = []
+        for i in range(count):
+            kind = {"Problem Solving": "problem_solving", "Multiple Choice": "multiple_choice"}.get(
+                quiz_type, ["multiple_choice", "problem_solving"][i % 2]
+            )
+            token = random.randint(0, 10 ** 9)
+            if kind == "multiple_choice":
+                questions.append({
+                    "type": kind,
+                    "topic": topics[i % len(topics)],
+                    "question": f"Mock question {token}: what is $\\frac{{d}}{{dx}} x^{i + 2}$?",
+                    "options": [f"A) {i + 2}x^{i + 1}", "B) x", "C) 0", "D) 1"],
+                    "correct_answer": f"A) {i + 2}x^{i + 1}",
+                    "explanation": "Power rule."
+                })
+            else:
+                questions.append({
+                    "type": kind,
+                    "topic": topics[i % len(topics)],
+                    "question": f"Mock problem {token}: differentiate $x^{i + 2}$.",
+                    "correct_answer": f"{i + 2}*x^{i + 1}",
+                    "explanation": "Power rule."
+                })
+        return json.dumps({"title": "Mock Quiz", "subject": "Mock", "difficulty": "Mock", "questions": questions})
+
+    if '"steps"' in system:
+        return json.dumps({
+            "steps": [
+                {"reasoning": f"Mock step {i + 1}: apply the power rule.", "expression": f"\\frac{{d}}{{dx}} x^{i + 2} = {i + 2}x^{i + 1}"}
+                for i in range(4)
+            ],
+            "final_answer": "Mock final answer",
+            "tips": "Mock tip."
+        })
+
+    if '"hints"' in system:
+        return json.dumps({"hints": [
+            "Mock nudge: what rule applies here?",
+            "Mock method: use the power rule.",
+            "Mock partial step: the exponent comes down in front."
+        ]})
+
+    if "single" in system.lower():
+        return json.dumps({
+            "question": f"Mock adaptive question {random.randint(0, 10 ** 9)}",
+            "topic": random.choice(topics),
+            "type": "multiple_choice",
+            "options": ["A) 1", "B) 2", "C) 3", "D) 4"],
+            "correct_answer": "A) 1",
+            "explanation": "Mock explanation."
+        })
+
+    return json.dumps({"result": "ok"})
+
+def _chunks(text, size=4):
+    """
+    Split text into pseudo-tokens of a few characters
+    """
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+def make_handler(config):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def log_message(self, format, *args):
+            pass
+
+        def do_POST(self):
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                self._send_json(404, {"error": {"message": "not found"}})
+                return
+
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+
+            status = config.failure()
+            time.sleep(config.first_token_delay())
+            if status is not None:
+                headers = {"retry-after": str(config.retry_after)} if status == 429 else {}
+                self._send_json(status, {"error": {"message": f"mock error {status}", "type": "mock"}}, headers)
+                return
+
+            content = canned_content(request)
+            tokens = _chunks(content)
+            if request.get("max_tokens"):
+                tokens = tokens[:request["max_tokens"]]
+            prompt_tokens = sum(len(str(m.get("content", ""))) for m in request.get("messages", [])) // 4
+            model = request.get("model", "mock")
+
+            if request.get("stream"):
+                usage = None
+                if (request.get("stream_options") or {}).get("include_usage"):
+                    usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(tokens),
+                             "total_tokens": prompt_tokens + len(tokens)}
+                self._stream(model, tokens, usage)
+                return
+
+            self._send_json(200, {
+                "id": "chatcmpl-mock",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": "".join(tokens)},
+                    "finish_reason": "stop"
+                }],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": len(tokens),
+                    "total_tokens": prompt_tokens + len(tokens)
+                }
+            }, delay_per_token=len(tokens))
+
+        def _stream(self, model, tokens, usage=None):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            interval = 1.0 / config.tokens_per_second if config.tokens_per_second else 0
+            for i, token in enumerate(tokens):
+                if i:
+                    time.sleep(interval)
+                self._write_chunk(model, {"content": token}, None)
+            self._write_chunk(model, {}, "stop")
+            if usage is not None:
+                self._write_event(json.dumps({
+                    "id": "chatcmpl-mock",
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [],
+                    "usage": usage
+                }))
+            self._write_event("[DONE]")
+            self.wfile.write(b"0\r\n\r\n")
+
+        def _write_chunk(self, model, delta, finish_reason):
+            self._write_event(json.dumps({
+                "id": "chatcmpl-mock",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+            }))
+
+        def _write_event(self, data):
+            payload = f"data: {data}\n\n".encode("utf-8")
+            self.wfile.write(f"{len(payload):x}\r\n".encode("ascii") + payload + b"\r\n")
+            self.wfile.flush()
+
+        def _send_json(self, status, body, headers=None, delay_per_token=0):
+            # Non-streamed completions still take as long as generating every token
+            if delay_per_token and config.tokens_per_second:
+                time.sleep(delay_per_token / config.tokens_per_second)
+            payload = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(payload)
+
+    return Handler
+
+class MockOpenAIServer:
+    """
+    Threaded mock server that can run in the background of a benchmark
+    """
+
+    def __init__(self, config=None, host="127.0.0.1", port=0):
+        self.config = config or MockConfig()
+        self.httpd = ThreadingHTTPServer((host, port), make_handler(self.config))
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="mock-openai", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=500.0)
+    parser.add_argument("--latency-sigma", type=float, default=0.4)
+    parser.add_argument("--tokens-per-second", type=float, default=60.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    server = MockOpenAIServer(
+        MockConfig(args.latency_ms, args.latency_sigma, args.tokens_per_second, args.error_rate, seed=args.seed),
+        host=args.host,
+        port=args.port
+    )
+    print(f"Mock OpenAI server listening on {server.base_url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+if __name__ == "__main__":
+    main()
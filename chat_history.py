@@ -0,0 +1,109 @@
+import os
+import time
+import sqlite3
+import threading
+from collections import deque
+
+class ChatStore:
+    """
+    SQLite store for chat messages that have scrolled out of a session's in-memory window
+    """
+    
+    def __init__(self, db_path=":memory:", max_age_seconds=7 * 24 * 3600):
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS chat_messages (
+                session_id TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                role TEXT NOT NULL,
+                content TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (session_id, seq)
+            )"""
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS chat_messages_created ON chat_messages (created_at)")
+        # Sessions do not announce their end, so old spills are pruned on startup
+        self._db.execute("DELETE FROM chat_messages WHERE created_at < ?", (time.time() - max_age_seconds,))
+        self._db.commit()
+    
+    def append(self, session_id, seq, role, content):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO chat_messages (session_id, seq, role, content, created_at) VALUES (?, ?, ?, ?, ?)",
+                (session_id, seq, role, content, time.time())
+            )
+            self._db.commit()
+    
+    def page(self, session_id, before_seq, limit):
+        """
+        Up to limit messages preceding before_seq, oldest first
+        """
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT role, content FROM chat_messages WHERE session_id = ? AND seq < ? ORDER BY seq DESC LIMIT ?",
+                (session_id, before_seq, limit)
+            ).fetchall()
+        return [{"role": role, "content": content} for role, content in reversed(rows)]
+    
+    def delete_session(self, session_id):
+        with self._lock:
+            self._db.execute("DELETE FROM chat_messages WHERE session_id = ?", (session_id,))
+            self._db.commit()
+
+class ChatHistory:
+    """
+    One session's chat: a capped window of recent messages, with older ones spilled to a ChatStore
+    """
+    
+    def __init__(self, store, session_id, window=20):
+        self.store = store
+        self.session_id = session_id
+        self.window = window
+        self.recent = deque()
+        # Sequence number of the oldest message still in memory; everything before it is on disk
+        self.first_seq = 0
+        self.next_seq = 0
+    
+    def __iter__(self):
+        return iter(self.recent)
+    
+    def __getitem__(self, index):
+        return self.recent[index]
+    
+    @property
+    def total(self):
+        return self.next_seq
+    
+    @property
+    def spilled(self):
+        """
+        Number of messages stored on disk rather than in memory
+        """
+        return self.first_seq
+    
+    def append(self, role, content):
+        self.recent.append({"role": role, "content": content})
+        self.next_seq += 1
+        while len(self.recent) > self.window:
+            message = self.recent.popleft()
+            self.store.append(self.session_id, self.first_seq, message["role"], message["content"])
+            self.first_seq += 1
+    
+    def earlier(self, count):
+        """
+        The count messages just before the in-memory window, oldest first
+        """
+        if count <= 0 or not self.first_seq:
+            return []
+        return self.store.page(self.session_id, self.first_seq, count)
+    
+    def clear(self):
+        self.store.delete_session(self.session_id)
+        self.recent.clear()
+        self.first_seq = 0
+        self.next_seq = 0
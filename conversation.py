@@ -0,0 +1,84 @@
+from collections import deque
+from prompts import count_tokens
+
+class ConversationContext:
+    """
+    Recent Q&A turns kept within a token budget, with older turns folded into a running summary
+    """
+    
+    def __init__(self, token_budget=2000, min_recent_turns=2):
+        self.token_budget = token_budget
+        # Turns always sent verbatim, however long they are
+        self.min_recent_turns = min_recent_turns
+        self.turns = deque()
+        self.turn_tokens = 0
+        self.summary = ""
+        self.summary_tokens = 0
+        self.summaries = 0
+    
+    @property
+    def has_history(self):
+        return bool(self.turns or self.summary)
+    
+    @property
+    def summary_budget(self):
+        """
+        Token allowance for the running summary
+        """
+        return max(64, self.token_budget // 4)
+    
+    def used_tokens(self):
+        return self.summary_tokens + self.turn_tokens
+    
+    def add(self, role, content):
+        tokens = count_tokens(content)
+        self.turns.append({"role": role, "content": content, "tokens": tokens})
+        self.turn_tokens += tokens
+    
+    def add_exchange(self, question, answer):
+        self.add("user", question)
+        self.add("assistant", answer)
+    
+    def take_overflow(self):
+        """
+        Remove and return the oldest turns once the budget is exceeded, or [] while within it
+        
+        Turns are removed until they and a full-size summary fit in half the budget,
+        so the summary is regenerated every few exchanges rather than on every turn.
+        """
+        if self.used_tokens() <= self.token_budget:
+            return []
+        
+        folded = []
+        while len(self.turns) > self.min_recent_turns and self.turn_tokens + self.summary_budget > self.token_budget // 2:
+            turn = self.turns.popleft()
+            self.turn_tokens -= turn["tokens"]
+            folded.append(turn)
+        return folded
+    
+    def set_summary(self, summary, folded):
+        """
+        Replace the running summary after folding turns; without one, keep the tail of a plain transcript
+        """
+        if not summary:
+            transcript = "\n".join(f"{turn['role']}: {turn['content']}" for turn in folded)
+            summary = f"{self.summary}\n{transcript}".strip()[-self.summary_budget * 4:]
+        self.summary = summary
+        self.summary_tokens = count_tokens(summary)
+        self.summaries += 1
+    
+    def messages(self):
+        """
+        Context messages to send ahead of the next question
+        """
+        messages = []
+        if self.summary:
+            messages.append({"role": "system", "content": f"Summary of the earlier conversation:\n{self.summary}"})
+        messages.extend({"role": turn["role"], "content": turn["content"]} for turn in self.turns)
+        return messages
+    
+    def clear(self):
+        self.turns.clear()
+        self.turn_tokens = 0
+        self.summary = ""
+        self.summary_tokens = 0
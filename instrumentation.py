@@ -0,0 +1,280 @@
+import json
+import time
+import bisect
+import threading
+from collections import deque
+
+# Histogram bucket upper bounds
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+TOKEN_BUCKETS = (16, 64, 256, 512, 1024, 2048, 4096, 8192)
+
+class Histogram:
+    """
+    Cumulative-bucket histogram plus a window of recent samples for percentiles
+    """
+    
+    def __init__(self, buckets, window=2048):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.recent = deque(maxlen=window)
+    
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.recent.append(value)
+    
+    def percentile(self, q):
+        """
+        Nearest-rank percentile over the recent window, or None without samples
+        """
+        if not self.recent:
+            return None
+        ordered = sorted(self.recent)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+    
+    def cumulative(self):
+        """
+        (upper bound, cumulative count) pairs ending with +Inf, as Prometheus expects
+        """
+        total = 0
+        pairs = []
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            pairs.append((bound, total))
+        return pairs
+    
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "p50": self.percentile(0.50),
+            "p95": self.percentile(0.95),
+            "p99": self.percentile(0.99)
+        }
+
+class CallTimer:
+    """
+    Measures one LLM call from the caller's point of view and records it when finished
+    """
+    
+    def __init__(self, instrumentation, method, model):
+        self.instrumentation = instrumentation
+        self.method = method
+        self.model = model
+        self.start = time.perf_counter()
+        self.ttft = None
+        # Only the caller whose request went upstream is charged for its tokens
+        self.leader = False
+        self.finished = False
+    
+    def lead(self, fn):
+        """
+        Wrap the upstream call so running it marks this caller as the single-flight leader
+        """
+        def run(*args, **kwargs):
+            self.leader = True
+            return fn(*args, **kwargs)
+        return run
+    
+    def finish(self, outcome="success", usage=None):
+        if self.finished:
+            return
+        self.finished = True
+        self.instrumentation.record(
+            self.method,
+            self.model,
+            time.perf_counter() - self.start,
+            outcome=outcome,
+            cache="miss" if self.leader else "coalesced",
+            ttft=self.ttft,
+            prompt_tokens=getattr(usage, "prompt_tokens", None) if self.leader else None,
+            completion_tokens=getattr(usage, "completion_tokens", None) if self.leader else None
+        )
+    
+    def wrap_stream(self, stream, classify):
+        """
+        Pass chunks through, noting the first content chunk and the usage chunk at the end
+        """
+        usage = None
+        try:
+            for chunk in stream:
+                if self.ttft is None and getattr(chunk, "choices", None):
+                    self.ttft = time.perf_counter() - self.start
+                usage = getattr(chunk, "usage", None) or usage
+                yield chunk
+        except GeneratorExit:
+            self.finish("cancelled", usage)
+            raise
+        except Exception as e:
+            self.finish(classify(e), usage)
+            raise
+        self.finish(usage=usage)
+
+class Instrumentation:
+    """
+    Process-wide aggregation of per-call latency, token usage, outcomes and cache status
+    """
+    
+    def __init__(self, recent_calls=500):
+        self._lock = threading.Lock()
+        self._recent_calls = recent_calls
+        self.reset()
+    
+    def reset(self):
+        with self._lock:
+            self.started_at = time.time()
+            self.latency = {}
+            self.ttft = {}
+            self.completion_tokens = {}
+            self.calls = {}
+            self.tokens = {}
+            self.retries = {}
+            self.recent = deque(maxlen=self._recent_calls)
+    
+    def start_call(self, method, model):
+        return CallTimer(self, method, model)
+    
+    def record(self, method, model, wall_time, outcome="success", cache="miss", ttft=None,
+               prompt_tokens=None, completion_tokens=None):
+        """
+        Record one call; cache is "miss", "coalesced" or the name of the cache that served it
+        """
+        with self._lock:
+            self.latency.setdefault(method, Histogram(LATENCY_BUCKETS)).observe(wall_time)
+            if ttft is not None:
+                self.ttft.setdefault(method, Histogram(LATENCY_BUCKETS)).observe(ttft)
+            if completion_tokens is not None:
+                self.completion_tokens.setdefault(method, Histogram(TOKEN_BUCKETS)).observe(completion_tokens)
+            
+            labels = (method, model or "", outcome, cache)
+            self.calls[labels] = self.calls.get(labels, 0) + 1
+            for kind, count in (("prompt", prompt_tokens), ("completion", completion_tokens)):
+                if count:
+                    token_labels = (method, model or "", kind)
+                    self.tokens[token_labels] = self.tokens.get(token_labels, 0) + count
+            
+            self.recent.append({
+                "time": time.time(),
+                "method": method,
+                "model": model,
+                "wall_time": wall_time,
+                "ttft": ttft,
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "outcome": outcome,
+                "cache": cache
+            })
+    
+    def record_cache_hit(self, method, model, wall_time, cache):
+        """
+        Record a call answered without the API, e.g. from the response cache or quiz bank
+        """
+        self.record(method, model, wall_time, cache=cache)
+    
+    def record_retry(self, method, outcome):
+        with self._lock:
+            self.retries[(method, outcome)] = self.retries.get((method, outcome), 0) + 1
+    
+    def summary(self):
+        """
+        Per-method percentiles, counts, error and cache-hit rates and token totals
+        """
+        with self._lock:
+            methods = {}
+            for (method, _, outcome, cache), count in self.calls.items():
+                entry = methods.setdefault(method, {
+                    "calls": 0, "errors": 0, "cache_hits": 0, "coalesced": 0,
+                    "prompt_tokens": 0, "completion_tokens": 0, "retries": 0
+                })
+                entry["calls"] += count
+                if outcome not in ("success", "cancelled"):
+                    entry["errors"] += count
+                if cache == "coalesced":
+                    entry["coalesced"] += count
+                elif cache != "miss":
+                    entry["cache_hits"] += count
+            for (method, _, kind), count in self.tokens.items():
+                methods[method][f"{kind}_tokens"] += count
+            for (method, _), count in self.retries.items():
+                if method in methods:
+                    methods[method]["retries"] += count
+            
+            for method, entry in methods.items():
+                entry["error_rate"] = entry["errors"] / entry["calls"]
+                entry["cache_hit_rate"] = entry["cache_hits"] / entry["calls"]
+                entry["latency"] = self.latency[method].snapshot()
+                if method in self.ttft:
+                    entry["ttft"] = self.ttft[method].snapshot()
+            return methods
+    
+    def recent_calls(self, limit=50):
+        with self._lock:
+            return list(self.recent)[-limit:]
+    
+    def to_json(self):
+        return json.dumps({
+            "started_at": self.started_at,
+            "methods": self.summary(),
+            "recent_calls": self.recent_calls()
+        }, indent=2)
+    
+    def to_prometheus(self):
+        """
+        Render every metric in the Prometheus text exposition format
+        """
+        with self._lock:
+            lines = []
+            self._histogram_lines(lines, "eduprompt_llm_call_duration_seconds",
+                                  "Wall time of LLM calls as seen by the caller", self.latency)
+            self._histogram_lines(lines, "eduprompt_llm_time_to_first_token_seconds",
+                                  "Time to the first streamed chunk", self.ttft)
+            self._histogram_lines(lines, "eduprompt_llm_completion_tokens",
+                                  "Completion tokens per call", self.completion_tokens)
+            
+            lines.append("# HELP eduprompt_llm_calls_total LLM calls by outcome and cache status")
+            lines.append("# TYPE eduprompt_llm_calls_total counter")
+            for (method, model, outcome, cache), count in sorted(self.calls.items()):
+                labels = _labels(method=method, model=model, outcome=outcome, cache=cache)
+                lines.append(f"eduprompt_llm_calls_total{labels} {count}")
+            
+            lines.append("# HELP eduprompt_llm_tokens_total Tokens billed by the API")
+            lines.append("# TYPE eduprompt_llm_tokens_total counter")
+            for (method, model, kind), count in sorted(self.tokens.items()):
+                lines.append(f"eduprompt_llm_tokens_total{_labels(method=method, model=model, kind=kind)} {count}")
+            
+            lines.append("# HELP eduprompt_llm_retries_total Retried attempts by failure outcome")
+            lines.append("# TYPE eduprompt_llm_retries_total counter")
+            for (method, outcome), count in sorted(self.retries.items()):
+                lines.append(f"eduprompt_llm_retries_total{_labels(method=method, outcome=outcome)} {count}")
+            return "\n".join(lines) + "\n"
+    
+    def _histogram_lines(self, lines, name, help_text, histograms):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} histogram")
+        for method, histogram in sorted(histograms.items()):
+            for bound, count in histogram.cumulative():
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{name}_bucket{_labels(method=method, le=le)} {count}")
+            lines.append(f"{name}_sum{_labels(method=method)} {histogram.sum}")
+            lines.append(f"{name}_count{_labels(method=method)} {histogram.count}")
+
+def _labels(**labels):
+    """
+    Format a Prometheus label set, escaping backslashes, quotes and newlines
+    """
+    escaped = []
+    for name, value in labels.items():
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        escaped.append(f'{name}="{value}"')
+    return "{" + ",".join(escaped) + "}"
+
+_instrumentation = Instrumentation()
+
+def get_instrumentation():
+    """
+    Return the process-wide Instrumentation shared by every session
+    """
+    return _instrumentation
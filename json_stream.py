@@ -0,0 +1,96 @@
+import json
+
+class JSONArrayStream:
+    """
+    Incremental parser for a streamed JSON object that yields the items of one array as each completes
+    
+    Only the characters that arrive are scanned, once each, so a quiz's first question is
+    available while the model is still writing the rest. Top-level string fields seen so
+    far (such as a title) are exposed in fields.
+    """
+    
+    def __init__(self, key="questions"):
+        self.key = key
+        self.fields = {}
+        self.buffer = ""
+        self._pos = 0
+        # Open containers, "{" or "[", outermost first
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = None
+        self._last_string = None
+        self._current_key = None
+        self._in_array = False
+        self._item_start = None
+    
+    def feed(self, text):
+        """
+        Add a chunk of streamed text and return the array items it completed
+        """
+        self.buffer += text
+        items = []
+        buffer = self.buffer
+        for pos in range(self._pos, len(buffer)):
+            char = buffer[pos]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    self._end_string(buffer[self._string_start:pos + 1])
+                continue
+            
+            if char == '"':
+                self._in_string = True
+                self._string_start = pos
+            elif char == ":":
+                self._current_key = self._last_string
+            elif char == ",":
+                self._current_key = None
+            elif char in "{[":
+                if char == "[" and self._stack == ["{"] and self._current_key == self.key:
+                    self._in_array = True
+                elif char == "{" and self._in_array and len(self._stack) == 2:
+                    self._item_start = pos
+                self._stack.append(char)
+                self._current_key = None
+            elif char in "}]":
+                if self._stack:
+                    self._stack.pop()
+                if char == "}" and self._item_start is not None and len(self._stack) == 2:
+                    item = self._load(buffer[self._item_start:pos + 1])
+                    if item is not None:
+                        items.append(item)
+                    self._item_start = None
+                elif char == "]" and self._in_array and len(self._stack) == 1:
+                    self._in_array = False
+        self._pos = len(buffer)
+        return items
+    
+    def result(self):
+        """
+        The complete parsed object, or None if the text so far is not valid JSON
+        """
+        return self._load(self.buffer)
+    
+    def _end_string(self, literal):
+        """
+        Remember a finished top-level string as a possible key, recording it if it is a value
+        """
+        # Strings inside array items are parsed with their item instead
+        if len(self._stack) != 1:
+            return
+        value = self._load(literal)
+        if self._current_key is not None and isinstance(value, str):
+            self.fields[self._current_key] = value
+            self._current_key = None
+        self._last_string = value
+    
+    def _load(self, text):
+        try:
+            return json.loads(text)
+        except ValueError:
+            return None
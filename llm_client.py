@@ -0,0 +1,268 @@
+import os
+import time
+import asyncio
+import random
+import weakref
+import threading
+import httpx
+from openai import (
+    OpenAI,
+    AsyncOpenAI,
+    DefaultHttpxClient,
+    DefaultAsyncHttpxClient,
+    APIConnectionError,
+    APIStatusError,
+    APITimeoutError
+)
+from scheduler import get_scheduler, estimate_tokens, METHOD_PRIORITIES, PRIORITY_BULK, SchedulerTimeout
+from single_flight import get_single_flight, request_key
+from instrumentation import get_instrumentation
+
+# Connection pool and keep-alive settings for the shared HTTP client
+POOL_SIZE = int(os.getenv("EDUPROMPT_HTTP_POOL_SIZE", "50"))
+KEEPALIVE_CONNECTIONS = int(os.getenv("EDUPROMPT_HTTP_KEEPALIVE", "20"))
+KEEPALIVE_EXPIRY = float(os.getenv("EDUPROMPT_HTTP_KEEPALIVE_EXPIRY", "60"))
+CONNECT_TIMEOUT = 5.0
+
+# Read timeouts in seconds per calling method; long generations get more headroom
+METHOD_TIMEOUTS = {
+    "answer_question": 60.0,
+    "explain_step_by_step": 90.0,
+    "generate_hint": 20.0,
+    "assess_difficulty": 20.0,
+    "generate_quiz": 120.0,
+    "evaluate_problem_solving": 45.0,
+    "evaluate_problem_solving_batch": 90.0,
+    "generate_adaptive_question": 45.0,
+    "summarize_conversation": 30.0
+}
+DEFAULT_TIMEOUT = 60.0
+
+MAX_RETRIES = int(os.getenv("EDUPROMPT_MAX_RETRIES", "4"))
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 20.0
+
+_client = None
+_async_client = None
+_client_lock = threading.Lock()
+
+def get_client():
+    """
+    Return the process-wide OpenAI client with a pooled keep-alive HTTP transport
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                http_client = DefaultHttpxClient(
+                    limits=httpx.Limits(
+                        max_connections=POOL_SIZE,
+                        max_keepalive_connections=KEEPALIVE_CONNECTIONS,
+                        keepalive_expiry=KEEPALIVE_EXPIRY
+                    ),
+                    timeout=httpx.Timeout(DEFAULT_TIMEOUT, connect=CONNECT_TIMEOUT)
+                )
+                # Retries are handled by create_chat_completion so the policy is in one place
+                _client = OpenAI(
+                    api_key=os.getenv("OPENAI_API_KEY"),
+                    http_client=http_client,
+                    max_retries=0
+                )
+    return _client
+
+class LoopAsyncClient:
+    """
+    AsyncOpenAI facade holding one client, and so one connection pool, per running event loop
+
+    An httpx pool is bound to the loop it was first used on, so sharing one across
+    asyncio.run calls fails with "Event loop is closed". Attribute access resolves to the
+    client of the caller's loop; clients go away with their loops.
+    """
+
+    def __init__(self):
+        self._clients = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def for_loop(self):
+        """
+        The AsyncOpenAI client for the running event loop, created on first use
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            client = self._clients.get(loop)
+            if client is None:
+                client = self._clients[loop] = _new_async_client()
+            return client
+
+    def __getattr__(self, name):
+        return getattr(self.for_loop(), name)
+
+def _new_async_client():
+    http_client = DefaultAsyncHttpxClient(
+        limits=httpx.Limits(
+            max_connections=POOL_SIZE,
+            max_keepalive_connections=KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=KEEPALIVE_EXPIRY
+        ),
+        timeout=httpx.Timeout(DEFAULT_TIMEOUT, connect=CONNECT_TIMEOUT)
+    )
+    return AsyncOpenAI(
+        api_key=os.getenv("OPENAI_API_KEY"),
+        http_client=http_client,
+        max_retries=0
+    )
+
+def get_async_client():
+    """
+    Return the process-wide async client, configured like get_client()
+
+    Safe to use from any number of event loops; each loop gets its own AsyncOpenAI client.
+    """
+    global _async_client
+    if _async_client is None:
+        with _client_lock:
+            if _async_client is None:
+                _async_client = LoopAsyncClient()
+    return _async_client
+
+def method_timeout(method):
+    """
+    Timeout for a calling method, with a fixed connect timeout
+    """
+    return httpx.Timeout(METHOD_TIMEOUTS.get(method, DEFAULT_TIMEOUT), connect=CONNECT_TIMEOUT)
+
+def is_retryable(error):
+    """
+    Rate limits, server errors and connection failures are worth retrying
+    """
+    if isinstance(error, APIStatusError):
+        return error.status_code == 429 or error.status_code >= 500
+    return isinstance(error, APIConnectionError)
+
+def retry_delay(error, attempt):
+    """
+    Seconds to wait before the next attempt: Retry-After when given, else jittered exponential backoff
+    """
+    response = getattr(error, "response", None)
+    if response is not None:
+        retry_after_ms = response.headers.get("retry-after-ms")
+        retry_after = response.headers.get("retry-after")
+        try:
+            if retry_after_ms is not None:
+                return min(float(retry_after_ms) / 1000, BACKOFF_CAP) + random.uniform(0, 0.1)
+            if retry_after is not None:
+                return min(float(retry_after), BACKOFF_CAP) + random.uniform(0, 0.1)
+        except ValueError:
+            pass
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+
+def call_priority(method, priority):
+    """
+    Scheduler priority for a call: explicit when given, otherwise by calling method
+    """
+    return METHOD_PRIORITIES.get(method, PRIORITY_BULK) if priority is None else priority
+
+def call_outcome(error):
+    """
+    Outcome label recorded for a failed call
+    """
+    if isinstance(error, (APITimeoutError, SchedulerTimeout, asyncio.TimeoutError)):
+        return "timeout"
+    if isinstance(error, APIStatusError):
+        return "rate_limited" if error.status_code == 429 else f"http_{error.status_code}"
+    if isinstance(error, APIConnectionError):
+        return "connection_error"
+    return "error"
+
+def usage_tokens(response):
+    """
+    Total tokens reported for a completion, or None when the response carries no usage
+    """
+    usage = getattr(response, "usage", None)
+    return getattr(usage, "total_tokens", None)
+
+def create_chat_completion(client, method, priority=None, **kwargs):
+    """
+    Create a chat completion with the method's timeout, retrying transient failures
+
+    Identical concurrent requests share one upstream call (streams are replayed to
+    every caller), and every attempt is admitted through the process-wide scheduler.
+    Wall time, time to first token, token usage and outcome are recorded per call.
+    """
+    kwargs.setdefault("timeout", method_timeout(method))
+    if kwargs.get("stream"):
+        # Ask for a final usage chunk so streamed calls report their tokens too
+        kwargs.setdefault("stream_options", {"include_usage": True})
+    key = request_key(method, client, kwargs)
+    timer = get_instrumentation().start_call(method, kwargs.get("model"))
+    if kwargs.get("stream"):
+        stream = get_single_flight().stream(key, timer.lead(lambda: _create_with_retries(client, method, priority, kwargs)))
+        return timer.wrap_stream(stream, call_outcome)
+    try:
+        response = get_single_flight().do(key, timer.lead(lambda: _create_with_retries(client, method, priority, kwargs)))
+    except Exception as e:
+        timer.finish(call_outcome(e))
+        raise
+    timer.finish(usage=getattr(response, "usage", None))
+    return response
+
+async def acreate_chat_completion(client, method, priority=None, **kwargs):
+    """
+    Async counterpart of create_chat_completion for non-streaming requests
+    """
+    kwargs.setdefault("timeout", method_timeout(method))
+    key = request_key(method, client, kwargs)
+    timer = get_instrumentation().start_call(method, kwargs.get("model"))
+    try:
+        response = await get_single_flight().do_async(
+            key, timer.lead(lambda: _acreate_with_retries(client, method, priority, kwargs))
+        )
+    except BaseException as e:
+        timer.finish("cancelled" if isinstance(e, asyncio.CancelledError) else call_outcome(e))
+        raise
+    timer.finish(usage=getattr(response, "usage", None))
+    return response
+
+def _create_with_retries(client, method, priority, kwargs):
+    """
+    Admit and send one request, retrying transient failures with backoff
+    """
+    scheduler = get_scheduler()
+    priority = call_priority(method, priority)
+    estimated = estimate_tokens(kwargs.get("messages"), kwargs.get("max_tokens"))
+    attempt = 0
+    while True:
+        scheduler.acquire(priority, estimated)
+        try:
+            response = client.chat.completions.create(**kwargs)
+        except Exception as e:
+            if attempt >= MAX_RETRIES or not is_retryable(e):
+                raise
+            get_instrumentation().record_retry(method, call_outcome(e))
+            time.sleep(retry_delay(e, attempt))
+            attempt += 1
+            continue
+        scheduler.reconcile(estimated, usage_tokens(response))
+        return response
+
+async def _acreate_with_retries(client, method, priority, kwargs):
+    """
+    Async counterpart of _create_with_retries
+    """
+    scheduler = get_scheduler()
+    priority = call_priority(method, priority)
+    estimated = estimate_tokens(kwargs.get("messages"), kwargs.get("max_tokens"))
+    attempt = 0
+    while True:
+        await scheduler.acquire_async(priority, estimated)
+        try:
+            response = await client.chat.completions.create(**kwargs)
+        except Exception as e:
+            if attempt >= MAX_RETRIES or not is_retryable(e):
+                raise
+            get_instrumentation().record_retry(method, call_outcome(e))
+            await asyncio.sleep(retry_delay(e, attempt))
+            attempt += 1
+            continue
+        scheduler.reconcile(estimated, usage_tokens(response))
+        return response
@@ -0,0 +1,283 @@
+import os
+import time
+import queue
+import atexit
+import itertools
+import sqlite3
+import threading
+
+# Attempt kinds counted on the Progress Tracking page
+ATTEMPT_KINDS = ("question", "problem", "quiz", "quiz_question")
+
+class ProgressStore:
+    """
+    Persistent per-student attempt log in SQLite with write-behind batching
+    
+    record() only enqueues; a background writer inserts attempts in batches and keeps
+    per-student rollups current, so page counters never scan the attempt log. Reads
+    never wait for the writer: they combine committed rows with the student's own
+    attempts still queued.
+    """
+    
+    def __init__(self, db_path, flush_interval=1.0, batch_size=500):
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        # Queued attempts not yet committed, per student, keyed by sequence number
+        self._pending = {}
+        self._sequence = itertools.count()
+        self._db = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(
+            """CREATE TABLE IF NOT EXISTS attempts (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                student_id TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                subject TEXT NOT NULL,
+                topic TEXT,
+                difficulty TEXT,
+                score REAL,
+                created_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS attempts_student_time ON attempts (student_id, created_at);
+            CREATE INDEX IF NOT EXISTS attempts_student_subject ON attempts (student_id, subject, topic, difficulty);
+            CREATE INDEX IF NOT EXISTS attempts_subject_topic ON attempts (subject, topic, difficulty);
+            CREATE TABLE IF NOT EXISTS progress_totals (
+                student_id TEXT NOT NULL,
+                subject TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                attempts INTEGER NOT NULL,
+                scored INTEGER NOT NULL,
+                score_sum REAL NOT NULL,
+                PRIMARY KEY (student_id, subject, kind)
+            );"""
+        )
+        self._db.commit()
+        
+        self._writer = threading.Thread(target=self._write_loop, name="progress-writer", daemon=True)
+        self._writer.start()
+        atexit.register(self.flush)
+    
+    def record(self, student_id, kind, subject, topic=None, difficulty=None, score=None):
+        """
+        Queue one attempt for the background writer; never blocks on the database
+        """
+        row = (student_id, kind, subject, topic, difficulty, score, time.time())
+        with self._lock:
+            sequence = next(self._sequence)
+            self._pending.setdefault(student_id, {})[sequence] = row
+        self._queue.put((sequence, row))
+    
+    def flush(self):
+        """
+        Write every queued attempt now, and wait for any batch the writer already holds
+        """
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        try:
+            self._write(batch)
+        finally:
+            for _ in batch:
+                self._queue.task_done()
+        self._queue.join()
+    
+    def totals(self, student_id):
+        """
+        Attempt counts per kind for a student, from the rollup table and their queued attempts
+        """
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT kind, SUM(attempts) FROM progress_totals WHERE student_id = ? GROUP BY kind",
+                (student_id,)
+            ).fetchall()
+            pending = self._pending_rows(student_id)
+        counts = dict.fromkeys(ATTEMPT_KINDS, 0)
+        counts.update(rows)
+        for _, kind, *_ in pending:
+            counts[kind] = counts.get(kind, 0) + 1
+        return counts
+    
+    def subject_summary(self, student_id):
+        """
+        Attempts and average score per subject and kind for a student
+        """
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT subject, kind, attempts, scored, score_sum FROM progress_totals WHERE student_id = ?",
+                (student_id,)
+            ).fetchall()
+            pending = self._pending_rows(student_id)
+        totals = {(subject, kind): (attempts, scored, score_sum) for subject, kind, attempts, scored, score_sum in rows}
+        for key, value in self._rollup(pending).items():
+            attempts, scored, score_sum = totals.get(key[1:], (0, 0, 0.0))
+            totals[key[1:]] = (attempts + value[0], scored + value[1], score_sum + value[2])
+        return [
+            {
+                "subject": subject,
+                "kind": kind,
+                "attempts": attempts,
+                "average_score": score_sum / scored if scored else None
+            }
+            for (subject, kind), (attempts, scored, score_sum) in sorted(totals.items())
+        ]
+    
+    def recent_scores(self, student_id, kind="quiz", subject=None, limit=20):
+        """
+        The student's latest scores of one kind, oldest first
+        """
+        query = "SELECT score FROM attempts WHERE student_id = ? AND kind = ? AND score IS NOT NULL"
+        params = [student_id, kind]
+        if subject is not None:
+            query += " AND subject = ?"
+            params.append(subject)
+        query += " ORDER BY created_at DESC LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            rows = self._db.execute(query, params).fetchall()
+            pending = self._pending_rows(student_id)
+        scores = [score for (score,) in reversed(rows)]
+        scores += [
+            row[5] for row in pending
+            if row[1] == kind and row[5] is not None and (subject is None or row[2] == subject)
+        ]
+        return scores[-limit:]
+    
+    def scored_attempts(self, student_id=None, kinds=("quiz_question",)):
+        """
+        Chronological (student_id, subject, topic, difficulty, score) rows for one student, or everyone
+        """
+        query = f"SELECT student_id, subject, topic, difficulty, score FROM attempts WHERE score IS NOT NULL AND kind IN ({', '.join('?' * len(kinds))})"
+        params = list(kinds)
+        if student_id is not None:
+            query += " AND student_id = ?"
+            params.append(student_id)
+        query += " ORDER BY created_at, id"
+        with self._lock:
+            rows = self._db.execute(query, params).fetchall()
+            pending = self._pending_rows(student_id)
+        return rows + [
+            (row[0], row[2], row[3], row[4], row[5]) for row in pending
+            if row[1] in kinds and row[5] is not None
+        ]
+    
+    def topic_summary(self, student_id, subject):
+        """
+        Attempts and average score per topic and difficulty within one subject
+        """
+        with self._lock:
+            rows = self._db.execute(
+                """SELECT COALESCE(topic, ''), COALESCE(difficulty, ''), COUNT(*), COUNT(score), TOTAL(score)
+                FROM attempts WHERE student_id = ? AND subject = ?
+                GROUP BY topic, difficulty""",
+                (student_id, subject)
+            ).fetchall()
+            pending = self._pending_rows(student_id)
+        groups = {(topic, difficulty): (attempts, scored, score_sum) for topic, difficulty, attempts, scored, score_sum in rows}
+        for _, _, row_subject, topic, difficulty, score, _ in pending:
+            if row_subject != subject:
+                continue
+            key = (topic or "", difficulty or "")
+            attempts, scored, score_sum = groups.get(key, (0, 0, 0.0))
+            groups[key] = (attempts + 1, scored + (score is not None), score_sum + (score or 0.0))
+        return [
+            {
+                "topic": topic,
+                "difficulty": difficulty,
+                "attempts": attempts,
+                "average_score": score_sum / scored if scored else None
+            }
+            for (topic, difficulty), (attempts, scored, score_sum) in sorted(groups.items())
+        ]
+    
+    def _pending_rows(self, student_id=None):
+        """
+        Queued attempts not yet committed, oldest first, for one student or everyone; call with the lock held
+        """
+        if student_id is not None:
+            return list(self._pending.get(student_id, {}).values())
+        return [row for _, row in sorted(
+            (sequence, row) for rows in self._pending.values() for sequence, row in rows.items()
+        )]
+    
+    @staticmethod
+    def _rollup(rows):
+        """
+        (attempts, scored, score_sum) per (student_id, subject, kind) for a list of attempt rows
+        """
+        totals = {}
+        for student_id, kind, subject, _, _, score, _ in rows:
+            key = (student_id, subject, kind)
+            attempts, scored, score_sum = totals.get(key, (0, 0, 0.0))
+            totals[key] = (attempts + 1, scored + (score is not None), score_sum + (score or 0.0))
+        return totals
+    
+    def _write_loop(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                self._write(batch)
+            except sqlite3.Error:
+                # A failed batch is dropped rather than stalling every later write
+                pass
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+    
+    def _write(self, batch):
+        """
+        Insert a batch of queued (sequence, attempt) items and update the rollups in one transaction
+        """
+        if not batch:
+            return
+        rows = [row for _, row in batch]
+        totals = self._rollup(rows)
+        
+        with self._lock:
+            try:
+                with self._db:
+                    self._db.executemany(
+                        """INSERT INTO attempts (student_id, kind, subject, topic, difficulty, score, created_at)
+                        VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                        rows
+                    )
+                    self._db.executemany(
+                        """INSERT INTO progress_totals (student_id, subject, kind, attempts, scored, score_sum)
+                        VALUES (?, ?, ?, ?, ?, ?)
+                        ON CONFLICT (student_id, subject, kind) DO UPDATE SET
+                            attempts = attempts + excluded.attempts,
+                            scored = scored + excluded.scored,
+                            score_sum = score_sum + excluded.score_sum""",
+                        [key + value for key, value in totals.items()]
+                    )
+            finally:
+                # Committed, or dropped after a failed write, these rows are no longer pending
+                self._forget(batch)
+    
+    def _forget(self, batch):
+        """
+        Drop queued items from the pending view; call with the lock held
+        """
+        for sequence, row in batch:
+            rows = self._pending.get(row[0])
+            if rows is not None:
+                rows.pop(sequence, None)
+                if not rows:
+                    del self._pending[row[0]]
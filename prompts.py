@@ -0,0 +1,308 @@
+import textwrap
+import threading
+from functools import cached_property
+
+try:
+    import tiktoken
+except ImportError:  # token counts fall back to a character estimate
+    tiktoken = None
+
+# Encoding used by the gpt-4o family
+TOKEN_ENCODING = "o200k_base"
+
+_encoder = None
+_encoder_lock = threading.Lock()
+
+def count_tokens(text):
+    """
+    Token count of text with tiktoken when available, else about four characters per token
+    """
+    global _encoder
+    if tiktoken is not None and _encoder is None:
+        with _encoder_lock:
+            if _encoder is None:
+                try:
+                    _encoder = tiktoken.get_encoding(TOKEN_ENCODING)
+                except Exception:
+                    _encoder = False
+    if _encoder:
+        return len(_encoder.encode(text))
+    return max(1, len(text) // 4)
+
+class PromptTemplate:
+    """
+    System prompt split into a byte-identical instruction prefix and a short variable suffix
+    
+    Providers cache prompts by exact prefix, so everything that varies per request
+    (subject, difficulty, counts) is rendered after the shared instructions.
+    """
+    
+    def __init__(self, name, instructions, context="", user="{content}"):
+        self.name = name
+        self.instructions = textwrap.dedent(instructions).strip()
+        self.context = textwrap.dedent(context).strip()
+        self.user = user
+    
+    @cached_property
+    def prefix_tokens(self):
+        """
+        Tokens in the shared instruction prefix
+        """
+        return count_tokens(self.instructions)
+    
+    def system(self, **values):
+        if not self.context:
+            return self.instructions
+        return f"{self.instructions}\n\n{self.context.format(**values)}"
+    
+    def messages(self, **values):
+        """
+        Chat messages for one request: the system prompt followed by the user turn
+        """
+        return [
+            {"role": "system", "content": self.system(**values)},
+            {"role": "user", "content": self.user.format(**values)}
+        ]
+
+PROMPTS = {}
+
+def register(template):
+    PROMPTS[template.name] = template
+    return template
+
+def get_prompt(name):
+    return PROMPTS[name]
+
+def token_counts():
+    """
+    Prefix token count of every registered template
+    """
+    return {name: template.prefix_tokens for name, template in PROMPTS.items()}
+
+register(PromptTemplate(
+    "answer_question",
+    """
+    You are an expert STEM tutor. Provide clear, educational answers that:
+    
+    1. Are appropriate for the student's level given below
+    2. Use proper mathematical notation (LaTeX format when needed)
+    3. Include relevant examples or analogies
+    4. Encourage further learning
+    5. Are pedagogically sound
+    
+    For mathematical expressions, use LaTeX format like $x^2$ or $$\\frac{d}{dx}f(x)$$
+    """,
+    """
+    Subject focus: {subject}
+    Difficulty: {difficulty}
+    """,
+    "{question}"
+))
+
+register(PromptTemplate(
+    "explain_step_by_step",
+    """
+    You are an expert STEM tutor providing step-by-step solutions.
+    Break down the problem into clear, logical steps appropriate for the student's level given below.
+    
+    Your solution should:
+    1. Start by identifying what needs to be solved
+    2. Break the work into small steps, each with one expression and the reasoning behind it
+    3. Use LaTeX for expressions, without surrounding $ delimiters
+    4. End with the final answer
+    5. Include any important tips or common mistakes to avoid
+    
+    Return JSON in this format:
+    {
+        "steps": [
+            {"reasoning": "What this step does and why", "expression": "LaTeX expression"}
+        ],
+        "final_answer": "The final answer",
+        "tips": "Tips or common mistakes"
+    }
+    """,
+    """
+    Subject: {subject}
+    Difficulty: {difficulty}
+    """,
+    "Please solve this step by step: {problem}"
+))
+
+register(PromptTemplate(
+    "assess_difficulty",
+    """
+    You are an educational assessment expert.
+    Based on the user's response compared to the correct answer, determine if the current difficulty level is appropriate.
+    
+    Respond with JSON in this format:
+    {
+        "assessment": "too_easy|appropriate|too_hard",
+        "confidence": 0.0-1.0,
+        "reasoning": "brief explanation"
+    }
+    """,
+    user="User response: {user_response}\nCorrect answer: {correct_answer}"
+))
+
+register(PromptTemplate(
+    "generate_hint",
+    """
+    You are a helpful STEM tutor providing hints.
+    Generate a ladder of three progressively stronger hints that guide the student toward the
+    solution without giving it away:
+    1. Nudge: a question or observation that points at the key concept
+    2. Method: the technique or theorem to apply and why it fits
+    3. Partial step: the first concrete step worked out, leaving the rest to the student
+    
+    Every hint should be appropriate for the student's level given below, build on the
+    previous one and never state the final answer.
+    
+    Return JSON in this format:
+    {
+        "hints": ["Nudge", "Method", "Partial step"]
+    }
+    """,
+    """
+    Subject: {subject}
+    Difficulty: {difficulty}
+    """,
+    "Provide hints for this problem: {problem}"
+))
+
+register(PromptTemplate(
+    "generate_quiz",
+    """
+    You are an expert STEM educator creating quizzes to the specifications given below.
+    
+    For Multiple Choice questions, provide 4 options with exactly one correct answer.
+    For Problem Solving questions, provide clear problem statements.
+    
+    Return your response as JSON in this exact format, echoing the requested subject and difficulty:
+    {
+        "title": "Quiz title",
+        "subject": "Subject",
+        "difficulty": "Difficulty",
+        "questions": [
+            {
+                "type": "multiple_choice",
+                "topic": "One of the listed topics",
+                "question": "Question text with LaTeX if needed",
+                "options": ["A) Option 1", "B) Option 2", "C) Option 3", "D) Option 4"],
+                "correct_answer": "A) Option 1",
+                "explanation": "Why this is correct"
+            },
+            {
+                "type": "problem_solving",
+                "topic": "One of the listed topics",
+                "question": "Problem statement",
+                "correct_answer": "Sample solution",
+                "explanation": "Detailed explanation"
+            }
+        ]
+    }
+    """,
+    """
+    Quiz specifications:
+    - Subject: {subject}
+    - Difficulty: {difficulty}
+    - Type: {quiz_type}
+    - Number of questions: {num_questions}
+    - Topics: {topics}
+    """,
+    "Generate a {quiz_type} quiz with {num_questions} questions"
+))
+
+register(PromptTemplate(
+    "evaluate_problem_solving",
+    """
+    You are an expert STEM educator evaluating student responses.
+    Compare the student's answer to the correct answer and provide fair assessment.
+    
+    Consider:
+    - Mathematical accuracy
+    - Approach and methodology
+    - Partial credit for correct steps
+    - Common mistakes
+    
+    Respond with JSON in this format:
+    {
+        "correct": true/false,
+        "partial_credit": 0.0-1.0,
+        "explanation": "detailed feedback including what was correct/incorrect"
+    }
+    """,
+    user="Question: {question}\nStudent answer: {user_answer}\nCorrect answer: {correct_answer}"
+))
+
+register(PromptTemplate(
+    "evaluate_problem_solving_batch",
+    """
+    You are an expert STEM educator evaluating student responses.
+    For each numbered item, compare the student's answer to the correct answer and provide fair assessment.
+    Grade every item independently.
+    
+    Consider:
+    - Mathematical accuracy
+    - Approach and methodology
+    - Partial credit for correct steps
+    - Common mistakes
+    
+    Respond with JSON in this format, with one result per item:
+    {
+        "results": [
+            {
+                "index": item number,
+                "correct": true/false,
+                "partial_credit": 0.0-1.0,
+                "explanation": "detailed feedback including what was correct/incorrect"
+            }
+        ]
+    }
+    """,
+    user="{items}"
+))
+
+register(PromptTemplate(
+    "generate_adaptive_question",
+    """
+    Create a single adaptive question for the subject and level given below.
+    
+    The question should:
+    1. Test key concepts appropriately for this difficulty
+    2. Be engaging and educational
+    3. Include proper mathematical notation if needed
+    
+    Return JSON in this format:
+    {
+        "question": "Question text",
+        "topic": "The topic tested",
+        "type": "multiple_choice",
+        "options": ["A) Option 1", "B) Option 2", "C) Option 3", "D) Option 4"],
+        "correct_answer": "A) Option 1",
+        "explanation": "Detailed explanation"
+    }
+    """,
+    """
+    Subject: {subject}
+    Difficulty: {difficulty}
+    Topic: {topic}
+    """,
+    "Generate an adaptive question for current performance level"
+))
+
+register(PromptTemplate(
+    "summarize_conversation",
+    """
+    You maintain the running summary of a STEM tutoring conversation.
+    Merge the previous summary with the new turns into one updated summary that keeps:
+    - The topics and problems discussed
+    - Definitions, formulas and results the student may refer back to
+    - Where the student struggled or asked for clarification
+    
+    Write plain prose without greetings. Drop details that are unlikely to matter for follow-up questions.
+    """,
+    """
+    Keep the summary under {max_words} words.
+    """,
+    "Previous summary:\n{summary}\n\nNew turns:\n{transcript}"
+))
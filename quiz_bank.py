@@ -0,0 +1,203 @@
+import os
+import re
+import json
+import time
+import queue
+import sqlite3
+import hashlib
+import threading
+
+QUESTION_TYPES = {
+    "Multiple Choice": ["multiple_choice"],
+    "Problem Solving": ["problem_solving"],
+    "Mixed": ["multiple_choice", "problem_solving"]
+}
+
+def question_fingerprint(question):
+    """
+    Identify a question by its normalized text so repeats can be skipped
+    """
+    text = re.sub(r"\s+", " ", str(question.get("question", ""))).strip().lower()
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+class QuizBank:
+    """
+    Pre-generated question bank shared through SQLite and refilled in the background
+    """
+
+    def __init__(self, db_path, low_water=5, refill_size=5, lease_seconds=120, max_refill_rounds=3):
+        self.low_water = low_water
+        self.refill_size = refill_size
+        self.lease_seconds = lease_seconds
+        # Generation calls allowed per lease, so a generator repeating banked questions cannot loop forever
+        self.max_refill_rounds = max_refill_rounds
+        self._refill_fn = None
+        self._refill_queue = queue.Queue()
+        self._queued = set()
+        self._worker = None
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Autocommit mode so take() can hold an explicit write transaction across processes
+        self._db = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS questions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                subject TEXT NOT NULL,
+                difficulty TEXT NOT NULL,
+                question_type TEXT NOT NULL,
+                fingerprint TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                UNIQUE (subject, difficulty, question_type, fingerprint)
+            )"""
+        )
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS idx_questions_bucket ON questions (subject, difficulty, question_type, id)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS refill_leases (bucket TEXT PRIMARY KEY, expires_at REAL NOT NULL)"
+        )
+
+    def set_refill(self, refill_fn):
+        """
+        Register refill_fn(subject, difficulty, question_type, count) -> list of questions
+        """
+        self._refill_fn = refill_fn
+
+    def take(self, subject, difficulty, question_type, count, exclude=()):
+        """
+        Remove and return up to count questions from a bucket, skipping excluded fingerprints
+        """
+        if count <= 0:
+            return []
+        exclude = set(exclude)
+        taken = []
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._db.execute(
+                    """SELECT id, fingerprint, payload FROM questions
+                    WHERE subject = ? AND difficulty = ? AND question_type = ?
+                    ORDER BY id""",
+                    (subject, difficulty, question_type)
+                )
+                for row_id, fingerprint, payload in rows:
+                    if fingerprint in exclude:
+                        continue
+                    taken.append((row_id, json.loads(payload)))
+                    if len(taken) == count:
+                        break
+                self._db.executemany("DELETE FROM questions WHERE id = ?", [(row_id,) for row_id, _ in taken])
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+
+        self.request_refill(subject, difficulty, question_type)
+        return [question for _, question in taken]
+
+    def add(self, subject, difficulty, question_type, questions):
+        """
+        Store questions in a bucket, ignoring duplicates already banked; returns how many were inserted
+        """
+        now = time.time()
+        rows = [
+            (subject, difficulty, question_type, question_fingerprint(question), json.dumps(question), now)
+            for question in questions
+            if question.get("type") == question_type and question.get("question")
+        ]
+        with self._lock:
+            before = self._db.total_changes
+            self._db.executemany(
+                """INSERT OR IGNORE INTO questions
+                (subject, difficulty, question_type, fingerprint, payload, created_at)
+                VALUES (?, ?, ?, ?, ?, ?)""",
+                rows
+            )
+            return self._db.total_changes - before
+
+    def count(self, subject, difficulty, question_type):
+        """
+        Number of banked questions in a bucket
+        """
+        with self._lock:
+            return self._db.execute(
+                "SELECT COUNT(*) FROM questions WHERE subject = ? AND difficulty = ? AND question_type = ?",
+                (subject, difficulty, question_type)
+            ).fetchone()[0]
+
+    def request_refill(self, subject, difficulty, question_type):
+        """
+        Queue a background refill if the bucket has dropped below the low-water mark
+        """
+        if self._refill_fn is None:
+            return
+        bucket = (subject, difficulty, question_type)
+        if self.count(*bucket) >= self.low_water:
+            return
+        with self._lock:
+            if bucket in self._queued:
+                return
+            self._queued.add(bucket)
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run_refills, name="quiz-bank-refill", daemon=True)
+                self._worker.start()
+        self._refill_queue.put(bucket)
+
+    def _run_refills(self):
+        """
+        Worker loop that tops up queued buckets one at a time
+        """
+        while True:
+            bucket = self._refill_queue.get()
+            try:
+                if self._acquire_lease(bucket):
+                    try:
+                        for _ in range(self.max_refill_rounds):
+                            if self.count(*bucket) >= self.low_water:
+                                break
+                            questions = self._refill_fn(*bucket, self.refill_size)
+                            if not self.add(*bucket, questions):
+                                break
+                    finally:
+                        self._release_lease(bucket)
+            except Exception:
+                # A failed refill leaves the bucket short; the next take() will queue it again
+                pass
+            finally:
+                with self._lock:
+                    self._queued.discard(bucket)
+
+    def _acquire_lease(self, bucket):
+        """
+        Claim a bucket so only one process refills it at a time
+        """
+        key = "|".join(bucket)
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute("SELECT expires_at FROM refill_leases WHERE bucket = ?", (key,)).fetchone()
+                if row is not None and row[0] > now:
+                    self._db.execute("COMMIT")
+                    return False
+                self._db.execute(
+                    "INSERT OR REPLACE INTO refill_leases (bucket, expires_at) VALUES (?, ?)",
+                    (key, now + self.lease_seconds)
+                )
+                self._db.execute("COMMIT")
+                return True
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def _release_lease(self, bucket):
+        """
+        Release a refill lease
+        """
+        with self._lock:
+            self._db.execute("DELETE FROM refill_leases WHERE bucket = ?", ("|".join(bucket),))
@@ -1,226 +1,1083 @@
-import os
+import re
 import json
-from openai import OpenAI
+import time
+import asyncio
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import streamlit as st
+from llm_client import get_client, get_async_client, create_chat_completion, acreate_chat_completion
+from answer_checker import check_answer
+from quiz_bank import QUESTION_TYPES, question_fingerprint
+from semantic_cache import normalize_math, math_signature, hashed_vector
+from scheduler import PRIORITY_PREFETCH
+from instrumentation import get_instrumentation
+from prompts import get_prompt
+from json_stream import JSONArrayStream
+from solution_store import format_solution
+from skill_model import adaptive_difficulty
+from utils import get_subject_topics
+
+# Completion tokens one well-formed question of each type needs, with headroom for long explanations
+QUESTION_TOKENS = {"multiple_choice": 220, "problem_solving": 480}
+# Tokens for the quiz wrapper around the questions (title, subject, difficulty)
+QUIZ_TOKEN_OVERHEAD = 80
+MAX_QUIZ_TOKENS = 8000
+# Similarity above which two questions with the same numbers and symbols count as duplicates
+DUPLICATE_SIMILARITY = 0.9
 
 class QuizGenerator:
-    def __init__(self):
+    def __init__(self, grading_concurrency=8, batch_grading=False, quiz_bank=None,
+                 generation_batch_size=3, generation_concurrency=4, solution_store=None,
+                 grading_batch_size=10):
         # the newest OpenAI model is "gpt-4o" which was released May 13, 2024.
         # do not change this unless explicitly requested by the user
-        self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        self.client = get_client()
+        self.async_client = get_async_client()
         self.model = "gpt-4o"
+        # Maximum number of problem-solving answers graded in parallel
+        self.grading_concurrency = grading_concurrency
+        # Grade problem-solving answers in batched requests by default, and how many answers go in each
+        self.batch_grading = batch_grading
+        self.grading_batch_size = grading_batch_size
+        # Questions per request when a quiz is generated as concurrent batches, and how many run at once
+        self.generation_batch_size = generation_batch_size
+        self.generation_concurrency = generation_concurrency
+        # Optional SolutionStore whose worked solutions serve as grading references
+        self.solution_store = solution_store
+        # Optional QuizBank of pre-generated questions, refilled in the background
+        self.quiz_bank = quiz_bank
+        if quiz_bank is not None:
+            quiz_bank.set_refill(self._generate_bank_questions)
     
-    def generate_quiz(self, subject, difficulty, quiz_type, num_questions):
+    def generate_quiz(self, subject, difficulty, quiz_type, num_questions, exclude=(), fan_out=None):
         """
         Generate a quiz with specified parameters
+        
+        When a quiz bank is configured, questions are drawn from it first, skipping
+        fingerprints in exclude; only a shortfall is generated on the spot. With fan_out
+        the shortfall is generated as concurrent small batches; by default that happens
+        whenever it is larger than one batch.
         """
         try:
-            system_prompt = f"""You are an expert STEM educator creating quizzes for {subject}.
-            Create a quiz with {num_questions} questions at {difficulty} level.
-            
-            Quiz specifications:
-            - Subject: {subject}
-            - Difficulty: {difficulty}
-            - Type: {quiz_type}
-            - Number of questions: {num_questions}
-            
-            For Multiple Choice questions, provide 4 options with exactly one correct answer.
-            For Problem Solving questions, provide clear problem statements.
-            
-            Return your response as JSON in this exact format:
-            {{
-                "title": "Quiz title",
-                "subject": "{subject}",
-                "difficulty": "{difficulty}",
-                "questions": [
-                    {{
-                        "type": "multiple_choice",
-                        "question": "Question text with LaTeX if needed",
-                        "options": ["A) Option 1", "B) Option 2", "C) Option 3", "D) Option 4"],
-                        "correct_answer": "A) Option 1",
-                        "explanation": "Why this is correct"
-                    }},
-                    {{
-                        "type": "problem_solving",
-                        "question": "Problem statement",
-                        "correct_answer": "Sample solution",
-                        "explanation": "Detailed explanation"
-                    }}
-                ]
-            }}
-            """
-            
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": f"Generate a {quiz_type} quiz with {num_questions} questions"}
-                ],
-                response_format={"type": "json_object"},
-                temperature=0.7,
-                max_tokens=2000
+            banked = self._take_from_bank(subject, difficulty, quiz_type, num_questions, exclude)
+            if len(banked) == num_questions:
+                return self._banked_quiz(subject, difficulty, quiz_type, banked)
+            
+            shortfall = num_questions - len(banked)
+            if self._should_fan_out(shortfall, fan_out):
+                questions = self._generate_fan_out(subject, difficulty, quiz_type, shortfall, banked, exclude)
+                return self._assembled_quiz(subject, difficulty, quiz_type, banked + questions)
+            
+            response = create_chat_completion(
+                self.client,
+                "generate_quiz",
+                **self._quiz_request(subject, difficulty, quiz_type, shortfall)
             )
             
-            quiz_data = json.loads(response.choices[0].message.content)
-            return quiz_data
+            questions, fields = self._parse_questions(response.choices[0].message.content)
+            questions = self._dedupe(questions, banked, exclude)[:shortfall]
+            return self._assembled_quiz(subject, difficulty, quiz_type, banked + questions, fields.get("title"))
+        
+        except Exception as e:
+            return self._quiz_error(subject, difficulty, e)
+    
+    async def generate_quiz_async(self, subject, difficulty, quiz_type, num_questions, exclude=(), fan_out=None):
+        """
+        Async counterpart of generate_quiz
+        """
+        try:
+            banked = self._take_from_bank(subject, difficulty, quiz_type, num_questions, exclude)
+            if len(banked) == num_questions:
+                return self._banked_quiz(subject, difficulty, quiz_type, banked)
+            
+            shortfall = num_questions - len(banked)
+            if self._should_fan_out(shortfall, fan_out):
+                questions = await self._agenerate_fan_out(subject, difficulty, quiz_type, shortfall, banked, exclude)
+                return self._assembled_quiz(subject, difficulty, quiz_type, banked + questions)
             
+            response = await acreate_chat_completion(
+                self.async_client,
+                "generate_quiz",
+                **self._quiz_request(subject, difficulty, quiz_type, shortfall)
+            )
+            
+            questions, fields = self._parse_questions(response.choices[0].message.content)
+            questions = self._dedupe(questions, banked, exclude)[:shortfall]
+            return self._assembled_quiz(subject, difficulty, quiz_type, banked + questions, fields.get("title"))
+        
         except Exception as e:
-            # Return a fallback quiz structure
-            return {
-                "title": f"Error generating quiz: {str(e)}",
-                "subject": subject,
-                "difficulty": difficulty,
-                "questions": []
-            }
+            return self._quiz_error(subject, difficulty, e)
+    
+    def generate_quiz_stream(self, subject, difficulty, quiz_type, num_questions, exclude=(), fan_out=None):
+        """
+        Generate a quiz, yielding the quiz dict again each time more questions are ready
+        
+        Banked questions come first. The rest are parsed out of one streamed response as
+        soon as each question object is complete or, with fan_out (by default when the
+        shortfall is larger than one batch), generated as concurrent small batches and
+        yielded batch by batch. If the stream breaks off, the questions that arrived are
+        kept and the remainder is topped up with a fan-out. The final yield is the
+        finished quiz, or an error quiz when no question could be generated.
+        """
+        quiz = self._banked_quiz(subject, difficulty, quiz_type, [])
+        generated = []
+        error = None
+        streamed = False
+        try:
+            for question in self._take_from_bank(subject, difficulty, quiz_type, num_questions, exclude):
+                quiz["questions"].append(question)
+                yield quiz
+            if len(quiz["questions"]) == num_questions:
+                return
+            
+            shortfall = num_questions - len(quiz["questions"])
+            if self._should_fan_out(shortfall, fan_out):
+                for questions in self._fan_out_questions(subject, difficulty, quiz_type, shortfall, quiz["questions"], exclude):
+                    generated += questions
+                    quiz["questions"] += questions
+                    yield quiz
+            else:
+                streamed = True
+                for question in self._stream_questions(quiz, subject, difficulty, quiz_type, num_questions, exclude):
+                    generated.append(question)
+                    yield quiz
+        
+        except Exception as e:
+            error = e
+        
+        # A stream cut short or truncated keeps what arrived; only the remainder is generated again
+        shortfall = num_questions - len(quiz["questions"])
+        if shortfall > 0 and streamed:
+            try:
+                for questions in self._fan_out_questions(subject, difficulty, quiz_type, shortfall, quiz["questions"], exclude):
+                    generated += questions
+                    quiz["questions"] += questions
+                    yield quiz
+            except Exception as e:
+                error = error or e
+        
+        if not generated and not quiz["questions"]:
+            yield self._quiz_error(subject, difficulty, error or ValueError("no well-formed questions in the response"))
+            return
+        banked = quiz["questions"][:len(quiz["questions"]) - len(generated)]
+        quiz["questions"] = banked + self._interleave(generated, quiz_type)
+        yield quiz
+    
+    def _stream_questions(self, quiz, subject, difficulty, quiz_type, num_questions, exclude):
+        """
+        Stream one quiz request, appending each new well-formed question to quiz and yielding it
+        """
+        stream = create_chat_completion(
+            self.client,
+            "generate_quiz",
+            stream=True,
+            **self._quiz_request(subject, difficulty, quiz_type, num_questions - len(quiz["questions"]))
+        )
+        
+        parser = JSONArrayStream("questions")
+        for chunk in stream:
+            if not chunk.choices or not chunk.choices[0].delta.content:
+                continue
+            for question in parser.feed(chunk.choices[0].delta.content):
+                if len(quiz["questions"]) == num_questions or not self._well_formed(question):
+                    continue
+                if self._dedupe([question], quiz["questions"], exclude):
+                    quiz["questions"].append(question)
+                    quiz["title"] = parser.fields.get("title", quiz["title"])
+                    yield question
+        quiz["title"] = parser.fields.get("title", quiz["title"])
     
-    def evaluate_quiz(self, quiz, user_answers):
+    def _should_fan_out(self, count, fan_out):
+        return count > self.generation_batch_size if fan_out is None else fan_out
+    
+    def _generate_fan_out(self, subject, difficulty, quiz_type, count, existing=(), exclude=()):
+        """
+        Generate count questions as concurrent small batches, de-duplicated across batches
+        """
+        questions = []
+        for batch in self._fan_out_questions(subject, difficulty, quiz_type, count, existing, exclude):
+            questions += batch
+        return self._interleave(questions, quiz_type)
+    
+    def _fan_out_questions(self, subject, difficulty, quiz_type, count, existing=(), exclude=()):
+        """
+        Yield the new, de-duplicated questions of each concurrent batch as it completes
+        
+        A second round tops up questions lost to duplicates, truncation or failed batches.
+        Raises the last batch error when no question could be generated at all.
+        """
+        existing = list(existing)
+        questions = []
+        error = None
+        for _ in range(2):
+            batches = self._fan_out_batches(subject, quiz_type, count - len(questions))
+            if not batches:
+                break
+            workers = max(1, min(self.generation_concurrency, len(batches)))
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = [executor.submit(self._generate_batch, subject, difficulty, *batch) for batch in batches]
+                for future in as_completed(futures):
+                    try:
+                        generated = future.result()
+                    except Exception as e:
+                        error = e
+                        continue
+                    fresh = self._dedupe(generated, existing + questions, exclude)[:count - len(questions)]
+                    if fresh:
+                        questions += fresh
+                        yield fresh
+        
+        if not questions and error is not None:
+            raise error
+    
+    async def _agenerate_fan_out(self, subject, difficulty, quiz_type, count, existing=(), exclude=()):
+        """
+        Async counterpart of _generate_fan_out
+        """
+        questions = []
+        error = None
+        for _ in range(2):
+            batches = self._fan_out_batches(subject, quiz_type, count - len(questions))
+            if not batches:
+                break
+            semaphore = asyncio.Semaphore(max(1, self.generation_concurrency))
+            
+            async def generate(batch):
+                async with semaphore:
+                    return await self._agenerate_batch(subject, difficulty, *batch)
+            
+            generated = []
+            for result in await asyncio.gather(*(generate(batch) for batch in batches), return_exceptions=True):
+                if isinstance(result, Exception):
+                    error = result
+                else:
+                    generated.extend(result)
+            questions += self._dedupe(generated, list(existing) + questions, exclude)[:count - len(questions)]
+        
+        if not questions and error is not None:
+            raise error
+        return self._interleave(questions, quiz_type)
+    
+    def _fan_out_batches(self, subject, quiz_type, count):
+        """
+        Split count questions into (quiz_type, size, topics) batches of a single question type
+        
+        Each batch gets its own share of the subject's topics so concurrent batches do not
+        write the same questions (and do not coalesce into one identical request).
+        """
+        question_types = QUESTION_TYPES.get(quiz_type, QUESTION_TYPES["Multiple Choice"])
+        sizes = []
+        for position, question_type in enumerate(question_types):
+            type_count = count // len(question_types) + (1 if position < count % len(question_types) else 0)
+            label = next(label for label, types in QUESTION_TYPES.items() if types == [question_type])
+            for start in range(0, type_count, self.generation_batch_size):
+                sizes.append((label, min(self.generation_batch_size, type_count - start)))
+        
+        topics = get_subject_topics(subject) or [subject]
+        return [
+            (label, size, topics[i::len(sizes)] if len(sizes) <= len(topics) else [topics[i % len(topics)]])
+            for i, (label, size) in enumerate(sizes)
+        ]
+    
+    def _generate_batch(self, subject, difficulty, quiz_type, count, topics=None, priority=None):
+        """
+        Request one batch of questions, keeping every well-formed question even from a truncated reply
+        """
+        response = create_chat_completion(
+            self.client,
+            "generate_quiz",
+            priority=priority,
+            **self._quiz_request(subject, difficulty, quiz_type, count, topics)
+        )
+        questions, _ = self._parse_questions(response.choices[0].message.content)
+        return questions[:count]
+    
+    async def _agenerate_batch(self, subject, difficulty, quiz_type, count, topics=None):
+        """
+        Async counterpart of _generate_batch
+        """
+        response = await acreate_chat_completion(
+            self.async_client,
+            "generate_quiz",
+            **self._quiz_request(subject, difficulty, quiz_type, count, topics)
+        )
+        questions, _ = self._parse_questions(response.choices[0].message.content)
+        return questions[:count]
+    
+    def _parse_questions(self, content):
+        """
+        Well-formed questions and top-level fields of a quiz reply, salvaged from a partial one if need be
+        """
+        parser = JSONArrayStream("questions")
+        questions = [question for question in parser.feed(content or "") if self._well_formed(question)]
+        return questions, parser.fields
+    
+    def _well_formed(self, question):
+        """
+        Whether a generated question has everything the quiz page and grading need
+        """
+        if not isinstance(question, dict) or not str(question.get("question", "")).strip():
+            return False
+        if "correct_answer" not in question:
+            return False
+        if question.get("type") == "multiple_choice":
+            options = question.get("options")
+            return isinstance(options, list) and len(options) >= 2
+        return question.get("type") == "problem_solving"
+    
+    def _dedupe(self, questions, existing=(), exclude=()):
+        """
+        Drop questions that are excluded or near-identical to an existing or earlier one
+        
+        Near-identical means the semantic cache's test: hashed n-gram cosine similarity of
+        at least DUPLICATE_SIMILARITY with the same numbers, variables and operators.
+        """
+        seen = set(exclude)
+        vectors, signatures = [], []
+        
+        def remember(question):
+            normalized = normalize_math(question.get("question", ""))
+            seen.add(question_fingerprint(question))
+            vectors.append(hashed_vector(normalized))
+            signatures.append(math_signature(normalized))
+        
+        for question in existing:
+            remember(question)
+        
+        unique = []
+        for question in questions:
+            if question_fingerprint(question) in seen:
+                continue
+            normalized = normalize_math(question.get("question", ""))
+            signature = math_signature(normalized)
+            if vectors:
+                similarities = np.asarray(vectors) @ hashed_vector(normalized)
+                if any(s >= DUPLICATE_SIMILARITY and signatures[i] == signature for i, s in enumerate(similarities)):
+                    continue
+            remember(question)
+            unique.append(question)
+        return unique
+    
+    def _interleave(self, questions, quiz_type):
+        """
+        Order questions by alternating question types, as drawn from the bank for mixed quizzes
+        """
+        groups = [
+            [question for question in questions if question.get("type") == question_type]
+            for question_type in QUESTION_TYPES.get(quiz_type, QUESTION_TYPES["Multiple Choice"])
+        ]
+        ordered = []
+        for position in range(max((len(group) for group in groups), default=0)):
+            ordered.extend(group[position] for group in groups if position < len(group))
+        return ordered + [question for question in questions if question not in ordered]
+    
+    def _assembled_quiz(self, subject, difficulty, quiz_type, questions, title=None):
+        """
+        Quiz structure for generated questions; raises when none of them were usable
+        """
+        if not questions:
+            raise ValueError("no well-formed questions in the response")
+        quiz = self._banked_quiz(subject, difficulty, quiz_type, questions)
+        if title:
+            quiz["title"] = title
+        return quiz
+    
+    def _quiz_error(self, subject, difficulty, error):
+        """
+        Fallback quiz structure returned when generation fails
+        """
+        return {
+            "title": f"Error generating quiz: {str(error)}",
+            "subject": subject,
+            "difficulty": difficulty,
+            "questions": []
+        }
+    
+    def _banked_quiz(self, subject, difficulty, quiz_type, questions):
+        """
+        Wrap questions drawn from the bank in a quiz structure
+        """
+        return {
+            "title": f"{subject} {quiz_type} Quiz",
+            "subject": subject,
+            "difficulty": difficulty,
+            "questions": questions
+        }
+    
+    def _take_from_bank(self, subject, difficulty, quiz_type, num_questions, exclude):
+        """
+        Draw questions for a quiz from the bank, interleaving types for mixed quizzes
+        """
+        if self.quiz_bank is None:
+            return []
+        
+        start = time.perf_counter()
+        question_types = QUESTION_TYPES.get(quiz_type, QUESTION_TYPES["Multiple Choice"])
+        drawn = []
+        for position, question_type in enumerate(question_types):
+            count = num_questions // len(question_types) + (1 if position < num_questions % len(question_types) else 0)
+            drawn.append(self.quiz_bank.take(subject, difficulty, question_type, count, exclude))
+        
+        questions = []
+        for position in range(max(len(group) for group in drawn)):
+            questions.extend(group[position] for group in drawn if position < len(group))
+        
+        if len(questions) == num_questions:
+            get_instrumentation().record_cache_hit("generate_quiz", self.model, time.perf_counter() - start, "quiz_bank")
+        return questions
+    
+    def _generate_bank_questions(self, subject, difficulty, question_type, count):
+        """
+        Generate questions of one type for refilling the quiz bank
+        """
+        quiz_type = next(label for label, types in QUESTION_TYPES.items() if types == [question_type])
+        questions = self._generate_batch(subject, difficulty, quiz_type, count, priority=PRIORITY_PREFETCH)
+        return [question for question in questions if question.get("type") == question_type]
+    
+    def _quiz_request(self, subject, difficulty, quiz_type, num_questions, topics=None):
+        """
+        Build the completion parameters for generating a quiz, with max_tokens sized to the questions asked for
+        """
+        if topics is None:
+            topics = get_subject_topics(subject)
+        return {
+            "model": self.model,
+            "messages": get_prompt("generate_quiz").messages(
+                subject=subject, difficulty=difficulty, quiz_type=quiz_type, num_questions=num_questions,
+                topics=", ".join(topics) or subject
+            ),
+            "response_format": {"type": "json_object"},
+            "temperature": 0.7,
+            "max_tokens": self._quiz_max_tokens(quiz_type, num_questions)
+        }
+    
+    def _quiz_max_tokens(self, quiz_type, num_questions):
+        """
+        Completion budget for a quiz: the wrapper plus the longest question type's estimate per question
+        """
+        question_types = QUESTION_TYPES.get(quiz_type, QUESTION_TYPES["Multiple Choice"])
+        per_question = max(QUESTION_TOKENS[question_type] for question_type in question_types)
+        return min(MAX_QUIZ_TOKENS, QUIZ_TOKEN_OVERHEAD + per_question * num_questions)
+    
+    def evaluate_quiz(self, quiz, user_answers, batch=None):
         """
         Evaluate user answers and provide detailed feedback
+        
+        With batch=True problem-solving answers are graded in batched requests;
+        questions missing from a malformed batched response are regraded individually.
+        Defaults to the generator's batch_grading setting.
+        """
+        try:
+            batch = self.batch_grading if batch is None else batch
+            
+            # For problem solving, use AI to evaluate
+            pending = self._problem_solving_questions(quiz["questions"])
+            evaluations = self._grade_problem_solving(pending, user_answers, batch)
+            evaluations.update(self._multiple_choice_evaluations(quiz, user_answers))
+            
+            return self._assemble_results(quiz, user_answers, evaluations)
+        
+        except Exception as e:
+            return self._evaluation_error(quiz, e)
+    
+    async def evaluate_quiz_async(self, quiz, user_answers, batch=None):
+        """
+        Async counterpart of evaluate_quiz; individual grading calls are bounded by grading_concurrency
+        """
+        try:
+            batch = self.batch_grading if batch is None else batch
+            
+            pending = self._problem_solving_questions(quiz["questions"])
+            evaluations = await self._grade_problem_solving_async(pending, user_answers, batch)
+            evaluations.update(self._multiple_choice_evaluations(quiz, user_answers))
+            
+            return self._assemble_results(quiz, user_answers, evaluations)
+        
+        except Exception as e:
+            return self._evaluation_error(quiz, e)
+    
+    def evaluate_submissions(self, quiz, submissions, batch=None):
+        """
+        Grade many students' answers to the same quiz, given as {student_id: user_answers}
+        
+        Multiple-choice answers are scored together as one answer matrix. Problem-solving
+        answers are grouped by normalized text per question and each distinct answer is
+        graded once, so model calls grow with the number of different answers rather than
+        the number of students. Returns per-student results shaped like evaluate_quiz,
+        per-question statistics and a summary.
         """
         try:
-            results = {
-                "score": 0,
-                "total": len(quiz["questions"]),
-                "feedback": []
+            batch = self.batch_grading if batch is None else batch
+            
+            matrix, correct, distinct = self._answer_matrix(quiz, submissions)
+            pending = {item: quiz["questions"][q] for item, (q, _) in distinct.items()}
+            answers = {item: answer for item, (_, answer) in distinct.items()}
+            evaluations = self._grade_problem_solving(pending, answers, batch)
+            
+            return self._submission_results(quiz, submissions, matrix, correct, distinct, evaluations)
+        
+        except Exception as e:
+            return self._submissions_error(quiz, submissions, e)
+    
+    async def evaluate_submissions_async(self, quiz, submissions, batch=None):
+        """
+        Async counterpart of evaluate_submissions
+        """
+        try:
+            batch = self.batch_grading if batch is None else batch
+            
+            matrix, correct, distinct = self._answer_matrix(quiz, submissions)
+            pending = {item: quiz["questions"][q] for item, (q, _) in distinct.items()}
+            answers = {item: answer for item, (_, answer) in distinct.items()}
+            evaluations = await self._grade_problem_solving_async(pending, answers, batch)
+            
+            return self._submission_results(quiz, submissions, matrix, correct, distinct, evaluations)
+        
+        except Exception as e:
+            return self._submissions_error(quiz, submissions, e)
+    
+    @staticmethod
+    def _answer_key(answer):
+        """
+        Grouping key for a free-form answer; case, spacing, dollar signs and a trailing period do not matter
+        """
+        text = " ".join(str(answer).replace("$", "").lower().split())
+        return re.sub(r"\s*([=+\-*/^])\s*", r"\1", text).rstrip(".")
+    
+    def _answer_matrix(self, quiz, submissions):
+        """
+        Encode every submission as one row of an integer matrix, students by questions
+        
+        Multiple-choice cells hold the chosen option's index, or -1 when blank or not an
+        option. Problem-solving cells hold the id of the normalized answer, so students
+        giving the same answer share an id. Returns the matrix, the correct option index
+        per question (-1 for problem solving) and {id: (question index, answer)}.
+        """
+        questions = quiz["questions"]
+        matrix = np.full((len(submissions), len(questions)), -1, dtype=np.int64)
+        correct = np.full(len(questions), -1, dtype=np.int64)
+        distinct = {}
+        
+        for q, question in enumerate(questions):
+            column = [answers.get(q, "") for answers in submissions.values()]
+            if question["type"] == "multiple_choice":
+                options = {option: k for k, option in enumerate(question.get("options", []))}
+                correct[q] = options.setdefault(question["correct_answer"], len(options))
+                matrix[:, q] = [options.get(answer, -1) for answer in column]
+                continue
+            
+            ids = {}
+            for s, answer in enumerate(column):
+                key = self._answer_key(answer)
+                item = ids.get(key)
+                if item is None:
+                    item = ids[key] = len(distinct)
+                    distinct[item] = (q, answer)
+                matrix[s, q] = item
+        
+        return matrix, correct, distinct
+    
+    def _submission_results(self, quiz, submissions, matrix, correct, distinct, evaluations):
+        """
+        Per-student results, per-question statistics and a summary from the answer matrix and graded answers
+        """
+        questions = quiz["questions"]
+        is_choice = np.array([question["type"] == "multiple_choice" for question in questions], dtype=bool)
+        free_form = ~is_choice
+        
+        # Credit and correctness of every cell: option comparison for multiple choice, lookup by answer id otherwise
+        item_credit = np.zeros(len(distinct))
+        item_correct = np.zeros(len(distinct), dtype=bool)
+        for item, evaluation in evaluations.items():
+            item_credit[item] = evaluation["partial_credit"]
+            item_correct[item] = bool(evaluation["correct"])
+        correct_cells = (matrix == correct) & is_choice
+        credit = correct_cells.astype(float)
+        if distinct:
+            correct_cells[:, free_form] = item_correct[matrix[:, free_form]]
+            credit[:, free_form] = item_credit[matrix[:, free_form]]
+        
+        choice_evaluations = {
+            q: (self._choice_evaluation(question, False), self._choice_evaluation(question, True))
+            for q, question in enumerate(questions) if question["type"] == "multiple_choice"
+        }
+        students = {}
+        for (student_id, user_answers), row, correct_row in zip(submissions.items(), matrix.tolist(), correct_cells.tolist()):
+            student_evaluations = {
+                q: choice_evaluations[q][correct_row[q]] if q in choice_evaluations else evaluations[row[q]]
+                for q in range(len(questions))
+            }
+            students[student_id] = self._assemble_results(quiz, user_answers, student_evaluations)
+        
+        statistics = []
+        for q, question in enumerate(questions):
+            column = matrix[:, q]
+            entry = {
+                "index": q,
+                "type": question["type"],
+                "mean_score": float(credit[:, q].mean()) if len(column) else 0.0,
+                "correct_rate": float(correct_cells[:, q].mean()) if len(column) else 0.0
+            }
+            if is_choice[q]:
+                options = question.get("options", [])
+                counts = np.bincount(column[column >= 0], minlength=len(options) + 1)
+                entry["option_counts"] = dict(zip(options, counts.tolist()))
+                entry["unanswered"] = int(np.count_nonzero(column < 0))
+            else:
+                items, counts = np.unique(column, return_counts=True)
+                entry["distinct_answers"] = len(items)
+                entry["common_answers"] = [
+                    {
+                        "answer": distinct[item][1],
+                        "students": int(count),
+                        "score": evaluations[item]["partial_credit"]
+                    }
+                    for item, count in sorted(zip(items.tolist(), counts.tolist()), key=lambda pair: -pair[1])[:3]
+                ]
+            statistics.append(entry)
+        
+        return {
+            "students": students,
+            "questions": statistics,
+            "summary": {
+                "submissions": len(submissions),
+                "mean_score": float(credit.sum(axis=1).mean()) if len(submissions) else 0.0,
+                "problem_solving_answers": int(np.count_nonzero(free_form)) * len(submissions),
+                "distinct_answers": len(distinct)
             }
+        }
+    
+    def _submissions_error(self, quiz, submissions, error):
+        """
+        Result returned when bulk evaluation fails as a whole; every student gets the evaluate_quiz error result
+        """
+        return {
+            "students": {student_id: self._evaluation_error(quiz, error) for student_id in submissions},
+            "questions": [],
+            "summary": {
+                "submissions": len(submissions),
+                "mean_score": 0.0,
+                "problem_solving_answers": 0,
+                "distinct_answers": 0
+            }
+        }
+    
+    def _grade_problem_solving(self, pending, user_answers, batch):
+        """
+        Evaluations for pending problem-solving answers, keyed like pending
+        
+        Closed-form answers are checked locally; the rest go to batched requests when
+        batch is set, and anything still ungraded is graded one request per answer.
+        """
+        evaluations = self._grade_locally(pending, user_answers)
+        pending = {i: question for i, question in pending.items() if i not in evaluations}
+        
+        if batch and len(pending) > 1:
+            evaluations.update(self._evaluate_problem_solving_batches(pending, user_answers))
+        
+        remaining = {i: question for i, question in pending.items() if i not in evaluations}
+        evaluations.update(self._evaluate_problem_solving_concurrently(remaining, user_answers))
+        return evaluations
+    
+    async def _grade_problem_solving_async(self, pending, user_answers, batch):
+        """
+        Async counterpart of _grade_problem_solving
+        """
+        evaluations = self._grade_locally(pending, user_answers)
+        pending = {i: question for i, question in pending.items() if i not in evaluations}
+        
+        if batch and len(pending) > 1:
+            evaluations.update(await self._evaluate_problem_solving_batches_async(pending, user_answers))
+        
+        remaining = {i: question for i, question in pending.items() if i not in evaluations}
+        if remaining:
+            semaphore = asyncio.Semaphore(max(1, self.grading_concurrency))
             
-            for i, question in enumerate(quiz["questions"]):
-                user_answer = user_answers.get(i, "")
-                correct_answer = question["correct_answer"]
-                
-                # For multiple choice, direct comparison
-                if question["type"] == "multiple_choice":
-                    is_correct = user_answer == correct_answer
-                    results["score"] += 1 if is_correct else 0
-                    
-                    results["feedback"].append({
-                        "correct": is_correct,
-                        "user_answer": user_answer,
-                        "correct_answer": correct_answer,
-                        "explanation": question["explanation"]
-                    })
-                
-                # For problem solving, use AI to evaluate
-                elif question["type"] == "problem_solving":
-                    evaluation = self._evaluate_problem_solving(
-                        question["question"], 
-                        user_answer, 
-                        correct_answer
+            async def grade(i, question):
+                async with semaphore:
+                    return await self._evaluate_problem_solving_async(
+                        question["question"],
+                        user_answers.get(i, ""),
+                        self._reference_answer(question)
                     )
-                    
-                    is_correct = evaluation["correct"]
-                    results["score"] += evaluation["partial_credit"]
-                    
-                    results["feedback"].append({
-                        "correct": is_correct,
-                        "user_answer": user_answer,
-                        "correct_answer": correct_answer,
-                        "explanation": evaluation["explanation"]
-                    })
-            
-            return results
             
-        except Exception as e:
-            return {
-                "score": 0,
-                "total": len(quiz["questions"]),
-                "feedback": [{"error": f"Error evaluating quiz: {str(e)}"}]
+            graded = await asyncio.gather(*(grade(i, question) for i, question in remaining.items()))
+            evaluations.update(zip(remaining, graded))
+        return evaluations
+    
+    def _multiple_choice_evaluations(self, quiz, user_answers):
+        """
+        Evaluations of the multiple-choice answers by direct comparison, keyed by question index
+        """
+        return {
+            i: self._choice_evaluation(question, user_answers.get(i, "") == question["correct_answer"])
+            for i, question in enumerate(quiz["questions"])
+            if question["type"] == "multiple_choice"
+        }
+    
+    def _choice_evaluation(self, question, is_correct):
+        return {
+            "correct": is_correct,
+            "partial_credit": 1 if is_correct else 0,
+            "explanation": question["explanation"]
+        }
+    
+    def _problem_solving_questions(self, questions):
+        """
+        Problem-solving questions of a quiz keyed by question index
+        """
+        return {
+            i: question for i, question in enumerate(questions)
+            if question["type"] == "problem_solving"
+        }
+    
+    def _grade_locally(self, pending, user_answers):
+        """
+        Check closed-form answers locally; only undecided ones need the LLM
+        
+        Only the quiz's own correct answer decides here. A stored worked solution was
+        generated for the problem text rather than this quiz, so it reaches the LLM grader
+        as context through _reference_answer instead of deciding a grade.
+        """
+        evaluations = {}
+        for i, question in pending.items():
+            local = check_answer(user_answers.get(i, ""), question["correct_answer"])
+            if local is not None:
+                evaluations[i] = local
+        return evaluations
+    
+    def _stored_solution(self, question):
+        """
+        Worked solution for the question from the shared solution store, if one was generated
+        """
+        if self.solution_store is None:
+            return None
+        return self.solution_store.find(question["question"])
+    
+    def _reference_answer(self, question):
+        """
+        The question's correct answer, followed by its stored worked solution when there is one
+        """
+        solution = self._stored_solution(question)
+        if solution is None:
+            return question["correct_answer"]
+        return (
+            f"{question['correct_answer']}\n\n"
+            f"Worked solution for reference (the correct answer above takes precedence):\n{format_solution(solution)}"
+        )
+    
+    def _assemble_results(self, quiz, user_answers, evaluations):
+        """
+        Score the quiz in question order from per-question evaluations
+        """
+        results = {
+            "score": 0,
+            "total": len(quiz["questions"]),
+            "feedback": []
+        }
+        
+        for i, question in enumerate(quiz["questions"]):
+            evaluation = evaluations[i]
+            results["score"] += evaluation["partial_credit"]
+            
+            results["feedback"].append({
+                "correct": evaluation["correct"],
+                "score": float(evaluation["partial_credit"]),
+                "user_answer": user_answers.get(i, ""),
+                "correct_answer": question["correct_answer"],
+                "explanation": evaluation["explanation"]
+            })
+        
+        return results
+    
+    def _evaluation_error(self, quiz, error):
+        """
+        Result returned when evaluation fails as a whole
+        """
+        return {
+            "score": 0,
+            "total": len(quiz["questions"]),
+            "feedback": [{"error": f"Error evaluating quiz: {str(error)}"}]
+        }
+    
+    def _evaluate_problem_solving_concurrently(self, pending, user_answers):
+        """
+        Grade problem-solving questions on a bounded thread pool, keyed by question index
+        """
+        if not pending:
+            return {}
+        
+        workers = max(1, min(self.grading_concurrency, len(pending)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                i: executor.submit(
+                    self._evaluate_problem_solving,
+                    question["question"],
+                    user_answers.get(i, ""),
+                    self._reference_answer(question)
+                )
+                for i, question in pending.items()
             }
+            
+            evaluations = {}
+            for i, future in futures.items():
+                try:
+                    evaluations[i] = future.result()
+                except Exception as e:
+                    evaluations[i] = self._grading_error(e)
+            return evaluations
     
     def _evaluate_problem_solving(self, question, user_answer, correct_answer):
         """
         Use AI to evaluate problem-solving answers
         """
         try:
-            system_prompt = """You are an expert STEM educator evaluating student responses.
-            Compare the student's answer to the correct answer and provide fair assessment.
-            
-            Consider:
-            - Mathematical accuracy
-            - Approach and methodology
-            - Partial credit for correct steps
-            - Common mistakes
-            
-            Respond with JSON in this format:
-            {
-                "correct": true/false,
-                "partial_credit": 0.0-1.0,
-                "explanation": "detailed feedback including what was correct/incorrect"
-            }
-            """
-            
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": f"Question: {question}\nStudent answer: {user_answer}\nCorrect answer: {correct_answer}"}
-                ],
-                response_format={"type": "json_object"},
-                temperature=0.3,
-                max_tokens=500
+            response = create_chat_completion(
+                self.client,
+                "evaluate_problem_solving",
+                **self._grading_request(question, user_answer, correct_answer)
             )
             
             return json.loads(response.choices[0].message.content)
+        
+        except Exception as e:
+            return self._grading_error(e)
+    
+    async def _evaluate_problem_solving_async(self, question, user_answer, correct_answer):
+        """
+        Async counterpart of _evaluate_problem_solving
+        """
+        try:
+            response = await acreate_chat_completion(
+                self.async_client,
+                "evaluate_problem_solving",
+                **self._grading_request(question, user_answer, correct_answer)
+            )
             
+            return json.loads(response.choices[0].message.content)
+        
         except Exception as e:
-            return {
-                "correct": False,
-                "partial_credit": 0.0,
-                "explanation": f"Error evaluating answer: {str(e)}"
-            }
+            return self._grading_error(e)
     
-    def generate_adaptive_question(self, subject, current_difficulty, performance_history):
+    def _grading_request(self, question, user_answer, correct_answer):
+        """
+        Build the completion parameters for grading one answer
+        """
+        return {
+            "model": self.model,
+            "messages": get_prompt("evaluate_problem_solving").messages(
+                question=question, user_answer=user_answer, correct_answer=correct_answer
+            ),
+            "response_format": {"type": "json_object"},
+            "temperature": 0.3,
+            "max_tokens": 500
+        }
+    
+    def _grading_error(self, error):
+        """
+        Zero-credit evaluation returned when grading one answer fails
+        """
+        return {
+            "correct": False,
+            "partial_credit": 0.0,
+            "explanation": f"Error evaluating answer: {str(error)}"
+        }
+    
+    def _grading_batches(self, pending):
+        """
+        Split pending answers into chunks of at most grading_batch_size
+        """
+        items = list(pending.items())
+        size = max(1, self.grading_batch_size)
+        return [dict(items[start:start + size]) for start in range(0, len(items), size)]
+    
+    def _evaluate_problem_solving_batches(self, pending, user_answers):
+        """
+        Grade pending answers as concurrent batched requests, bounded by grading_concurrency
+        """
+        batches = self._grading_batches(pending)
+        if len(batches) == 1:
+            return self._evaluate_problem_solving_batch(pending, user_answers)
+        
+        evaluations = {}
+        workers = max(1, min(self.grading_concurrency, len(batches)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for graded in executor.map(lambda chunk: self._evaluate_problem_solving_batch(chunk, user_answers), batches):
+                evaluations.update(graded)
+        return evaluations
+    
+    async def _evaluate_problem_solving_batches_async(self, pending, user_answers):
+        """
+        Async counterpart of _evaluate_problem_solving_batches
+        """
+        semaphore = asyncio.Semaphore(max(1, self.grading_concurrency))
+        
+        async def grade(chunk):
+            async with semaphore:
+                return await self._evaluate_problem_solving_batch_async(chunk, user_answers)
+        
+        evaluations = {}
+        for graded in await asyncio.gather(*(grade(chunk) for chunk in self._grading_batches(pending))):
+            evaluations.update(graded)
+        return evaluations
+    
+    def _evaluate_problem_solving_batch(self, pending, user_answers):
+        """
+        Use AI to evaluate several problem-solving answers in one structured request
+        
+        Returns only the well-formed evaluations; callers regrade any missing indices.
+        """
+        try:
+            response = create_chat_completion(
+                self.client,
+                "evaluate_problem_solving_batch",
+                **self._batch_grading_request(pending, user_answers)
+            )
+            
+            return self._parse_batch_evaluations(response, pending)
+        
+        except Exception:
+            return {}
+    
+    async def _evaluate_problem_solving_batch_async(self, pending, user_answers):
+        """
+        Async counterpart of _evaluate_problem_solving_batch
+        """
+        try:
+            response = await acreate_chat_completion(
+                self.async_client,
+                "evaluate_problem_solving_batch",
+                **self._batch_grading_request(pending, user_answers)
+            )
+            
+            return self._parse_batch_evaluations(response, pending)
+        
+        except Exception:
+            return {}
+    
+    def _batch_grading_request(self, pending, user_answers):
+        """
+        Build the completion parameters for grading several answers at once
+        """
+        items = "\n\n".join(
+            f"Item {i}\nQuestion: {question['question']}\n"
+            f"Student answer: {user_answers.get(i, '')}\n"
+            f"Correct answer: {self._reference_answer(question)}"
+            for i, question in pending.items()
+        )
+        
+        return {
+            "model": self.model,
+            "messages": get_prompt("evaluate_problem_solving_batch").messages(items=items),
+            "response_format": {"type": "json_object"},
+            "temperature": 0.3,
+            "max_tokens": 300 * len(pending) + 100
+        }
+    
+    def _parse_batch_evaluations(self, response, pending):
+        """
+        Extract the well-formed per-item evaluations from a batched grading response
+        """
+        data = json.loads(response.choices[0].message.content)
+        evaluations = {}
+        for result in data.get("results", []):
+            if not isinstance(result, dict):
+                continue
+            try:
+                index = int(result.get("index"))
+            except (TypeError, ValueError):
+                continue
+            evaluation = self._parse_evaluation(result)
+            if index in pending and evaluation is not None:
+                evaluations[index] = evaluation
+        return evaluations
+    
+    def _parse_evaluation(self, result):
+        """
+        Validate a grading result, returning None if it is malformed
+        """
+        correct = result.get("correct")
+        credit = result.get("partial_credit")
+        explanation = result.get("explanation")
+        if not isinstance(correct, bool) or not isinstance(explanation, str):
+            return None
+        if isinstance(credit, bool) or not isinstance(credit, (int, float)):
+            return None
+        return {
+            "correct": correct,
+            "partial_credit": min(max(float(credit), 0.0), 1.0),
+            "explanation": explanation
+        }
+    
+    def generate_adaptive_question(self, subject, current_difficulty, performance_history, topic=None):
         """
         Generate adaptive questions based on student performance
+        
+        performance_history is either a skill_model.SkillEstimate or a list of scores
+        answered at current_difficulty; topic defaults to any topic of the subject.
         """
         try:
-            # Adjust difficulty based on performance
-            if performance_history:
-                avg_score = sum(performance_history) / len(performance_history)
-                if avg_score > 0.8:
-                    adjusted_difficulty = "Advanced" if current_difficulty != "Advanced" else "Advanced"
-                elif avg_score < 0.6:
-                    adjusted_difficulty = "Beginner" if current_difficulty != "Beginner" else "Beginner"
-                else:
-                    adjusted_difficulty = current_difficulty
-            else:
-                adjusted_difficulty = current_difficulty
-            
-            system_prompt = f"""Create a single adaptive question for {subject} at {adjusted_difficulty} level.
-            
-            The question should:
-            1. Test key concepts appropriately for this difficulty
-            2. Be engaging and educational
-            3. Include proper mathematical notation if needed
-            
-            Return JSON in this format:
-            {{
-                "question": "Question text",
-                "type": "multiple_choice",
-                "options": ["A) Option 1", "B) Option 2", "C) Option 3", "D) Option 4"],
-                "correct_answer": "A) Option 1",
-                "explanation": "Detailed explanation"
-            }}
-            """
-            
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": f"Generate an adaptive question for current performance level"}
-                ],
-                response_format={"type": "json_object"},
-                temperature=0.8,
-                max_tokens=800
+            return self._request_adaptive_question(
+                subject,
+                adaptive_difficulty(performance_history, current_difficulty),
+                topic=topic
+            )
+        
+        except Exception as e:
+            return self._adaptive_question_error(e)
+    
+    async def generate_adaptive_question_async(self, subject, current_difficulty, performance_history, topic=None):
+        """
+        Async counterpart of generate_adaptive_question
+        """
+        try:
+            adjusted_difficulty = adaptive_difficulty(performance_history, current_difficulty)
+            response = await acreate_chat_completion(
+                self.async_client,
+                "generate_adaptive_question",
+                **self._adaptive_question_request(subject, adjusted_difficulty, topic)
             )
             
             return json.loads(response.choices[0].message.content)
-            
+        
         except Exception as e:
-            return {
-                "question": f"Error generating adaptive question: {str(e)}",
-                "type": "multiple_choice",
-                "options": ["A) Error", "B) Error", "C) Error", "D) Error"],
-                "correct_answer": "A) Error",
-                "explanation": "An error occurred while generating this question."
-            }
+            return self._adaptive_question_error(e)
+    
+    def _request_adaptive_question(self, subject, difficulty, priority=None, topic=None):
+        """
+        Ask the model for a single question at a fixed difficulty; raises on API or parsing errors
+        """
+        response = create_chat_completion(
+            self.client,
+            "generate_adaptive_question",
+            priority=priority,
+            **self._adaptive_question_request(subject, difficulty, topic)
+        )
+        
+        return json.loads(response.choices[0].message.content)
+    
+    def _adaptive_question_request(self, subject, difficulty, topic=None):
+        """
+        Build the completion parameters for a single adaptive question
+        """
+        if topic is None:
+            topic = "any of " + (", ".join(get_subject_topics(subject)) or subject)
+        return {
+            "model": self.model,
+            "messages": get_prompt("generate_adaptive_question").messages(subject=subject, difficulty=difficulty, topic=topic),
+            "response_format": {"type": "json_object"},
+            "temperature": 0.8,
+            "max_tokens": 800
+        }
+    
+    def _adaptive_question_error(self, error):
+        """
+        Placeholder question returned when adaptive generation fails
+        """
+        return {
+            "question": f"Error generating adaptive question: {str(error)}",
+            "type": "multiple_choice",
+            "options": ["A) Error", "B) Error", "C) Error", "D) Error"],
+            "correct_answer": "A) Error",
+            "explanation": "An error occurred while generating this question."
+        }
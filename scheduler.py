@@ -0,0 +1,253 @@
+import os
+import time
+import heapq
+import asyncio
+import itertools
+import threading
+from collections import deque
+
+# Lower numbers are served first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_GRADING = 1
+PRIORITY_BULK = 2
+PRIORITY_PREFETCH = 3
+
+METHOD_PRIORITIES = {
+    "answer_question": PRIORITY_INTERACTIVE,
+    "explain_step_by_step": PRIORITY_INTERACTIVE,
+    "generate_hint": PRIORITY_INTERACTIVE,
+    "summarize_conversation": PRIORITY_INTERACTIVE,
+    "assess_difficulty": PRIORITY_GRADING,
+    "evaluate_problem_solving": PRIORITY_GRADING,
+    "evaluate_problem_solving_batch": PRIORITY_GRADING,
+    "generate_adaptive_question": PRIORITY_GRADING,
+    "generate_quiz": PRIORITY_BULK
+}
+
+class SchedulerTimeout(Exception):
+    """
+    Raised when a queued call could not be admitted before its deadline
+    """
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at rate_per_minute up to its capacity
+    """
+
+    def __init__(self, rate_per_minute, capacity=None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self.available = float(self.capacity)
+        self.updated_at = time.monotonic()
+
+    def refill(self, now):
+        """
+        Add the tokens accrued since the last update
+        """
+        self.available = min(self.capacity, self.available + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def wait_time(self, amount):
+        """
+        Seconds until amount tokens are available; requests larger than capacity only need a full bucket
+        """
+        needed = min(amount, self.capacity) - self.available
+        return max(0.0, needed / self.rate) if self.rate > 0 else float("inf")
+
+    def take(self, amount):
+        """
+        Consume tokens; the balance may go negative for oversized requests
+        """
+        self.available -= amount
+
+    def give_back(self, amount):
+        """
+        Return unused tokens, e.g. when actual usage was below the estimate
+        """
+        self.available = min(self.capacity, self.available + amount)
+
+class LLMScheduler:
+    """
+    Process-wide admission control for LLM calls: request and token buckets behind a priority queue
+    """
+
+    def __init__(self, requests_per_minute=500, tokens_per_minute=200000, max_wait=30.0):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.max_wait = max_wait
+        self._condition = threading.Condition()
+        self._queue = []
+        # (loop, asyncio.Event) for each coroutine waiting in acquire_async
+        self._async_waiters = set()
+        self._sequence = itertools.count()
+        self._admitted = 0
+        self._timeouts = 0
+        self._max_depth = 0
+        self._wait_times = deque(maxlen=1000)
+
+    def acquire(self, priority, estimated_tokens, timeout=None):
+        """
+        Block until the call may proceed, serving higher priorities first
+
+        Returns the seconds spent waiting; raises SchedulerTimeout after the deadline.
+        """
+        timeout = self.max_wait if timeout is None else timeout
+        start = time.monotonic()
+        entry = (priority, next(self._sequence))
+
+        with self._condition:
+            self._enqueue(entry)
+            try:
+                while True:
+                    waited, sleep = self._try_admit(entry, estimated_tokens, start, timeout)
+                    if sleep is None:
+                        return waited
+                    self._condition.wait(sleep)
+            except BaseException:
+                self._dequeue(entry)
+                raise
+
+    async def acquire_async(self, priority, estimated_tokens, timeout=None):
+        """
+        Async counterpart of acquire; waits on the event loop without holding a thread
+
+        A cancelled caller leaves the queue immediately, so no token is taken for a call
+        that will never be sent.
+        """
+        timeout = self.max_wait if timeout is None else timeout
+        start = time.monotonic()
+        entry = (priority, next(self._sequence))
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+
+        with self._condition:
+            self._enqueue(entry)
+            self._async_waiters.add(waiter)
+        try:
+            while True:
+                with self._condition:
+                    waiter[1].clear()
+                    waited, sleep = self._try_admit(entry, estimated_tokens, start, timeout)
+                if sleep is None:
+                    return waited
+                try:
+                    await asyncio.wait_for(waiter[1].wait(), sleep)
+                except asyncio.TimeoutError:
+                    pass
+        except BaseException:
+            with self._condition:
+                self._dequeue(entry)
+            raise
+        finally:
+            with self._condition:
+                self._async_waiters.discard(waiter)
+
+    def _enqueue(self, entry):
+        heapq.heappush(self._queue, entry)
+        self._max_depth = max(self._max_depth, len(self._queue))
+
+    def _dequeue(self, entry):
+        """
+        Remove an abandoned entry so the callers behind it can move up; call with the lock held
+        """
+        if entry in self._queue:
+            self._queue.remove(entry)
+            heapq.heapify(self._queue)
+            self._wake()
+
+    def _try_admit(self, entry, estimated_tokens, start, timeout):
+        """
+        One admission attempt with the lock held
+
+        Returns (seconds waited, None) once admitted, or (None, seconds to sleep before
+        retrying); dequeues the entry and raises SchedulerTimeout after the deadline.
+        """
+        now = time.monotonic()
+        self.requests.refill(now)
+        self.tokens.refill(now)
+
+        wait = None
+        if self._queue[0] == entry:
+            wait = max(self.requests.wait_time(1), self.tokens.wait_time(estimated_tokens))
+            if wait == 0:
+                heapq.heappop(self._queue)
+                self.requests.take(1)
+                self.tokens.take(estimated_tokens)
+                waited = now - start
+                self._admitted += 1
+                self._wait_times.append(waited)
+                self._wake()
+                return waited, None
+
+        remaining = start + timeout - now
+        if remaining <= 0:
+            self._timeouts += 1
+            self._dequeue(entry)
+            raise SchedulerTimeout(
+                f"LLM request queue is full; waited {timeout:.0f}s without capacity"
+            )
+        return None, remaining if wait is None else min(wait, remaining)
+
+    def _wake(self):
+        """
+        Let every thread and coroutine waiter re-check the queue head; call with the lock held
+        """
+        self._condition.notify_all()
+        for loop, woken in self._async_waiters:
+            try:
+                loop.call_soon_threadsafe(woken.set)
+            except RuntimeError:
+                # The waiter's loop has closed; its entry is removed as it unwinds
+                pass
+
+    def reconcile(self, estimated_tokens, actual_tokens):
+        """
+        Refund the token bucket when a call used fewer tokens than estimated
+        """
+        if actual_tokens is None or actual_tokens >= estimated_tokens:
+            return
+        with self._condition:
+            self.tokens.give_back(estimated_tokens - actual_tokens)
+            self._wake()
+
+    def metrics(self):
+        """
+        Queue depth, admission counts and wait-time statistics
+        """
+        with self._condition:
+            waits = sorted(self._wait_times)
+            return {
+                "queue_depth": len(self._queue),
+                "max_queue_depth": self._max_depth,
+                "admitted": self._admitted,
+                "timeouts": self._timeouts,
+                "wait_p50": waits[len(waits) // 2] if waits else 0.0,
+                "wait_p95": waits[int(len(waits) * 0.95)] if waits else 0.0,
+                "wait_max": waits[-1] if waits else 0.0,
+                "requests_available": self.requests.available,
+                "tokens_available": self.tokens.available
+            }
+
+def estimate_tokens(messages, max_tokens):
+    """
+    Rough token estimate for admission control: about four characters per prompt token plus the completion budget
+    """
+    prompt_chars = sum(len(str(message.get("content", ""))) for message in messages or [])
+    return prompt_chars // 4 + (max_tokens or 1000)
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+def get_scheduler():
+    """
+    Return the process-wide scheduler, configured from EDUPROMPT_RPM, EDUPROMPT_TPM and EDUPROMPT_QUEUE_TIMEOUT
+    """
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = LLMScheduler(
+                    requests_per_minute=int(os.getenv("EDUPROMPT_RPM", "500")),
+                    tokens_per_minute=int(os.getenv("EDUPROMPT_TPM", "200000")),
+                    max_wait=float(os.getenv("EDUPROMPT_QUEUE_TIMEOUT", "30"))
+                )
+    return _scheduler
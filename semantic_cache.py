@@ -0,0 +1,232 @@
+import re
+import zlib
+import threading
+import numpy as np
+
+SUPERSCRIPTS = str.maketrans({
+    "⁰": "^0", "¹": "^1", "²": "^2", "³": "^3", "⁴": "^4",
+    "⁵": "^5", "⁶": "^6", "⁷": "^7", "⁸": "^8", "⁹": "^9", "ⁿ": "^n"
+})
+
+SYMBOLS = str.maketrans({
+    "·": " ", "×": " ", "∙": " ", "*": " ", "−": "-", "–": "-", "÷": "/",
+    "π": " pi ", "θ": " theta ", "√": " sqrt ", "∫": " integral ", "∑": " sum ",
+    "(": " ( ", ")": " ) ", "[": " [ ", "]": " ] ", "{": " ( ", "}": " ) ",
+    "$": " ", ",": " ", "?": " ", "!": " "
+})
+
+# LaTeX rewritten before symbols are mapped, so braces that group an argument become parentheses
+LATEX_GROUPS = [
+    (r"\\[()\[\]]|\\left|\\right", " "),
+    (r"\\[dt]?frac\s*\{([^{}]*)\}\s*\{([^{}]*)\}", r"(\1)/(\2)"),
+    (r"\^\{(\w+)\}", r"^\1"),
+]
+
+PHRASES = [
+    (r"\\frac\s*(\S+)\s*(\S+)", r"\1/\2"),
+    (r"\\(sin|cos|tan|log|ln|exp|sqrt|int|sum|lim|pi|theta|cdot|times)", r" \1 "),
+    (r"\bcdot\b|\btimes\b", " "),
+    (r"\bd\s*/\s*d([a-z])\b", r" derivative wrt \1 "),
+    (r"\bdifferentiate\b|\bderivative\s+of\b", " derivative "),
+    (r"\bint\b|\bintegrate\b|\bintegral\s+of\b|\bantiderivative\s+of\b", " integral "),
+    (r"\bsquared\b", " ^2 "),
+    (r"\bcubed\b", " ^3 "),
+    (r"\*\*", "^"),
+    (r"\s*\^\s*", "^"),
+    (r"\s*([=+\-/<>])\s*", r" \1 "),
+]
+
+STOPWORDS = {
+    "a", "an", "the", "of", "what", "is", "are", "find", "compute", "calculate", "please",
+    "how", "do", "i", "you", "can", "me", "to", "for", "solve", "evaluate", "determine", "this"
+}
+
+def normalize_math(text):
+    """
+    Normalize math notation and wording so equivalent phrasings map to the same tokens
+    """
+    text = str(text).lower().translate(SUPERSCRIPTS)
+    for pattern, replacement in LATEX_GROUPS:
+        text = re.sub(pattern, replacement, text)
+    text = text.translate(SYMBOLS)
+    for pattern, replacement in PHRASES:
+        text = re.sub(pattern, replacement, text)
+    # Grouping symbols stay separate tokens: sin(x)^2 and sin(x^2) are different problems
+    text = re.sub(r"\s*([()\[\]])\s*", r" \1 ", text)
+    # Parentheses around a single atom or function argument carry no structure: sin(x) is sin x,
+    # unless a power follows, as in sin(x)^2; an exponent left alone rejoins its caret
+    previous = None
+    while previous != text:
+        previous = text
+        text = re.sub(r"\(\s+([^\s()\[\]]+)\s+\)(?!\s*\^)", r" \1 ", text)
+    text = re.sub(r"\^\s+(?=[^\s(\[])", "^", text)
+    # "derivative wrt x" is implied when the variable is x, which is how most students write it
+    text = text.replace("derivative wrt x", "derivative")
+    tokens = [token for token in text.split() if token not in STOPWORDS]
+    return " ".join(tokens)
+
+def math_signature(normalized):
+    """
+    Extract the numbers, variables, operators and brackets, in order, that must match exactly between duplicates
+    """
+    return tuple(
+        token for token in normalized.split()
+        if len(token) == 1 or any(char.isdigit() or char == "^" for char in token)
+    )
+
+def hashed_vector(normalized, dimensions=256):
+    """
+    Hash the word and character n-grams of normalized text into a unit vector
+    """
+    words = normalized.split()
+    features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    compact = normalized.replace(" ", "_")
+    features += [compact[i:i + 3] for i in range(max(len(compact) - 2, 0))]
+
+    vector = np.zeros(dimensions, dtype=np.float32)
+    for feature in features:
+        hashed = zlib.crc32(feature.encode("utf-8"))
+        sign = 1.0 if hashed & 0x80000000 else -1.0
+        vector[hashed % dimensions] += sign
+
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+class SemanticCache:
+    """
+    Near-duplicate question cache using hashed n-gram vectors and LSH-blocked cosine search
+    """
+
+    def __init__(self, threshold=0.9, dimensions=256, num_tables=12, bits_per_table=8,
+                 max_entries=200000, seed=7):
+        self.threshold = threshold
+        self.dimensions = dimensions
+        self.num_tables = num_tables
+        self.bits_per_table = bits_per_table
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+        rng = np.random.default_rng(seed)
+        self._planes = rng.standard_normal((num_tables * bits_per_table, dimensions)).astype(np.float32)
+        self._powers = (1 << np.arange(bits_per_table, dtype=np.int64))
+
+        self._vectors = np.zeros((min(1024, max_entries), dimensions), dtype=np.float32)
+        self._codes = np.zeros((len(self._vectors), num_tables), dtype=np.int64)
+        self._partitions = [None] * len(self._vectors)
+        self._signatures = [None] * len(self._vectors)
+        self._values = [None] * len(self._vectors)
+        self._buckets = [dict() for _ in range(num_tables)]
+        self._size = 0
+        self._next_slot = 0
+        self._lock = threading.Lock()
+
+    def vectorize(self, text):
+        """
+        Convert text into an L2-normalized hashed n-gram vector
+        """
+        return self._vectorize(normalize_math(text))
+
+    def lookup(self, method, text, subject, difficulty):
+        """
+        Return the stored value for the most similar question above the threshold, or None
+        """
+        normalized = normalize_math(text)
+        vector = self._vectorize(normalized)
+        signature = math_signature(normalized)
+        partition = (method, subject, difficulty)
+        codes = self._hash(vector)
+
+        with self._lock:
+            candidates = set()
+            for table, code in enumerate(codes):
+                candidates.update(self._buckets[table].get((partition, int(code)), ()))
+            # Different numbers or variables make a different problem, however similar the wording
+            candidates = [slot for slot in candidates if self._signatures[slot] == signature]
+
+            if candidates:
+                ids = np.array(candidates, dtype=np.int64)
+                similarities = self._vectors[ids] @ vector
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    self.hits += 1
+                    return self._values[ids[best]]
+
+            self.misses += 1
+            return None
+
+    def add(self, method, text, subject, difficulty, value):
+        """
+        Index a question and its answer, overwriting the oldest entry once full
+        """
+        normalized = normalize_math(text)
+        vector = self._vectorize(normalized)
+        if not vector.any():
+            return
+        partition = (method, subject, difficulty)
+        codes = self._hash(vector)
+
+        with self._lock:
+            slot = self._next_slot
+            if slot >= len(self._vectors):
+                self._grow()
+            if self._partitions[slot] is not None:
+                self._unindex(slot)
+
+            self._vectors[slot] = vector
+            self._codes[slot] = codes
+            self._partitions[slot] = partition
+            self._signatures[slot] = math_signature(normalized)
+            self._values[slot] = value
+            for table, code in enumerate(codes):
+                self._buckets[table].setdefault((partition, int(code)), set()).add(slot)
+
+            self._size = min(self._size + 1, self.max_entries)
+            self._next_slot = (slot + 1) % self.max_entries
+
+    def stats(self):
+        """
+        Report hit/miss counters and index size
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": self._size
+            }
+
+    def _vectorize(self, normalized):
+        return hashed_vector(normalized, self.dimensions)
+
+    def _hash(self, vector):
+        """
+        Compute one random-hyperplane signature per LSH table
+        """
+        bits = (self._planes @ vector > 0).reshape(self.num_tables, self.bits_per_table)
+        return bits.astype(np.int64) @ self._powers
+
+    def _grow(self):
+        """
+        Double the storage arrays up to max_entries
+        """
+        capacity = min(len(self._vectors) * 2, self.max_entries)
+        extra = capacity - len(self._vectors)
+        self._vectors = np.vstack([self._vectors, np.zeros((extra, self.dimensions), dtype=np.float32)])
+        self._codes = np.vstack([self._codes, np.zeros((extra, self.num_tables), dtype=np.int64)])
+        self._partitions.extend([None] * extra)
+        self._signatures.extend([None] * extra)
+        self._values.extend([None] * extra)
+
+    def _unindex(self, slot):
+        """
+        Remove an overwritten slot from its LSH buckets
+        """
+        partition = self._partitions[slot]
+        for table, code in enumerate(self._codes[slot]):
+            bucket = self._buckets[table].get((partition, int(code)))
+            if bucket is not None:
+                bucket.discard(slot)
+                if not bucket:
+                    del self._buckets[table][(partition, int(code))]
@@ -0,0 +1,207 @@
+import re
+import json
+import asyncio
+import hashlib
+import threading
+
+def request_key(method, client, kwargs):
+    """
+    Normalized identity of a completion request: whitespace-collapsed messages plus sampling parameters
+    """
+    messages = [
+        {"role": message.get("role"), "content": re.sub(r"\s+", " ", str(message.get("content", ""))).strip()}
+        for message in kwargs.get("messages") or []
+    ]
+    payload = {
+        "method": method,
+        "client": id(client),
+        "messages": messages,
+        **{name: value for name, value in kwargs.items() if name not in ("messages", "timeout")}
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+class _Call:
+    """
+    One in-flight call whose outcome is shared by every waiter
+    """
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+        self.followers = 0
+
+class _SharedStream:
+    """
+    Buffers a streamed response so any number of readers can replay it from the start
+    """
+
+    def __init__(self):
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self.followers = 0
+        self.condition = threading.Condition()
+
+    def feed(self, open_stream):
+        """
+        Drive the upstream stream to completion, publishing each chunk to readers
+        """
+        try:
+            for chunk in open_stream():
+                with self.condition:
+                    self.chunks.append(chunk)
+                    self.condition.notify_all()
+        except Exception as e:
+            self.error = e
+        finally:
+            with self.condition:
+                self.done = True
+                self.condition.notify_all()
+
+    def __iter__(self):
+        position = 0
+        while True:
+            with self.condition:
+                while position >= len(self.chunks) and not self.done:
+                    self.condition.wait()
+                if position < len(self.chunks):
+                    chunk = self.chunks[position]
+                    position += 1
+                elif self.error is not None:
+                    raise self.error
+                else:
+                    return
+            yield chunk
+
+class SingleFlight:
+    """
+    Coalesces identical concurrent calls so only one reaches the API
+    """
+
+    def __init__(self):
+        self.leaders = 0
+        self.followers = 0
+        self._calls = {}
+        self._streams = {}
+        self._async_calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        """
+        Run fn once per key among concurrent callers; every caller receives its result or exception
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.leaders += 1
+            else:
+                call.followers += 1
+                self.followers += 1
+
+        if not leader:
+            call.event.wait()
+        else:
+            try:
+                call.result = fn()
+            except Exception as e:
+                call.error = e
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.event.set()
+
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def stream(self, key, open_stream):
+        """
+        Share one upstream stream among concurrent callers; each gets an iterator over every chunk
+        """
+        with self._lock:
+            shared = self._streams.get(key)
+            if shared is None:
+                shared = self._streams[key] = _SharedStream()
+                self.leaders += 1
+                threading.Thread(
+                    target=self._feed_stream, args=(key, shared, open_stream), name="single-flight-stream", daemon=True
+                ).start()
+            else:
+                shared.followers += 1
+                self.followers += 1
+        return iter(shared)
+
+    async def do_async(self, key, make_coroutine):
+        """
+        Async counterpart of do; callers on the same event loop share one awaited call
+
+        Calls are keyed per event loop, since a future can only be awaited on its own loop.
+        If the leader is cancelled, its followers retry and one of them leads a new call.
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            future = self._async_calls.get((loop, key))
+            leader = future is None
+            if leader:
+                future = self._async_calls[(loop, key)] = loop.create_future()
+                self.leaders += 1
+            else:
+                self.followers += 1
+
+        if not leader:
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+            return await self.do_async(key, make_coroutine)
+
+        try:
+            result = await make_coroutine()
+        except Exception as e:
+            future.set_exception(e)
+            # Mark retrieved so an exception nobody else awaited is not reported as unhandled
+            future.exception()
+            raise
+        except BaseException:
+            # Cancelled or interrupted: release the followers instead of leaving them waiting
+            future.cancel()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._async_calls[(loop, key)]
+
+    def stats(self):
+        """
+        Number of calls that went upstream and calls that piggybacked on them
+        """
+        with self._lock:
+            return {
+                "leaders": self.leaders,
+                "followers": self.followers,
+                "in_flight": len(self._calls) + len(self._streams) + len(self._async_calls)
+            }
+
+    def _feed_stream(self, key, shared, open_stream):
+        """
+        Background driver for a shared stream; the key is released once the stream ends
+        """
+        try:
+            shared.feed(open_stream)
+        finally:
+            with self._lock:
+                self._streams.pop(key, None)
+
+_single_flight = SingleFlight()
+
+def get_single_flight():
+    """
+    Return the process-wide SingleFlight shared by every session
+    """
+    return _single_flight
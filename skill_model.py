@@ -0,0 +1,248 @@
+import threading
+import numpy as np
+
+DIFFICULTY_LEVELS = ("Beginner", "Intermediate", "Advanced")
+# Elo rating of a typical question at each difficulty level
+LEVEL_RATINGS = {"Beginner": 1200.0, "Intermediate": 1500.0, "Advanced": 1800.0}
+# A student is recommended the level whose rating is nearest their own
+LEVEL_THRESHOLDS = (1350.0, 1650.0)
+
+INITIAL_RATING = 1500.0
+K_FACTOR = 32.0
+# Extra step size for a student's first answers, shrinking geometrically, so a few answers move the level
+PROVISIONAL_K = 160.0
+# Weight kept by earlier answers in the rolling accuracy
+DECAY = 0.8
+
+def expected_score(rating, item_rating):
+    """
+    Probability of a correct answer under the Elo model; works on scalars and arrays
+    """
+    return 1.0 / (1.0 + 10.0 ** ((item_rating - rating) / 400.0))
+
+def k_factor(attempts):
+    return K_FACTOR + PROVISIONAL_K * DECAY ** attempts
+
+def recommend_difficulty(rating):
+    """
+    Difficulty level for a skill rating
+    """
+    return DIFFICULTY_LEVELS[int(np.searchsorted(LEVEL_THRESHOLDS, rating, side="right"))]
+
+def recommend_difficulties(ratings):
+    """
+    Vectorized recommend_difficulty for a whole cohort of ratings
+    """
+    return np.asarray(DIFFICULTY_LEVELS)[np.searchsorted(LEVEL_THRESHOLDS, np.asarray(ratings), side="right")]
+
+class SkillEstimate:
+    """
+    Elo-style skill rating with an exponentially decayed rolling accuracy, updated in O(1) per answer
+    """
+    __slots__ = ("rating", "score_sum", "weight", "attempts")
+    
+    def __init__(self, rating=INITIAL_RATING, score_sum=0.0, weight=0.0, attempts=0):
+        self.rating = rating
+        self.score_sum = score_sum
+        self.weight = weight
+        self.attempts = attempts
+    
+    @classmethod
+    def from_history(cls, scores, difficulty="Intermediate"):
+        """
+        Replay a list of scores, all answered at one difficulty level, starting from that level's rating
+        """
+        estimate = cls(rating=LEVEL_RATINGS.get(difficulty, INITIAL_RATING))
+        for score in scores:
+            estimate.update(difficulty, score)
+        return estimate
+    
+    @property
+    def accuracy(self):
+        """
+        Decay-weighted mean score, or None before the first answer
+        """
+        return self.score_sum / self.weight if self.weight else None
+    
+    def update(self, difficulty, score):
+        """
+        Fold in one answer scored in [0, 1] to a question of the given difficulty
+        """
+        item_rating = LEVEL_RATINGS.get(difficulty, LEVEL_RATINGS["Intermediate"])
+        self.rating += k_factor(self.attempts) * (score - expected_score(self.rating, item_rating))
+        self.score_sum = DECAY * self.score_sum + (1 - DECAY) * score
+        self.weight = DECAY * self.weight + (1 - DECAY)
+        self.attempts += 1
+        return self
+    
+    def updated(self, difficulty, score):
+        """
+        Copy of this estimate after one more answer
+        """
+        return self.copy().update(difficulty, score)
+    
+    def copy(self):
+        return SkillEstimate(self.rating, self.score_sum, self.weight, self.attempts)
+    
+    def recommended_difficulty(self):
+        return recommend_difficulty(self.rating)
+
+def as_estimate(history, difficulty="Intermediate"):
+    """
+    SkillEstimate for either an estimate or a plain list of scores answered at difficulty
+    """
+    if isinstance(history, SkillEstimate):
+        return history
+    return SkillEstimate.from_history(history or [], difficulty)
+
+def adaptive_difficulty(history, difficulty="Intermediate"):
+    """
+    Recommended difficulty for the next question given an estimate or a list of scores
+    """
+    return as_estimate(history, difficulty).recommended_difficulty()
+
+def with_outcome(history, score):
+    """
+    History after one more answer at the currently recommended level, in the same form as given
+    """
+    if isinstance(history, SkillEstimate):
+        return history.updated(history.recommended_difficulty(), score)
+    return list(history or []) + [score]
+
+def bulk_recompute(keys, difficulties, scores):
+    """
+    Rebuild estimates for many (student, subject, topic) keys from chronological attempts
+    
+    Each key's answers are still applied in order, but the n-th answers of every key
+    are processed together as one vectorized step, so the loop runs once per position
+    rather than once per attempt. Returns {key: SkillEstimate}.
+    """
+    if len(keys) == 0:
+        return {}
+    key_ids = {}
+    key_index = np.fromiter((key_ids.setdefault(key, len(key_ids)) for key in keys), dtype=np.int64, count=len(keys))
+    unique_keys = list(key_ids)
+    item_ratings = np.array([LEVEL_RATINGS.get(d, LEVEL_RATINGS["Intermediate"]) for d in difficulties])
+    scores = np.asarray(scores, dtype=float)
+    
+    # Position of each attempt within its key's own sequence
+    counts = np.bincount(key_index)
+    by_key = np.argsort(key_index, kind="stable")
+    position = np.empty(len(key_index), dtype=np.int64)
+    position[by_key] = np.arange(len(key_index)) - np.repeat(np.cumsum(counts) - counts, counts)
+    
+    # Group attempts by position so each step is one contiguous slice
+    by_position = np.argsort(position, kind="stable")
+    step_sizes = np.bincount(position)
+    
+    ratings = np.full(len(unique_keys), INITIAL_RATING)
+    score_sums = np.zeros(len(unique_keys))
+    weights = np.zeros(len(unique_keys))
+    start = 0
+    for step, size in enumerate(step_sizes):
+        rows = by_position[start:start + size]
+        start += size
+        k = key_index[rows]
+        ratings[k] += k_factor(step) * (scores[rows] - expected_score(ratings[k], item_ratings[rows]))
+        score_sums[k] = DECAY * score_sums[k] + (1 - DECAY) * scores[rows]
+        weights[k] = DECAY * weights[k] + (1 - DECAY)
+    
+    return {
+        key: SkillEstimate(float(ratings[i]), float(score_sums[i]), float(weights[i]), int(counts[i]))
+        for i, key in enumerate(unique_keys)
+    }
+
+class SkillModel:
+    """
+    Process-wide skill estimates per (student, subject, topic); topic None holds the subject-wide estimate
+    """
+    
+    def __init__(self):
+        self._estimates = {}
+        self._loaded = set()
+        self._lock = threading.Lock()
+    
+    def is_loaded(self, student_id):
+        with self._lock:
+            return student_id in self._loaded
+    
+    def load(self, attempts, student_ids=()):
+        """
+        Rebuild estimates from chronological (student_id, subject, topic, difficulty, score) attempts
+        
+        Works for one student or a whole cohort in a single vectorized pass; student_ids
+        marks students as loaded even when they have no attempts yet.
+        """
+        keys, difficulties, scores = [], [], []
+        students = set(student_ids)
+        for student_id, subject, topic, difficulty, score in attempts:
+            students.add(student_id)
+            for key in self._keys(student_id, subject, topic):
+                keys.append(key)
+                difficulties.append(difficulty)
+                scores.append(score)
+        estimates = bulk_recompute(keys, difficulties, scores)
+        with self._lock:
+            self._estimates.update(estimates)
+            self._loaded.update(students)
+    
+    def update(self, student_id, subject, topic, difficulty, score):
+        """
+        Apply one answer to the subject-wide estimate and, when known, the topic estimate
+        """
+        with self._lock:
+            for key in self._keys(student_id, subject, topic):
+                self._estimates.setdefault(key, SkillEstimate()).update(difficulty, score)
+    
+    @staticmethod
+    def _keys(student_id, subject, topic):
+        """
+        Estimates an answer counts towards: the subject-wide one and, when known, its topic
+        """
+        if topic:
+            return ((student_id, subject, None), (student_id, subject, topic))
+        return ((student_id, subject, None),)
+    
+    def estimate(self, student_id, subject, topic=None):
+        """
+        Copy of the current estimate, falling back from the topic to the subject to a fresh one
+        """
+        with self._lock:
+            estimate = self._estimates.get((student_id, subject, topic))
+            if estimate is None and topic is not None:
+                estimate = self._estimates.get((student_id, subject, None))
+            return estimate.copy() if estimate is not None else SkillEstimate()
+    
+    def recommend(self, student_id, subject, topic=None):
+        return self.estimate(student_id, subject, topic).recommended_difficulty()
+    
+    def recommend_cohort(self, subject, topic=None):
+        """
+        Recommended difficulty for every loaded student with an estimate for this subject or topic
+        """
+        with self._lock:
+            students, ratings = [], []
+            for (student_id, key_subject, key_topic), estimate in self._estimates.items():
+                if key_subject == subject and key_topic == topic:
+                    students.append(student_id)
+                    ratings.append(estimate.rating)
+        return dict(zip(students, recommend_difficulties(ratings).tolist())) if students else {}
+    
+    def topic_report(self, student_id, subject, topics):
+        """
+        Rating, rolling accuracy and recommended level for each topic, weakest first
+        """
+        with self._lock:
+            rows = []
+            for topic in topics:
+                estimate = self._estimates.get((student_id, subject, topic))
+                if estimate is None:
+                    continue
+                rows.append({
+                    "topic": topic,
+                    "rating": round(estimate.rating),
+                    "accuracy": estimate.accuracy,
+                    "attempts": estimate.attempts,
+                    "recommended": estimate.recommended_difficulty()
+                })
+        return sorted(rows, key=lambda row: row["rating"])
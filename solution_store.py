@@ -0,0 +1,144 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from semantic_cache import normalize_math
+
+def valid_step(step):
+    """
+    Whether a parsed step has the expression and reasoning the reveal view shows
+    """
+    return (
+        isinstance(step, dict)
+        and isinstance(step.get("expression"), str)
+        and isinstance(step.get("reasoning"), str)
+        and bool(step["expression"].strip() or step["reasoning"].strip())
+    )
+
+def valid_solution(solution):
+    """
+    Whether a parsed solution has at least one step and a final answer
+    """
+    return (
+        isinstance(solution, dict)
+        and isinstance(solution.get("steps"), list)
+        and bool(solution["steps"])
+        and all(valid_step(step) for step in solution["steps"])
+        and isinstance(solution.get("final_answer"), str)
+    )
+
+def format_step(number, step):
+    """
+    Markdown for one step
+    """
+    text = f"**Step {number}:** {step['reasoning']}"
+    if step["expression"].strip():
+        text += f"\n\n$${step['expression']}$$"
+    return text
+
+def format_solution(solution, steps=None):
+    """
+    Markdown for the first steps of a solution, or all of it with the final answer
+    """
+    shown = solution["steps"] if steps is None else solution["steps"][:steps]
+    parts = [format_step(i + 1, step) for i, step in enumerate(shown)]
+    if len(shown) == len(solution["steps"]):
+        parts.append(format_conclusion(solution))
+    return "\n\n".join(parts)
+
+def format_conclusion(solution):
+    """
+    Markdown for the final answer and any tips
+    """
+    text = f"**Final answer:** {solution['final_answer']}"
+    if solution.get("tips"):
+        text += f"\n\n**Tips:** {solution['tips']}"
+    return text
+
+class SolutionStore:
+    """
+    Structured step-by-step solutions per math-normalized problem, in an in-memory LRU and SQLite
+    
+    One stored solution serves every later view and every student asking the same problem,
+    and find() lets grading use it as a reference regardless of subject or difficulty.
+    """
+    
+    def __init__(self, db_path=":memory:", max_memory_entries=2000):
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.max_memory_entries = max_memory_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS solutions (
+                key TEXT PRIMARY KEY,
+                problem_key TEXT NOT NULL,
+                subject TEXT NOT NULL,
+                difficulty TEXT NOT NULL,
+                problem TEXT NOT NULL,
+                solution TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )"""
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS solutions_problem ON solutions (problem_key, created_at)")
+        self._db.commit()
+    
+    @staticmethod
+    def problem_key(problem):
+        return hashlib.sha256(normalize_math(problem).encode("utf-8")).hexdigest()
+    
+    @classmethod
+    def make_key(cls, problem, subject, difficulty):
+        payload = json.dumps([cls.problem_key(problem), subject, difficulty])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    
+    def get(self, problem, subject, difficulty):
+        """
+        The stored solution for this problem at this subject and level, or None
+        """
+        key = self.make_key(problem, subject, difficulty)
+        with self._lock:
+            solution = self._memory.get(key)
+            if solution is not None:
+                self._memory.move_to_end(key)
+                return solution
+            row = self._db.execute("SELECT solution FROM solutions WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            solution = json.loads(row[0])
+            self._remember(key, solution)
+            return solution
+    
+    def find(self, problem):
+        """
+        The most recent stored solution for this problem at any subject or level, or None
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT solution FROM solutions WHERE problem_key = ? ORDER BY created_at DESC LIMIT 1",
+                (self.problem_key(problem),)
+            ).fetchone()
+        return json.loads(row[0]) if row is not None else None
+    
+    def put(self, problem, subject, difficulty, solution):
+        key = self.make_key(problem, subject, difficulty)
+        with self._lock:
+            self._db.execute(
+                """INSERT OR REPLACE INTO solutions (key, problem_key, subject, difficulty, problem, solution, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                (key, self.problem_key(problem), subject, difficulty, problem, json.dumps(solution), time.time())
+            )
+            self._db.commit()
+            self._remember(key, solution)
+    
+    def _remember(self, key, solution):
+        self._memory[key] = solution
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
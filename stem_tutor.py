@@ -1,151 +1,542 @@
-import os
 import json
-from openai import OpenAI
+import time
 import streamlit as st
+from llm_client import get_client, get_async_client, create_chat_completion, acreate_chat_completion
+from response_cache import ResponseCache
+from instrumentation import get_instrumentation
+from prompts import get_prompt
+from semantic_cache import normalize_math
+from solution_store import SolutionStore, valid_step, valid_solution, format_step, format_solution, format_conclusion
+from json_stream import JSONArrayStream
+
+# Methods whose answers may be served for a near-duplicate rephrasing of the question
+SEMANTIC_CACHE_METHODS = ("answer_question", "explain_step_by_step", "generate_hint")
+
+# Rungs of a hint ladder, weakest first
+HINT_LEVELS = ("nudge", "method", "partial_step")
+
+ERROR_MESSAGES = {
+    "answer_question": "I apologize, but I encountered an error while processing your question: {error}. Please try again or rephrase your question.",
+    "explain_step_by_step": "I apologize, but I encountered an error while generating the step-by-step solution: {error}. Please try again.",
+    "generate_hint": "I apologize, but I encountered an error while generating a hint: {error}. Please try working through the problem step by step."
+}
 
 class STEMTutor:
-    def __init__(self):
+    def __init__(self, cache=None, semantic_cache=None, solution_store=None):
         # the newest OpenAI model is "gpt-4o" which was released May 13, 2024.
         # do not change this unless explicitly requested by the user
-        self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        self.client = get_client()
+        self.async_client = get_async_client()
         self.model = "gpt-4o"
+        # Optional ResponseCache shared by identical requests
+        self.cache = cache
+        # Optional SemanticCache shared by rephrasings of the same question
+        self.semantic_cache = semantic_cache
+        # Structured step-by-step solutions; in memory unless a shared store is given
+        self.solution_store = solution_store if solution_store is not None else SolutionStore()
     
-    def answer_question(self, question, subject, difficulty):
+    def answer_question(self, question, subject, difficulty, context=None):
         """
         Provide detailed answers to STEM questions with adaptive difficulty
+        
+        With a ConversationContext, recent turns and the running summary are sent
+        along and the exchange is recorded; such follow-up answers bypass the caches.
         """
         try:
-            system_prompt = f"""You are an expert STEM tutor specializing in {subject}. 
-            Your student is at {difficulty} level. Provide clear, educational answers that:
-            
-            1. Are appropriate for {difficulty} level students
-            2. Use proper mathematical notation (LaTeX format when needed)
-            3. Include relevant examples or analogies
-            4. Encourage further learning
-            5. Are pedagogically sound
-            
-            For mathematical expressions, use LaTeX format like $x^2$ or $$\\frac{{d}}{{dx}}f(x)$$
-            
-            Subject focus: {subject}
-            Difficulty: {difficulty}
-            """
-            
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": question}
-                ],
-                temperature=0.7,
-                max_tokens=1000
-            )
-            
-            return response.choices[0].message.content
+            history = self._history(context)
+            request = self._answer_request(question, subject, difficulty, history)
+            key, cached = self._context_cache_lookup(history, question, subject, difficulty, request["temperature"])
+            if cached is not None:
+                return self._remember(context, question, cached)
             
+            response = create_chat_completion(self.client, "answer_question", **request)
+            text = self._finish_text(response, key, "answer_question", question, subject, difficulty, cache=not history)
+            return self._remember(context, question, text)
+        
         except Exception as e:
-            return f"I apologize, but I encountered an error while processing your question: {str(e)}. Please try again or rephrase your question."
+            return self._error_message("answer_question", e)
     
-    def explain_step_by_step(self, problem, subject, difficulty):
+    async def answer_question_async(self, question, subject, difficulty, context=None):
         """
-        Provide step-by-step explanations for complex problems
+        Async counterpart of answer_question
         """
         try:
-            system_prompt = f"""You are an expert STEM tutor providing step-by-step solutions.
-            Break down the problem into clear, logical steps appropriate for {difficulty} level students.
+            history = await self._history_async(context)
+            request = self._answer_request(question, subject, difficulty, history)
+            key, cached = self._context_cache_lookup(history, question, subject, difficulty, request["temperature"])
+            if cached is not None:
+                return self._remember(context, question, cached)
             
-            Your response should:
-            1. Clearly identify what needs to be solved
-            2. Break the solution into numbered steps
-            3. Explain the reasoning behind each step
-            4. Use proper mathematical notation (LaTeX format)
-            5. Provide the final answer
-            6. Include any important tips or common mistakes to avoid
+            response = await acreate_chat_completion(self.async_client, "answer_question", **request)
+            text = self._finish_text(response, key, "answer_question", question, subject, difficulty, cache=not history)
+            return self._remember(context, question, text)
+        
+        except Exception as e:
+            return self._error_message("answer_question", e)
+    
+    def answer_question_stream(self, question, subject, difficulty, context=None):
+        """
+        Stream the answer to a STEM question chunk by chunk as it is generated
+        """
+        try:
+            history = self._history(context)
+            request = self._answer_request(question, subject, difficulty, history)
+            key, cached = self._context_cache_lookup(history, question, subject, difficulty, request["temperature"])
+            if cached is not None:
+                self._remember(context, question, cached)
+                yield cached
+                return
             
-            Subject: {subject}
-            Difficulty: {difficulty}
+            stream = create_chat_completion(self.client, "answer_question", stream=True, **request)
             
-            Format your response with clear step divisions and mathematical expressions using LaTeX.
-            """
+            def on_complete(text):
+                if not history:
+                    self._cache_store(key, "answer_question", question, subject, difficulty, text)
+                self._remember(context, question, text)
             
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": f"Please solve this step by step: {problem}"}
-                ],
-                temperature=0.5,
-                max_tokens=1500
+            yield from self._iter_stream_text(stream, on_complete)
+        
+        except Exception as e:
+            yield self._error_message("answer_question", e)
+    
+    def _answer_request(self, question, subject, difficulty, history=()):
+        """
+        Build the completion parameters for answering a question
+        
+        Earlier turns go between the system prompt and the question so the static prefix stays first.
+        """
+        messages = get_prompt("answer_question").messages(subject=subject, difficulty=difficulty, question=question)
+        return {
+            "model": self.model,
+            "messages": messages[:1] + list(history) + messages[1:],
+            "temperature": 0.7,
+            "max_tokens": 1000
+        }
+    
+    def _history(self, context):
+        """
+        Context messages for a follow-up question, summarizing older turns when over budget
+        """
+        if context is None:
+            return []
+        folded = context.take_overflow()
+        if folded:
+            context.set_summary(self.summarize_conversation(context.summary, folded, context.summary_budget), folded)
+        return context.messages()
+    
+    async def _history_async(self, context):
+        """
+        Async counterpart of _history
+        """
+        if context is None:
+            return []
+        folded = context.take_overflow()
+        if folded:
+            context.set_summary(
+                await self.summarize_conversation_async(context.summary, folded, context.summary_budget),
+                folded
+            )
+        return context.messages()
+    
+    def _context_cache_lookup(self, history, question, subject, difficulty, temperature):
+        """
+        Cache lookup for a standalone question; answers that depend on earlier turns are never shared
+        """
+        if history:
+            return None, None
+        return self._cache_lookup("answer_question", question, subject, difficulty, temperature)
+    
+    def _remember(self, context, question, answer):
+        """
+        Record a successful exchange in the conversation context and return the answer
+        """
+        if context is not None:
+            context.add_exchange(question, answer)
+        return answer
+    
+    def summarize_conversation(self, summary, turns, max_tokens=500):
+        """
+        Fold older conversation turns into the running summary; returns "" on failure
+        """
+        try:
+            response = create_chat_completion(
+                self.client,
+                "summarize_conversation",
+                **self._summary_request(summary, turns, max_tokens)
             )
-            
             return response.choices[0].message.content
-            
+        
+        except Exception:
+            return ""
+    
+    async def summarize_conversation_async(self, summary, turns, max_tokens=500):
+        """
+        Async counterpart of summarize_conversation
+        """
+        try:
+            response = await acreate_chat_completion(
+                self.async_client,
+                "summarize_conversation",
+                **self._summary_request(summary, turns, max_tokens)
+            )
+            return response.choices[0].message.content
+        
+        except Exception:
+            return ""
+    
+    def _summary_request(self, summary, turns, max_tokens):
+        """
+        Build the completion parameters for updating the running summary
+        """
+        transcript = "\n\n".join(f"{turn['role'].capitalize()}: {turn['content']}" for turn in turns)
+        return {
+            "model": self.model,
+            "messages": get_prompt("summarize_conversation").messages(
+                max_words=max_tokens * 3 // 4,
+                summary=summary or "(none)",
+                transcript=transcript
+            ),
+            "temperature": 0.2,
+            "max_tokens": max_tokens
+        }
+    
+    def explain_step_by_step(self, problem, subject, difficulty):
+        """
+        Provide step-by-step explanations for complex problems
+        
+        Rendered as markdown from the stored structured solution, see solve_step_by_step.
+        """
+        try:
+            return format_solution(self.solve_step_by_step(problem, subject, difficulty))
+        
         except Exception as e:
-            return f"I apologize, but I encountered an error while generating the step-by-step solution: {str(e)}. Please try again."
+            return self._error_message("explain_step_by_step", e)
+    
+    async def explain_step_by_step_async(self, problem, subject, difficulty):
+        """
+        Async counterpart of explain_step_by_step
+        """
+        try:
+            return format_solution(await self.solve_step_by_step_async(problem, subject, difficulty))
+        
+        except Exception as e:
+            return self._error_message("explain_step_by_step", e)
+    
+    def explain_step_by_step_stream(self, problem, subject, difficulty):
+        """
+        Stream a step-by-step solution as markdown, one step at a time as each is generated
+        """
+        try:
+            for number, step in enumerate(self.solve_step_by_step_stream(problem, subject, difficulty), 1):
+                yield format_step(number, step) + "\n\n"
+            yield format_conclusion(self.solve_step_by_step(problem, subject, difficulty))
+        
+        except Exception as e:
+            yield self._error_message("explain_step_by_step", e)
+    
+    def solve_step_by_step(self, problem, subject, difficulty):
+        """
+        Structured solution {"steps": [{"expression", "reasoning"}], "final_answer", "tips"}
+        
+        Generated once per math-normalized problem, subject and difficulty and kept in the
+        solution store, so revealing further steps or re-displaying it makes no API call.
+        Raises on API or parsing errors.
+        """
+        cached = self._solution_lookup(problem, subject, difficulty)
+        if cached is not None:
+            return cached
+        
+        response = create_chat_completion(
+            self.client, "explain_step_by_step", **self._step_by_step_request(problem, subject, difficulty)
+        )
+        return self._store_solution(problem, subject, difficulty, self._parse_solution(response.choices[0].message.content))
+    
+    async def solve_step_by_step_async(self, problem, subject, difficulty):
+        """
+        Async counterpart of solve_step_by_step
+        """
+        cached = self._solution_lookup(problem, subject, difficulty)
+        if cached is not None:
+            return cached
+        
+        response = await acreate_chat_completion(
+            self.async_client, "explain_step_by_step", **self._step_by_step_request(problem, subject, difficulty)
+        )
+        return self._store_solution(problem, subject, difficulty, self._parse_solution(response.choices[0].message.content))
+    
+    def solve_step_by_step_stream(self, problem, subject, difficulty):
+        """
+        Yield the solution's steps as each is complete, storing the whole solution at the end
+        
+        Stored solutions are replayed without an API call. Raises on API or parsing errors.
+        """
+        cached = self._solution_lookup(problem, subject, difficulty)
+        if cached is not None:
+            yield from cached["steps"]
+            return
+        
+        stream = create_chat_completion(
+            self.client, "explain_step_by_step", stream=True, **self._step_by_step_request(problem, subject, difficulty)
+        )
+        parser = JSONArrayStream("steps")
+        for chunk in stream:
+            if not chunk.choices or not chunk.choices[0].delta.content:
+                continue
+            for step in parser.feed(chunk.choices[0].delta.content):
+                if valid_step(step):
+                    yield step
+        self._store_solution(problem, subject, difficulty, parser.result())
+    
+    def _step_by_step_request(self, problem, subject, difficulty):
+        """
+        Build the completion parameters for a step-by-step solution
+        """
+        return {
+            "model": self.model,
+            "messages": get_prompt("explain_step_by_step").messages(subject=subject, difficulty=difficulty, problem=problem),
+            "response_format": {"type": "json_object"},
+            "temperature": 0.5,
+            "max_tokens": 1500
+        }
+    
+    def _solution_lookup(self, problem, subject, difficulty):
+        """
+        Stored solution for the problem, or one for a near-duplicate rephrasing, or None
+        """
+        start = time.perf_counter()
+        solution = self.solution_store.get(problem, subject, difficulty)
+        if solution is not None:
+            get_instrumentation().record_cache_hit(
+                "explain_step_by_step", self.model, time.perf_counter() - start, "solution_store"
+            )
+            return solution
+        
+        if self.semantic_cache is not None:
+            similar = self.semantic_cache.lookup("explain_step_by_step", problem, subject, difficulty)
+            if valid_solution(similar):
+                get_instrumentation().record_cache_hit(
+                    "explain_step_by_step", self.model, time.perf_counter() - start, "semantic_cache"
+                )
+                return similar
+        return None
+    
+    def _parse_solution(self, content):
+        try:
+            return json.loads(content)
+        except ValueError:
+            return None
+    
+    def _store_solution(self, problem, subject, difficulty, solution):
+        """
+        Validate a generated solution and keep it for later views, students and graders
+        """
+        if not valid_solution(solution):
+            raise ValueError("response did not contain a step-by-step solution")
+        solution = {
+            "steps": [{"expression": step["expression"], "reasoning": step["reasoning"]} for step in solution["steps"]],
+            "final_answer": solution["final_answer"],
+            "tips": solution.get("tips") if isinstance(solution.get("tips"), str) else ""
+        }
+        self.solution_store.put(problem, subject, difficulty, solution)
+        if self.semantic_cache is not None:
+            self.semantic_cache.add("explain_step_by_step", problem, subject, difficulty, solution)
+        return solution
+    
+    def _iter_stream_text(self, stream, on_complete=None):
+        """
+        Yield the text deltas of a streamed chat completion, passing the full text to on_complete
+        """
+        parts = []
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                parts.append(delta)
+                yield delta
+        
+        if on_complete is not None:
+            on_complete("".join(parts))
+    
+    def _finish_text(self, response, key, method, prompt, subject, difficulty, cache=True):
+        """
+        Extract the reply text from a completion and cache it
+        """
+        text = response.choices[0].message.content
+        if cache:
+            self._cache_store(key, method, prompt, subject, difficulty, text)
+        return text
+    
+    def _error_message(self, method, error):
+        """
+        Student-facing apology for a failed request
+        """
+        return ERROR_MESSAGES[method].format(error=str(error))
+    
+    def _cache_lookup(self, method, prompt, subject, difficulty, temperature):
+        """
+        Return the exact-match cache key and any cached or near-duplicate response
+        """
+        start = time.perf_counter()
+        key = None
+        if self.cache is not None:
+            key = ResponseCache.make_key(method, prompt, subject, difficulty, self.model, temperature)
+            cached = self.cache.get(key)
+            if cached is not None:
+                get_instrumentation().record_cache_hit(method, self.model, time.perf_counter() - start, "response_cache")
+                return key, cached
+        
+        if self.semantic_cache is not None and method in SEMANTIC_CACHE_METHODS:
+            similar = self.semantic_cache.lookup(method, prompt, subject, difficulty)
+            if similar is not None:
+                get_instrumentation().record_cache_hit(method, self.model, time.perf_counter() - start, "semantic_cache")
+                return key, similar
+        
+        return key, None
+    
+    def _cache_store(self, key, method, prompt, subject, difficulty, value):
+        """
+        Store a successful response in the configured caches
+        """
+        if not value:
+            return
+        if key is not None:
+            self.cache.set(key, value)
+        if self.semantic_cache is not None and method in SEMANTIC_CACHE_METHODS:
+            self.semantic_cache.add(method, prompt, subject, difficulty, value)
     
     def assess_difficulty(self, user_response, correct_answer):
         """
         Assess if the current difficulty is appropriate based on user performance
         """
         try:
-            system_prompt = """You are an educational assessment expert. 
-            Based on the user's response compared to the correct answer, determine if the current difficulty level is appropriate.
-            
-            Respond with JSON in this format:
-            {
-                "assessment": "too_easy|appropriate|too_hard",
-                "confidence": 0.0-1.0,
-                "reasoning": "brief explanation"
-            }
-            """
-            
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": f"User response: {user_response}\nCorrect answer: {correct_answer}"}
-                ],
-                response_format={"type": "json_object"},
-                temperature=0.3
+            response = create_chat_completion(
+                self.client,
+                "assess_difficulty",
+                **self._assessment_request(user_response, correct_answer)
             )
             
             return json.loads(response.choices[0].message.content)
-            
+        
         except Exception as e:
-            return {
-                "assessment": "appropriate",
-                "confidence": 0.5,
-                "reasoning": f"Error in assessment: {str(e)}"
-            }
+            return self._assessment_error(e)
     
-    def generate_hint(self, problem, subject, difficulty):
+    async def assess_difficulty_async(self, user_response, correct_answer):
         """
-        Generate helpful hints for problems without giving away the answer
+        Async counterpart of assess_difficulty
         """
         try:
-            system_prompt = f"""You are a helpful STEM tutor providing hints for {subject} problems.
-            Generate a helpful hint that guides the student toward the solution without giving it away.
-            
-            The hint should:
-            1. Be appropriate for {difficulty} level students
-            2. Point toward the key concept or method needed
-            3. Not solve the problem directly
-            4. Encourage the student to think through the next step
-            
-            Subject: {subject}
-            Difficulty: {difficulty}
-            """
-            
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": f"Provide a hint for this problem: {problem}"}
-                ],
-                temperature=0.6,
-                max_tokens=200
+            response = await acreate_chat_completion(
+                self.async_client,
+                "assess_difficulty",
+                **self._assessment_request(user_response, correct_answer)
             )
             
-            return response.choices[0].message.content
-            
+            return json.loads(response.choices[0].message.content)
+        
+        except Exception as e:
+            return self._assessment_error(e)
+    
+    def _assessment_request(self, user_response, correct_answer):
+        """
+        Build the completion parameters for a difficulty assessment
+        """
+        return {
+            "model": self.model,
+            "messages": get_prompt("assess_difficulty").messages(user_response=user_response, correct_answer=correct_answer),
+            "response_format": {"type": "json_object"},
+            "temperature": 0.3
+        }
+    
+    def _assessment_error(self, error):
+        """
+        Neutral assessment returned when the request fails
+        """
+        return {
+            "assessment": "appropriate",
+            "confidence": 0.5,
+            "reasoning": f"Error in assessment: {str(error)}"
+        }
+    
+    def generate_hint(self, problem, subject, difficulty, level=0):
+        """
+        Generate helpful hints for problems without giving away the answer
+        
+        level picks the rung of the problem's hint ladder (see HINT_LEVELS); the whole
+        ladder is generated in one call and cached, so further hints are served locally.
+        """
+        try:
+            return self._hint_at(self.hint_ladder(problem, subject, difficulty), level)
+        
+        except Exception as e:
+            return self._error_message("generate_hint", e)
+    
+    async def generate_hint_async(self, problem, subject, difficulty, level=0):
+        """
+        Async counterpart of generate_hint
+        """
+        try:
+            return self._hint_at(await self.hint_ladder_async(problem, subject, difficulty), level)
+        
         except Exception as e:
-            return f"I apologize, but I encountered an error while generating a hint: {str(e)}. Please try working through the problem step by step."
+            return self._error_message("generate_hint", e)
+    
+    def hint_ladder(self, problem, subject, difficulty):
+        """
+        Ordered hints for a problem, from a nudge to a partial step; raises on API or parsing errors
+        """
+        request = self._hint_request(problem, subject, difficulty)
+        key, cached = self._hint_cache_lookup(problem, subject, difficulty, request["temperature"])
+        if cached is not None:
+            return cached
+        
+        response = create_chat_completion(self.client, "generate_hint", **request)
+        return self._finish_hints(response, key, problem, subject, difficulty)
+    
+    async def hint_ladder_async(self, problem, subject, difficulty):
+        """
+        Async counterpart of hint_ladder
+        """
+        request = self._hint_request(problem, subject, difficulty)
+        key, cached = self._hint_cache_lookup(problem, subject, difficulty, request["temperature"])
+        if cached is not None:
+            return cached
+        
+        response = await acreate_chat_completion(self.async_client, "generate_hint", **request)
+        return self._finish_hints(response, key, problem, subject, difficulty)
+    
+    def _hint_request(self, problem, subject, difficulty):
+        """
+        Build the completion parameters for a hint ladder
+        """
+        return {
+            "model": self.model,
+            "messages": get_prompt("generate_hint").messages(subject=subject, difficulty=difficulty, problem=problem),
+            "response_format": {"type": "json_object"},
+            "temperature": 0.6,
+            "max_tokens": 500
+        }
+    
+    def _hint_cache_lookup(self, problem, subject, difficulty, temperature):
+        """
+        Cached ladder for the math-normalized problem, ignoring entries that are not ladders
+        """
+        key, cached = self._cache_lookup("generate_hint", normalize_math(problem), subject, difficulty, temperature)
+        return key, cached if self._valid_ladder(cached) else None
+    
+    def _finish_hints(self, response, key, problem, subject, difficulty):
+        """
+        Extract the hint ladder from a completion and cache it
+        """
+        hints = json.loads(response.choices[0].message.content).get("hints")
+        if not self._valid_ladder(hints):
+            raise ValueError("response did not contain a hint ladder")
+        hints = [hint.strip() for hint in hints[:len(HINT_LEVELS)]]
+        self._cache_store(key, "generate_hint", normalize_math(problem), subject, difficulty, hints)
+        return hints
+    
+    def _valid_ladder(self, hints):
+        return isinstance(hints, list) and bool(hints) and all(isinstance(hint, str) and hint.strip() for hint in hints)
+    
+    def _hint_at(self, ladder, level):
+        return ladder[max(0, min(level, len(ladder) - 1))]
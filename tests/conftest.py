@@ -0,0 +1,18 @@
+import os
+
+import pytest
+
+from benchmarks.mock_openai_server import MockConfig, MockOpenAIServer
+
+@pytest.fixture(scope="session")
+def mock_openai():
+    """
+    Start the offline mock OpenAI server and point the shared clients at it
+    """
+    server = MockOpenAIServer(MockConfig(latency_ms=20, latency_sigma=0.0, tokens_per_second=5000, seed=0)).start()
+    os.environ["OPENAI_BASE_URL"] = server.base_url
+    os.environ["OPENAI_API_KEY"] = "mock-key"
+    os.environ.setdefault("EDUPROMPT_RPM", "100000")
+    os.environ.setdefault("EDUPROMPT_TPM", "100000000")
+    yield server
+    server.stop()
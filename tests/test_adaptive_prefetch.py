@@ -0,0 +1,139 @@
+import time
+import threading
+
+import pytest
+
+from adaptive_prefetch import AdaptivePrefetcher
+from quiz_generator import QuizGenerator
+
+@pytest.fixture
+def generator(mock_openai, monkeypatch):
+    """
+    QuizGenerator whose adaptive questions are stubbed to record the requested level
+    """
+    quiz_generator = QuizGenerator()
+    monkeypatch.setattr(
+        quiz_generator,
+        "_request_adaptive_question",
+        lambda subject, difficulty, priority=None, topic=None: {"question": f"{subject} {difficulty}", "difficulty": difficulty}
+    )
+    return quiz_generator
+
+@pytest.mark.parametrize("current, history", [
+    ("Advanced", []),
+    ("Beginner", [1.0]),
+    ("Intermediate", [0.5, 0.5]),
+    ("Advanced", [0.0]),
+])
+@pytest.mark.parametrize("outcome", [1.0, 0.0])
+def test_prefetch_warms_the_level_the_generator_picks(generator, current, history, outcome):
+    prefetcher = AdaptivePrefetcher(generator)
+    ticket = prefetcher.prefetch("Calculus", current, history)
+    expected = generator.generate_adaptive_question("Calculus", current, history + [outcome])["difficulty"]
+
+    assert expected in ticket
+    assert prefetcher.next_question("Calculus", current, history + [outcome], ticket, timeout=5)["difficulty"] == expected
+    assert prefetcher.stats()["hits"] == 1
+
+@pytest.fixture
+def counting_generator(generator, monkeypatch):
+    """
+    The stubbed generator with every question request recorded, blocking until released
+    """
+    calls = []
+    release = threading.Event()
+    release.set()
+
+    def request(subject, difficulty, priority=None, topic=None):
+        calls.append(difficulty)
+        assert release.wait(5)
+        return {"question": f"{subject} {difficulty} {len(calls)}", "difficulty": difficulty}
+
+    monkeypatch.setattr(generator, "_request_adaptive_question", request)
+    return generator, calls, release
+
+def wait_for_pool(prefetcher, pooled):
+    """
+    Pooling runs in a done-callback that may finish just after the future's result is visible
+    """
+    deadline = time.monotonic() + 5
+    while prefetcher.stats()["pooled"] != pooled:
+        assert time.monotonic() < deadline, "timed out waiting for the prefetch pool"
+        time.sleep(0.01)
+
+def test_without_a_ticket_the_question_is_generated_on_the_spot(counting_generator):
+    generator, calls, _ = counting_generator
+    prefetcher = AdaptivePrefetcher(generator)
+
+    assert prefetcher.next_question("Calculus", "Beginner", [1.0])["difficulty"] == "Beginner"
+    assert calls == ["Beginner"]
+    assert prefetcher.stats() == {"hits": 0, "misses": 1, "pooled": 0}
+
+def test_unused_outcome_is_pooled_for_the_next_request(counting_generator):
+    generator, calls, _ = counting_generator
+    prefetcher = AdaptivePrefetcher(generator)
+
+    # Beginner with one correct answer: another correct answer moves up, a wrong one stays
+    ticket = prefetcher.prefetch("Calculus", "Beginner", [1.0])
+    assert set(ticket) == {"Intermediate", "Beginner"}
+    first = prefetcher.next_question("Calculus", "Beginner", [1.0, 0.0], ticket, timeout=5)
+    assert first["difficulty"] == "Beginner"
+    wait_for_pool(prefetcher, 1)
+    assert prefetcher.stats() == {"hits": 1, "misses": 0, "pooled": 1}
+
+    # A different session reaching Intermediate gets the pooled question without a new request
+    second = prefetcher.next_question("Calculus", "Intermediate", [])
+    assert second["difficulty"] == "Intermediate"
+    assert len(calls) == 2
+    assert prefetcher.stats() == {"hits": 2, "misses": 0, "pooled": 0}
+
+def test_prefetch_reuses_pooled_questions(counting_generator):
+    generator, calls, _ = counting_generator
+    prefetcher = AdaptivePrefetcher(generator)
+    ticket = prefetcher.prefetch("Calculus", "Beginner", [1.0])
+    prefetcher.next_question("Calculus", "Beginner", [1.0, 1.0], ticket, timeout=5)
+    wait_for_pool(prefetcher, 1)
+
+    prefetcher.prefetch("Calculus", "Beginner", [1.0])
+    assert sorted(calls) == ["Beginner", "Intermediate", "Intermediate"]
+
+def test_pool_is_bounded(counting_generator):
+    generator, calls, _ = counting_generator
+    prefetcher = AdaptivePrefetcher(generator, pool_size=2)
+    tickets = [prefetcher.prefetch("Calculus", "Advanced", [0.0]) for _ in range(4)]
+    for ticket in tickets:
+        prefetcher.next_question("Calculus", "Advanced", [0.0, 1.0], ticket, timeout=5)
+    for ticket in tickets:
+        ticket["Intermediate"].result(timeout=5)
+
+    assert len(calls) == 8
+    wait_for_pool(prefetcher, 2)
+
+def test_slow_prefetch_falls_back_to_a_miss(counting_generator):
+    generator, calls, release = counting_generator
+    prefetcher = AdaptivePrefetcher(generator)
+    release.clear()
+    ticket = prefetcher.prefetch("Calculus", "Beginner", [1.0])
+
+    # The stalled prefetches time out; the fallback request is let through
+    timer = threading.Timer(0.2, release.set)
+    timer.start()
+    question = prefetcher.next_question("Calculus", "Beginner", [1.0, 0.0], ticket, timeout=0.05)
+    timer.join()
+
+    assert question["difficulty"] == "Beginner"
+    assert prefetcher.stats()["hits"] == 0
+    assert prefetcher.stats()["misses"] == 1
+
+def test_failed_prefetch_falls_back_to_a_miss(generator, monkeypatch):
+    prefetcher = AdaptivePrefetcher(generator)
+    monkeypatch.setattr(generator, "_request_adaptive_question", lambda subject, difficulty, priority=None, topic=None: 1 / 0)
+    ticket = prefetcher.prefetch("Calculus", "Beginner", [1.0])
+    monkeypatch.setattr(
+        generator,
+        "_request_adaptive_question",
+        lambda subject, difficulty, priority=None, topic=None: {"question": "fresh", "difficulty": difficulty}
+    )
+
+    assert prefetcher.next_question("Calculus", "Beginner", [1.0, 1.0], ticket, timeout=5)["question"] == "fresh"
+    assert prefetcher.stats() == {"hits": 0, "misses": 1, "pooled": 0}
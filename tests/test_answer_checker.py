@@ -0,0 +1,58 @@
+import time
+
+import pytest
+
+from answer_checker import check_answer
+
+@pytest.mark.parametrize("user_answer, correct_answer", [
+    ("2x", "2*x"),
+    ("x = 2", "2"),
+    ("f(x) = x^2 + 1", "x^2 + 1"),
+    ("\\frac{1}{2}", "0.5"),
+])
+def test_equivalent_single_answers_pass(user_answer, correct_answer):
+    assert check_answer(user_answer, correct_answer)["correct"] is True
+
+def test_different_single_answer_fails():
+    assert check_answer("x = 3", "x = 2")["correct"] is False
+
+@pytest.mark.parametrize("user_answer, correct_answer", [
+    # Multiple roots: one root, both roots joined by "and", and the same roots in another order
+    ("3", "x = 2, x = 3"),
+    ("x=2 and x=3", "x = 2, x = 3"),
+    ("x = 3, x = 2", "x = 2, x = 3"),
+    ("x = 2 or x = 3", "x = 2, x = 3"),
+    # Systems of equations
+    ("x=5, y=2", "x = 1, y = 2"),
+    ("y = 2", "x = 1, y = 2"),
+    ("x = 1, y = 2", "x = 1, y = 2"),
+    # Chained equalities and non-symbol left-hand sides
+    ("x = y = 2", "2"),
+    ("2x + 1 = 5", "5"),
+    ("\\text{x is } 2", "2"),
+])
+def test_multi_part_answers_go_to_llm(user_answer, correct_answer):
+    assert check_answer(user_answer, correct_answer) is None
+
+def test_matrix_commas_are_not_a_list():
+    assert check_answer("[[1, 2], [3, 4]]", "\\begin{pmatrix} 1 & 2 \\\\ 3 & 4 \\end{pmatrix}")["correct"] is True
+
+@pytest.mark.parametrize("user_answer", ["9^9^9", "10^10^8", "2^2^2^2^2^2", "9^9^9^9", "(10^100)^100", "[[9^9^9, 1]]"])
+def test_oversized_powers_go_to_llm_quickly(user_answer):
+    start = time.perf_counter()
+    assert check_answer(user_answer, "2") is None
+    assert time.perf_counter() - start < 2
+
+def test_small_towers_are_still_checked():
+    assert check_answer("2^2^2^2", "65536")["correct"] is True
+
+@pytest.mark.parametrize("user_answer, correct_answer", [
+    ("9.8", "9.8 m/s^2"),
+    ("5 m", "5"),
+    ("5", "5 m"),
+    ("y = 2", "x = 2"),
+    ("2y", "2x"),
+    ("x^2", "4"),
+])
+def test_different_variables_or_units_go_to_llm(user_answer, correct_answer):
+    assert check_answer(user_answer, correct_answer) is None
@@ -0,0 +1,98 @@
+import asyncio
+
+import pytest
+
+from quiz_generator import QuizGenerator
+
+QUIZ = {
+    "title": "Derivatives",
+    "questions": [
+        {
+            "type": "multiple_choice",
+            "question": "What is the derivative of x^2?",
+            "options": ["A) 2x", "B) x", "C) 2"],
+            "correct_answer": "A) 2x",
+            "explanation": "Power rule."
+        },
+        {
+            "type": "problem_solving",
+            "question": "Explain how to differentiate sin(x^2).",
+            "correct_answer": "Use the chain rule to get 2x cos(x^2)",
+            "explanation": "Chain rule."
+        }
+    ]
+}
+
+# Seven students, five distinct free-form answers; Ann and Eve differ only in case and spacing
+SUBMISSIONS = {
+    "ann": {0: "A) 2x", 1: "Use the chain rule"},
+    "bob": {0: "B) x", 1: "Use the product rule"},
+    "cat": {0: "A) 2x", 1: "Differentiate the outside first"},
+    "dan": {0: "", 1: "I am not sure"},
+    "eve": {0: "A) 2x", 1: "use  the chain rule"},
+    "fay": {0: "C) 2", 1: "Multiply by the inner derivative"},
+    "gus": {0: "A) 2x", 1: "I am not sure"},
+}
+
+@pytest.fixture
+def recorded_batches(mock_openai, monkeypatch):
+    """
+    QuizGenerator grading two answers per batch, with the size of every batched request recorded
+    """
+    generator = QuizGenerator(grading_batch_size=2)
+    sizes = []
+    sync_batch = generator._evaluate_problem_solving_batch
+    async_batch = generator._evaluate_problem_solving_batch_async
+
+    def batch(pending, user_answers):
+        sizes.append(len(pending))
+        return sync_batch(pending, user_answers)
+
+    async def batch_async(pending, user_answers):
+        sizes.append(len(pending))
+        return await async_batch(pending, user_answers)
+
+    monkeypatch.setattr(generator, "_evaluate_problem_solving_batch", batch)
+    monkeypatch.setattr(generator, "_evaluate_problem_solving_batch_async", batch_async)
+    return generator, sizes
+
+def check_batched_results(results, sizes):
+    assert sorted(sizes) == [1, 2, 2]
+    assert results["summary"]["submissions"] == 7
+    assert results["summary"]["problem_solving_answers"] == 7
+    assert results["summary"]["distinct_answers"] == 5
+
+    students = results["students"]
+    assert all(student["feedback"][1]["explanation"] == "Mock batched evaluation." for student in students.values())
+    assert students["ann"]["feedback"][1]["score"] == students["eve"]["feedback"][1]["score"]
+    assert students["dan"]["feedback"][1]["score"] == students["gus"]["feedback"][1]["score"]
+    assert students["ann"]["feedback"][0]["correct"] is True
+    assert students["bob"]["feedback"][0]["correct"] is False
+
+    choice, free_form = results["questions"]
+    assert choice["option_counts"] == {"A) 2x": 4, "B) x": 1, "C) 2": 1}
+    assert choice["unanswered"] == 1
+    assert free_form["distinct_answers"] == 5
+    assert {entry["students"] for entry in free_form["common_answers"][:2]} == {2}
+
+def test_distinct_answers_are_graded_in_batches(recorded_batches):
+    generator, sizes = recorded_batches
+    check_batched_results(generator.evaluate_submissions(QUIZ, SUBMISSIONS, batch=True), sizes)
+
+def test_async_distinct_answers_are_graded_in_batches(recorded_batches):
+    generator, sizes = recorded_batches
+    check_batched_results(asyncio.run(generator.evaluate_submissions_async(QUIZ, SUBMISSIONS, batch=True)), sizes)
+
+def test_empty_submissions(recorded_batches):
+    generator, sizes = recorded_batches
+    results = generator.evaluate_submissions(QUIZ, {}, batch=True)
+
+    assert sizes == []
+    assert results["students"] == {}
+    assert results["summary"] == {
+        "submissions": 0,
+        "mean_score": 0.0,
+        "problem_solving_answers": 0,
+        "distinct_answers": 0
+    }
+    assert [entry["mean_score"] for entry in results["questions"]] == [0.0, 0.0]
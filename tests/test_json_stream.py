@@ -0,0 +1,56 @@
+import json
+
+import pytest
+
+from json_stream import JSONArrayStream
+
+QUIZ = {
+    "title": "Braces {and} [brackets], \"quoted\"",
+    "difficulty": "Intermediate",
+    "questions": [
+        {"question": "Solve {x : x > 1} \\ {2}", "options": ["A) [1, 2]", "B) \"}\""], "correct_answer": "A) [1, 2]"},
+        {"question": "What is \\frac{1}{2}?", "steps": [{"n": 1}, {"n": 2}], "correct_answer": "0.5"},
+        {"question": "Unicode é ∑ and an escaped slash \\\\", "correct_answer": "\\\\"}
+    ],
+    "subject": "Mathematics"
+}
+TEXT = json.dumps(QUIZ, indent=1)
+
+def stream(chunks):
+    parser = JSONArrayStream()
+    arrivals = [parser.feed(chunk) for chunk in chunks]
+    return parser, arrivals
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 64, len(TEXT)])
+def test_fixed_size_chunks(size):
+    parser, arrivals = stream([TEXT[start:start + size] for start in range(0, len(TEXT), size)])
+
+    assert [item for items in arrivals for item in items] == QUIZ["questions"]
+    assert parser.fields == {"title": QUIZ["title"], "difficulty": "Intermediate", "subject": "Mathematics"}
+    assert parser.result() == QUIZ
+
+@pytest.mark.parametrize("token", ['\\"', "\\\\", '"question"', "true", "{\"n\"", "}, {"])
+def test_chunk_boundary_inside_a_token(token):
+    text = json.dumps({"questions": [{"question": 'a \\ "b"', "flag": True, "steps": [{"n": 1}, {"n": 2}]}, {"question": "c"}]})
+    cut = text.index(token) + 1
+    parser, arrivals = stream([text[:cut], text[cut:]])
+
+    assert arrivals[0] + arrivals[1] == json.loads(text)["questions"]
+
+def test_items_arrive_as_soon_as_they_close():
+    first = json.dumps(QUIZ["questions"][0])
+    parser = JSONArrayStream()
+
+    assert parser.feed('{"title": "Quiz", "questions": [' + first[:-1]) == []
+    assert parser.fields == {"title": "Quiz"}
+    assert parser.feed(first[-1]) == [QUIZ["questions"][0]]
+    assert parser.feed(", " + json.dumps(QUIZ["questions"][1])) == [QUIZ["questions"][1]]
+    assert parser.result() is None
+    assert parser.feed("]}") == []
+    assert parser.result() == {"title": "Quiz", "questions": QUIZ["questions"][:2]}
+
+def test_other_arrays_are_ignored():
+    text = json.dumps({"tags": [{"name": "x"}], "meta": {"questions": [{"question": "nested"}]}, "questions": [{"question": "q"}]})
+    parser, arrivals = stream(list(text))
+
+    assert [item for items in arrivals for item in items] == [{"question": "q"}]
@@ -0,0 +1,20 @@
+import asyncio
+
+from llm_client import get_async_client
+from stem_tutor import STEMTutor
+
+def test_async_client_is_one_per_event_loop(mock_openai):
+    async def client_for_loop():
+        return get_async_client().for_loop()
+
+    first = asyncio.run(client_for_loop())
+    second = asyncio.run(client_for_loop())
+    assert first is not second
+
+def test_async_calls_from_separate_asyncio_runs(mock_openai):
+    tutor = STEMTutor()
+    answers = [
+        asyncio.run(tutor.answer_question_async(f"What is {n} + {n}?", "General Math", "Beginner"))
+        for n in range(3)
+    ]
+    assert all(answer and not answer.startswith("I apologize") for answer in answers)
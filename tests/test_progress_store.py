@@ -0,0 +1,17 @@
+import time
+
+from progress_store import ProgressStore
+
+def test_reads_include_queued_attempts_without_waiting(tmp_path):
+    store = ProgressStore(str(tmp_path / "progress.sqlite3"), flush_interval=0.3)
+    for score in (0.0, 0.5, 1.0):
+        store.record("s1", "quiz_question", "Calculus", "Limits", "Beginner", score)
+
+    start = time.perf_counter()
+    before = (store.totals("s1"), store.recent_scores("s1", "quiz_question"), store.scored_attempts("s1"))
+    assert time.perf_counter() - start < 0.1
+    assert before[0]["quiz_question"] == 3
+    assert before[1] == [0.0, 0.5, 1.0]
+
+    store.flush()
+    assert (store.totals("s1"), store.recent_scores("s1", "quiz_question"), store.scored_attempts("s1")) == before
@@ -0,0 +1,100 @@
+import time
+
+import pytest
+
+from quiz_bank import QuizBank, question_fingerprint
+
+BUCKET = ("Calculus", "Beginner", "problem_solving")
+
+def make_questions(start, n, question_type="problem_solving"):
+    return [{"type": question_type, "question": f"Question {i}"} for i in range(start, start + n)]
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out waiting for the refill worker"
+        time.sleep(0.01)
+
+def idle(bank):
+    with bank._lock:
+        return not bank._queued
+
+@pytest.fixture
+def bank(tmp_path):
+    return QuizBank(str(tmp_path / "bank.db"), low_water=4, refill_size=3)
+
+def test_add_skips_duplicates_and_other_types(bank):
+    questions = make_questions(0, 3) + make_questions(0, 1) + make_questions(9, 1, "multiple_choice")
+
+    assert bank.add(*BUCKET, questions) == 3
+    assert bank.add(*BUCKET, make_questions(2, 2)) == 1
+    assert bank.count(*BUCKET) == 4
+
+def test_take_removes_in_order_and_skips_excluded(bank):
+    bank.add(*BUCKET, make_questions(0, 5))
+    exclude = {question_fingerprint({"question": "  question 1 "})}
+
+    assert bank.take(*BUCKET, 2, exclude=exclude) == [make_questions(0, 1)[0], make_questions(2, 1)[0]]
+    assert bank.count(*BUCKET) == 3
+    assert bank.take(*BUCKET, 10) == [make_questions(i, 1)[0] for i in (1, 3, 4)]
+    assert bank.take(*BUCKET, 1) == []
+    assert bank.take(*BUCKET, 0) == []
+
+def test_take_refills_below_low_water(bank):
+    calls = []
+    counter = iter(range(100, 1000, 10))
+
+    def refill(subject, difficulty, question_type, n):
+        calls.append(((subject, difficulty, question_type), n))
+        return make_questions(next(counter), n, question_type)
+
+    bank.set_refill(refill)
+    bank.add(*BUCKET, make_questions(0, 4))
+    bank.take(*BUCKET, 1)
+    wait_for(lambda: idle(bank) and bank.count(*BUCKET) >= 4)
+
+    # Three left, one round of three brings the bucket back above the mark
+    assert calls == [(BUCKET, 3)]
+    assert bank.count(*BUCKET) == 6
+
+def test_refill_stops_when_the_generator_repeats_itself(bank):
+    calls = []
+
+    def refill(subject, difficulty, question_type, n):
+        calls.append(n)
+        return make_questions(0, 1, question_type)
+
+    bank.set_refill(refill)
+    bank.take(*BUCKET, 1)
+    wait_for(lambda: idle(bank))
+
+    # The first round adds one question; the second adds nothing and ends the lease
+    assert calls == [3, 3]
+    assert bank.count(*BUCKET) == 1
+
+def test_refill_rounds_are_capped(tmp_path):
+    bank = QuizBank(str(tmp_path / "bank.db"), low_water=100, refill_size=2, max_refill_rounds=3)
+    counter = iter(range(0, 1000, 10))
+    bank.set_refill(lambda subject, difficulty, question_type, n: make_questions(next(counter), n, question_type))
+    bank.take(*BUCKET, 1)
+    wait_for(lambda: idle(bank))
+
+    assert bank.count(*BUCKET) == 6
+
+def test_failed_refill_can_be_requested_again(bank):
+    attempts = []
+
+    def refill(subject, difficulty, question_type, n):
+        attempts.append(n)
+        if len(attempts) == 1:
+            raise RuntimeError("generation failed")
+        return make_questions(0, n, question_type)
+
+    bank.set_refill(refill)
+    bank.take(*BUCKET, 1)
+    wait_for(lambda: idle(bank) and attempts)
+    assert bank.count(*BUCKET) == 0
+
+    bank.take(*BUCKET, 1)
+    wait_for(lambda: idle(bank))
+    assert bank.count(*BUCKET) == 3
@@ -0,0 +1,95 @@
+import types
+
+import pytest
+
+import response_cache
+from response_cache import ResponseCache
+
+@pytest.fixture
+def clock(monkeypatch):
+    """
+    Controllable wall clock for the cache module
+    """
+    now = types.SimpleNamespace(value=1000.0)
+    monkeypatch.setattr(response_cache, "time", types.SimpleNamespace(time=lambda: now.value))
+    return now
+
+def test_make_key_ignores_whitespace_only():
+    key = ResponseCache.make_key("generate_quiz", "Solve  x\n+1", "Math", "Beginner", "gpt-4o", 0.7)
+
+    assert key == ResponseCache.make_key("generate_quiz", " Solve x +1 ", "Math", "Beginner", "gpt-4o", 0.7000001)
+    assert key != ResponseCache.make_key("generate_quiz", "Solve x +1", "Math", "Advanced", "gpt-4o", 0.7)
+    assert key != ResponseCache.make_key("generate_quiz", "Solve x +1", "Math", "Beginner", "gpt-4o", 0.2)
+
+def test_memory_entries_expire(clock):
+    cache = ResponseCache(ttl_seconds=60)
+    cache.set("a", {"answer": 1})
+
+    clock.value += 60
+    assert cache.get("a") == {"answer": 1}
+    clock.value += 1
+    assert cache.get("a") is None
+    assert cache.stats()["memory_entries"] == 0
+    assert (cache.hits, cache.misses) == (1, 1)
+
+def test_least_recently_used_entry_is_evicted():
+    cache = ResponseCache(max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.stats()["memory_entries"] == 2
+
+def test_disk_tier_survives_memory_eviction_and_restarts(tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache = ResponseCache(max_entries=1, db_path=path)
+    cache.set("a", {"questions": [1, 2]})
+    cache.set("b", "second")
+
+    assert cache.get("a") == {"questions": [1, 2]}
+    assert cache.disk_hits == 1
+    assert ResponseCache(db_path=path).get("b") == "second"
+
+def test_expired_disk_rows_are_deleted(tmp_path, clock):
+    cache = ResponseCache(ttl_seconds=60, db_path=str(tmp_path / "cache.db"))
+    cache.set("a", 1)
+    cache._memory.clear()
+
+    clock.value += 61
+    assert cache.get("a") is None
+    assert cache.stats()["disk_entries"] == 0
+
+def test_disk_tier_is_pruned_to_its_limit(tmp_path, clock):
+    cache = ResponseCache(max_entries=1, ttl_seconds=1000, db_path=str(tmp_path / "cache.db"), max_disk_entries=10)
+    cache.set("expired", 0)
+    clock.value += 1001
+    for i in range(99):
+        clock.value += 1
+        cache.set(f"key {i}", i)
+
+    # The hundredth write prunes the expired row and all but the ten most recently used
+    assert cache.stats()["disk_entries"] == 10
+    cache._memory.clear()
+    assert cache.get("key 98") == 98
+    assert cache.get("key 88") is None
+
+def test_clear_resets_both_tiers_and_counters(tmp_path):
+    cache = ResponseCache(db_path=str(tmp_path / "cache.db"))
+    cache.set("a", 1)
+    cache.get("a")
+    cache.get("b")
+    cache.clear()
+
+    assert cache.get("a") is None
+    assert cache.stats() == {
+        "hits": 0,
+        "misses": 1,
+        "disk_hits": 0,
+        "hit_rate": 0.0,
+        "memory_entries": 0,
+        "disk_entries": 0
+    }
@@ -0,0 +1,36 @@
+import asyncio
+import threading
+
+from scheduler import LLMScheduler
+
+def test_async_waiters_hold_no_threads_and_leave_on_cancel():
+    scheduler = LLMScheduler(requests_per_minute=600, tokens_per_minute=10 ** 9)
+    scheduler.requests.available = 0
+    threads_before = threading.active_count()
+
+    async def scenario():
+        waiters = [asyncio.create_task(scheduler.acquire_async(2, 10)) for _ in range(50)]
+        await asyncio.sleep(0.02)
+        assert threading.active_count() == threads_before
+        assert scheduler.metrics()["queue_depth"] == 50
+        for waiter in waiters[1:]:
+            waiter.cancel()
+        await asyncio.gather(*waiters[1:], return_exceptions=True)
+        assert scheduler.metrics()["queue_depth"] == 1
+        await asyncio.wait_for(waiters[0], 2)
+
+    asyncio.run(scenario())
+    assert scheduler.metrics()["admitted"] == 1
+
+def test_sync_and_async_waiters_share_the_queue():
+    scheduler = LLMScheduler(requests_per_minute=600, tokens_per_minute=10 ** 9)
+    scheduler.requests.available = 0
+    thread = threading.Thread(target=scheduler.acquire, args=(1, 10))
+    thread.start()
+
+    async def scenario():
+        await asyncio.wait_for(scheduler.acquire_async(1, 10), 2)
+
+    asyncio.run(scenario())
+    thread.join(2)
+    assert scheduler.metrics()["admitted"] == 2
@@ -0,0 +1,36 @@
+import pytest
+
+from semantic_cache import SemanticCache, normalize_math, math_signature
+
+@pytest.mark.parametrize("first, second", [
+    ("derivative of sin(x)^2", "derivative of sin(x^2)"),
+    ("derivative of e^(x+1)", "derivative of e^x + 1"),
+    ("integral of (x+1)^2", "integral of x+1^2"),
+    ("derivative of x^{x+1}", "derivative of x^x + 1"),
+])
+def test_bracket_structure_is_kept(first, second):
+    assert normalize_math(first) != normalize_math(second)
+    assert math_signature(normalize_math(first)) != math_signature(normalize_math(second))
+
+def test_rephrasings_still_match():
+    assert normalize_math("What is the derivative of x^{2}?") == normalize_math("Find the derivative of x²")
+
+@pytest.mark.parametrize("first, second", [
+    ("derivative of x^2 sin x", "d/dx x²·sin(x)"),
+    ("derivative of e^(x)", "derivative of e^x"),
+    ("integral of \\frac{1}{x+1}", "integral of 1/(x+1)"),
+])
+def test_brackets_around_one_atom_do_not_matter(first, second):
+    assert normalize_math(first) == normalize_math(second)
+    assert math_signature(normalize_math(first)) == math_signature(normalize_math(second))
+
+def test_lookup_hits_rewritten_notation():
+    cache = SemanticCache()
+    cache.add("answer_question", "derivative of x^2 sin x", "Calculus", "Beginner", "2x sin x + x^2 cos x")
+    assert cache.lookup("answer_question", "d/dx x²·sin(x)", "Calculus", "Beginner") is not None
+
+def test_lookup_misses_regrouped_problem():
+    cache = SemanticCache()
+    cache.add("answer_question", "derivative of sin(x)^2", "Calculus", "Beginner", "2 sin(x) cos(x)")
+    assert cache.lookup("answer_question", "derivative of sin(x^2)", "Calculus", "Beginner") is None
+    assert cache.lookup("answer_question", "What is the derivative of sin(x)^2?", "Calculus", "Beginner") is not None
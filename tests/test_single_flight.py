@@ -0,0 +1,32 @@
+import asyncio
+import threading
+
+from single_flight import SingleFlight
+
+async def slow_ok():
+    await asyncio.sleep(0.1)
+    return "ok"
+
+def test_do_async_on_separate_loops():
+    flight = SingleFlight()
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(asyncio.run(flight.do_async("k", slow_ok)))) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == ["ok", "ok"]
+
+def test_followers_survive_cancelled_leader():
+    flight = SingleFlight()
+
+    async def scenario():
+        leader = asyncio.create_task(flight.do_async("k", slow_ok))
+        await asyncio.sleep(0.01)
+        follower = asyncio.create_task(flight.do_async("k", slow_ok))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        return await asyncio.wait_for(follower, 2)
+
+    assert asyncio.run(scenario()) == "ok"
+    assert flight.stats()["in_flight"] == 0
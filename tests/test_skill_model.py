@@ -0,0 +1,14 @@
+import pytest
+
+from skill_model import adaptive_difficulty
+
+@pytest.mark.parametrize("history, current, expected", [
+    ([], "Advanced", "Advanced"),
+    ([], "Beginner", "Beginner"),
+    ([0.7], "Advanced", "Advanced"),
+    ([0.8], "Intermediate", "Intermediate"),
+    ([0, 0], "Advanced", "Intermediate"),
+    ([1, 1], "Intermediate", "Advanced"),
+])
+def test_list_history_starts_at_current_level(history, current, expected):
+    assert adaptive_difficulty(history, current) == expected
@@ -1,18 +1,26 @@
 import streamlit as st
 import re
+import os
+import uuid
+from conversation import ConversationContext
+from progress_store import ProgressStore
+from skill_model import SkillModel
 
 def initialize_session_state():
     """
     Initialize session state variables for tracking student progress
-    """
-    if "questions_asked" not in st.session_state:
-        st.session_state.questions_asked = 0
     
-    if "problems_solved" not in st.session_state:
-        st.session_state.problems_solved = 0
+    Counters and recent quiz scores are restored from the progress store for the
+    student identified in the URL, so they survive reloads.
+    """
+    if "student_id" not in st.session_state:
+        st.session_state.student_id = get_student_id()
     
-    if "quizzes_completed" not in st.session_state:
-        st.session_state.quizzes_completed = 0
+    if "questions_asked" not in st.session_state:
+        totals = get_progress_store().totals(st.session_state.student_id)
+        st.session_state.questions_asked = totals["question"]
+        st.session_state.problems_solved = totals["problem"]
+        st.session_state.quizzes_completed = totals["quiz"]
     
     if "current_quiz" not in st.session_state:
         st.session_state.current_quiz = None
@@ -23,22 +31,81 @@ def initialize_session_state():
     if "quiz_submitted" not in st.session_state:
         st.session_state.quiz_submitted = False
     
-    if "performance_history" not in st.session_state:
-        st.session_state.performance_history = []
+    if "worked_solutions" not in st.session_state:
+        st.session_state.worked_solutions = set()
+    
+    if "seen_questions" not in st.session_state:
+        st.session_state.seen_questions = set()
+    
+    skill_model = get_skill_model()
+    if not skill_model.is_loaded(st.session_state.student_id):
+        skill_model.load(
+            get_progress_store().scored_attempts(st.session_state.student_id),
+            [st.session_state.student_id]
+        )
+    
+    if "conversation" not in st.session_state:
+        st.session_state.conversation = ConversationContext(
+            token_budget=int(os.getenv("EDUPROMPT_CONTEXT_TOKENS", "2000"))
+        )
+
+@st.cache_resource
+def get_progress_store():
+    return ProgressStore(os.getenv("EDUPROMPT_PROGRESS_PATH", ".cache/progress.sqlite3"))
+
+@st.cache_resource
+def get_skill_model():
+    return SkillModel()
+
+def get_student_id():
+    """
+    Stable student id from the ?student= query parameter, assigning a new one when absent
+    """
+    student_id = st.query_params.get("student")
+    if not student_id:
+        student_id = uuid.uuid4().hex
+        st.query_params["student"] = student_id
+    return student_id
+
+def record_attempt(kind, subject, difficulty=None, score=None, topic=None):
+    """
+    Count an attempt in the session and queue it for the progress store
+    
+    kind is "question", "problem", "quiz" or "quiz_question"; scores are fractions in [0, 1].
+    """
+    if kind == "question":
+        st.session_state.questions_asked += 1
+    elif kind == "problem":
+        st.session_state.problems_solved += 1
+    elif kind == "quiz":
+        st.session_state.quizzes_completed += 1
+    elif kind == "quiz_question" and score is not None:
+        get_skill_model().update(st.session_state.student_id, subject, topic, difficulty, score)
     
-    if "messages" not in st.session_state:
-        st.session_state.messages = []
+    get_progress_store().record(st.session_state.student_id, kind, subject, topic, difficulty, score)
+
+def recommended_difficulty(subject, topic=None):
+    """
+    Difficulty the skill model recommends for the current student, or None before any scored answer
+    """
+    estimate = get_skill_model().estimate(st.session_state.student_id, subject, topic)
+    return estimate.recommended_difficulty() if estimate.attempts else None
 
 def render_math_expression(text):
     """
     Render text with LaTeX mathematical expressions
     """
-    # Check if text contains LaTeX expressions
-    if '$' in text or '\\' in text:
-        # Streamlit natively supports LaTeX rendering
-        st.markdown(text)
-    else:
-        st.markdown(text)
+    # Streamlit natively supports LaTeX rendering; only the delimiters need normalizing
+    st.markdown(prepare_math_markdown(text))
+
+def prepare_math_markdown(text):
+    """
+    Convert \\( \\) and \\[ \\] LaTeX delimiters to the $ and $$ forms st.markdown renders
+    """
+    if "\\" not in text:
+        return text
+    text = re.sub(r"\\\[(.+?)\\\]", r"$$\1$$", text, flags=re.S)
+    return re.sub(r"\\\((.+?)\\\)", r"$\1$", text, flags=re.S)
 
 def format_difficulty_feedback(assessment):
     """
@@ -51,23 +118,6 @@ def format_difficulty_feedback(assessment):
     else:
         return "✅ Great! This difficulty level seems perfect for you."
 
-def calculate_adaptive_difficulty(performance_history):
-    """
-    Calculate recommended difficulty based on performance history
-    """
-    if not performance_history:
-        return "Intermediate"
-    
-    recent_performance = performance_history[-5:]  # Last 5 attempts
-    avg_score = sum(recent_performance) / len(recent_performance)
-    
-    if avg_score >= 0.85:
-        return "Advanced"
-    elif avg_score >= 0.65:
-        return "Intermediate"
-    else:
-        return "Beginner"
-
 def validate_openai_key():
     """
     Validate that OpenAI API key is available